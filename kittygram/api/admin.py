@@ -1,9 +1,101 @@
 from django.contrib import admin
-from .models import Post
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+from .models import Job, Post, RequestProfile
+from .profiling import TOKEN_HEADER, issue_token
+from .search import search_posts
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
     list_display = ['title', 'author', 'created_at']
     list_filter = ['created_at', 'author']
     search_fields = ['title', 'description']
-    readonly_fields = ['created_at']
\ No newline at end of file
+    readonly_fields = ['created_at']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Полнотекстовый индекс вместо icontains по каждому полю
+        if not search_term:
+            return queryset, False
+        return search_posts(queryset, search_term), False
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = [
+        'created_at', 'method', 'path', 'status_code', 'duration_ms',
+        'query_count', 'samples', 'trigger', 'flamegraph',
+    ]
+    list_filter = ['trigger', 'route', 'method', 'created_at']
+    search_fields = ['path', 'username']
+    exclude = ['stacks', 'sql']
+    readonly_fields = [
+        'created_at', 'method', 'path', 'route', 'status_code', 'duration', 'query_count',
+        'query_seconds', 'samples', 'trigger', 'username', 'flamegraph', 'sql_statements',
+    ]
+
+    def has_add_permission(self, request):
+        # Профили создаёт только ProfilingMiddleware
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Время ответа, мс', ordering='duration')
+    def duration_ms(self, obj):
+        return round(obj.duration * 1000, 1)
+
+    @admin.display(description='Стеки')
+    def flamegraph(self, obj):
+        if not obj.stacks:
+            return '-'
+        url = reverse('admin:api_requestprofile_stacks', args=[obj.pk])
+        return format_html('<a href="{}">{}.folded</a>', url, obj.pk)
+
+    @admin.display(description='SQL-запросы')
+    def sql_statements(self, obj):
+        return format_html(
+            '<ol>{}</ol>',
+            format_html_join(
+                '', '<li><code>{}</code> - {} мс</li>',
+                ((sql, round(seconds * 1000, 2)) for sql, seconds in obj.sql),
+            ),
+        )
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/stacks/', self.admin_site.admin_view(self.stacks_view),
+                name='api_requestprofile_stacks',
+            ),
+            path(
+                'token/', self.admin_site.admin_view(self.token_view),
+                name='api_requestprofile_token',
+            ),
+        ] + super().get_urls()
+
+    def stacks_view(self, request, pk):
+        # Файлы профилей лежат в закрытом каталоге MEDIA_ROOT/.profiles/
+        if not self.has_view_permission(request):
+            raise Http404
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        if not profile.stacks:
+            raise Http404
+        return FileResponse(
+            profile.stacks.open('rb'), as_attachment=True, filename=f'profile-{pk}.folded'
+        )
+
+    def token_view(self, request):
+        # Заголовок для профилирования своих запросов: curl -H '<этот текст>' ...
+        if not request.user.is_staff:
+            raise Http404
+        header = TOKEN_HEADER.removeprefix('HTTP_').replace('_', '-').title()
+        return HttpResponse(
+            f'{header}: {issue_token(request.user)}\n', content_type='text/plain; charset=utf-8'
+        )
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['task', 'status', 'attempts', 'run_after', 'created_at']
+    list_filter = ['status', 'task']
+    readonly_fields = ['created_at', 'locked_at', 'last_error']
\ No newline at end of file
@@ -4,4 +4,8 @@
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
-    verbose_name = 'API'
\ No newline at end of file
+    verbose_name = 'API'
+
+    def ready(self):
+        # Регистрируем обработчики сигналов и фоновые задачи
+        from . import signals, tasks  # noqa: F401
\ No newline at end of file
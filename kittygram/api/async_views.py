@@ -0,0 +1,176 @@
+"""
+Асинхронные версии чтения ленты, поста и текущего пользователя для ASGI
+(маршруты в kittygram/asgi_urls.py).
+
+Пока медленный клиент отправляет или получает данные, запрос не занимает
+поток: ожидание кэша и БД идёт через async-методы Django. Запись (POST,
+PATCH, DELETE), browsable API (Accept: text/html) и лента без кэша
+передаются в обычные DRF view из api/views.py, поэтому поведение
+и формат ответов совпадают с WSGI-развёртыванием.
+"""
+
+from asgiref.sync import sync_to_async
+from django.contrib import auth
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import (
+    APIException, AuthenticationFailed, NotAuthenticated, NotFound, Throttled
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from .authentication import AccessTokenAuthentication
+from .cache import aget_feed, aget_feed_version, aget_posts, cache_enabled, render_post
+from .pagination import PostCursorPagination
+from .serializers import UserSerializer
+from .views import CurrentUserView, PostViewSet, add_validators, make_validators, post_etag
+
+post_list_view = PostViewSet.as_view({'get': 'list', 'post': 'create'})
+post_detail_view = PostViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+})
+current_user_view = CurrentUserView.as_view()
+
+
+def is_async_read(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and 'text/html' not in request.headers.get('Accept', '')
+    )
+
+
+def json_response(data, status=200):
+    response = HttpResponse(
+        JSONRenderer().render(data), status=status, content_type='application/json'
+    )
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def error_response(error):
+    response = json_response({'detail': error.detail}, status=error.status_code)
+    if isinstance(error, (NotAuthenticated, AuthenticationFailed)):
+        # Как в DRF: заголовок первой схемы аутентификации
+        response['WWW-Authenticate'] = AccessTokenAuthentication().authenticate_header(None)
+    if getattr(error, 'wait', None):
+        response['Retry-After'] = str(error.wait)
+    return response
+
+
+async def aauthenticate(request):
+    # Тот же порядок, что в DEFAULT_AUTHENTICATION_CLASSES: токен, затем сессия
+    result = await sync_to_async(AccessTokenAuthentication().authenticate)(request)
+    if result is not None:
+        user = result[0]
+    else:
+        user = await sync_to_async(auth.get_user)(request)
+    request.user = user
+    # Те же ограничения частоты, что DRF применяет к view из api/views.py
+    await sync_to_async(check_throttles)(request)
+    return user
+
+
+def check_throttles(request):
+    waits = []
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            waits.append(throttle.wait())
+    if waits:
+        raise Throttled(max(waits))
+
+
+async def aconditional_response(request, etag, last_modified, build_response):
+    # Асинхронный вариант api.views.conditional_response
+    etag, timestamp = make_validators(etag, last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = await build_response()
+    return add_validators(response, etag, timestamp)
+
+
+async def post_list(request):
+    if (
+        not is_async_read(request)
+        or not cache_enabled()
+        or set(request.GET) - PostViewSet.cached_list_params
+    ):
+        return await sync_to_async(post_list_view)(request)
+
+    try:
+        user = await aauthenticate(request)
+        etag = f'{await aget_feed_version()}:{user.id}:{request.get_full_path()}'
+
+        async def build_response():
+            paginator = PostCursorPagination()
+            rows, complete = await aget_feed()
+            ids = paginator.paginate_rows(rows, complete, Request(request))
+            if ids is None:
+                # Страница глубже закэшированного начала ленты
+                return await sync_to_async(post_list_view)(request)
+
+            posts = await aget_posts(ids, PostViewSet.queryset)
+            page = paginator.get_paginated_response(
+                [render_post(post, request) for post in posts]
+            )
+            return json_response(page.data)
+
+        return await aconditional_response(request, etag, None, build_response)
+    except APIException as error:
+        return error_response(error)
+
+
+async def post_detail(request, pk):
+    if (
+        not is_async_read(request)
+        or not cache_enabled()
+        or {'fields', 'expand'} & set(request.GET)
+    ):
+        return await sync_to_async(post_detail_view)(request, pk=pk)
+
+    try:
+        user = await aauthenticate(request)
+        posts = await aget_posts([pk], PostViewSet.queryset)
+        if not posts:
+            raise NotFound()
+    except APIException as error:
+        return error_response(error)
+
+    post = posts[0]
+    updated_at = parse_datetime(post['updated_at'])
+    etag = post_etag(pk, updated_at, user.id, post['author'])
+
+    async def build_response():
+        return json_response(render_post(post, request))
+
+    return await aconditional_response(request, etag, updated_at, build_response)
+
+
+async def current_user(request):
+    if not is_async_read(request):
+        return await sync_to_async(current_user_view)(request)
+
+    try:
+        user = await aauthenticate(request)
+        if not user.is_authenticated:
+            raise NotAuthenticated()
+    except APIException as error:
+        return error_response(error)
+
+    etag = f'{user.id}:{user.username}:{user.email}'
+
+    async def build_response():
+        return json_response(UserSerializer(user).data)
+
+    return await aconditional_response(request, etag, None, build_response)
+
+
+# CSRF проверяет DRF (SessionAuthentication), как и для view из api/views.py.
+# csrf_exempt в Django 4.2 не поддерживает async-функции, ставим признак сами.
+post_list.csrf_exempt = True
+post_detail.csrf_exempt = True
+current_user.csrf_exempt = True
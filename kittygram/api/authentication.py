@@ -0,0 +1,35 @@
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from .tokens import TokenError, user_from_access_token
+
+
+class AccessTokenAuthentication(BaseAuthentication):
+    """
+    Заголовок "Authorization: Bearer <access-токен>" (см. api/tokens.py).
+
+    В отличие от SessionAuthentication не читает сессию и не требует
+    CSRF-токена: учётные данные не отправляются браузером автоматически.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if len(auth) != 2:
+            raise AuthenticationFailed('Неверный заголовок Authorization')
+
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed('Неверный токен')
+
+        try:
+            user = user_from_access_token(token)
+        except TokenError as error:
+            raise AuthenticationFailed(str(error))
+        return user, token
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db import DEFAULT_DB_ALIAS
+
+USER_KEY = 'users:user:{}'
+# Поля пользователя в кэше: всё, кроме хэша пароля
+CACHED_FIELDS = [field.attname for field in User._meta.concrete_fields if field.name != 'password']
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend, который берёт пользователя сессии из кэша.
+
+    Без него каждый аутентифицированный запрос делает SELECT в auth_user.
+    В кэше лежат поля пользователя без хэша пароля и готовый session hash,
+    поэтому выход на всех устройствах после смены пароля работает как
+    прежде. Пароль у такого объекта отложенное поле (как после .defer()):
+    читается из БД при обращении, а save() пишет только загруженные поля.
+    Запись сбрасывается при сохранении и удалении пользователя
+    (api/signals.py).
+
+    В AUTHENTICATION_BACKENDS за ним следует ModelBackend, которым
+    подписаны сессии, созданные до его подключения.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username, password, **kwargs)
+        if user is None:
+            # ModelBackend после нас отклонит те же данные, а второй
+            # расчёт хэша пароля только удвоит время неудачного входа
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        key = USER_KEY.format(user_id)
+        data = cache.get(key)
+        if data is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                data = {
+                    'fields': [getattr(user, name) for name in CACHED_FIELDS],
+                    'session_hash': user.get_session_auth_hash(),
+                }
+                cache.set(key, data, settings.USER_CACHE_TIMEOUT)
+            return user
+
+        user = User.from_db(DEFAULT_DB_ALIAS, CACHED_FIELDS, data['fields'])
+        session_hash = data['session_hash']
+        user.get_session_auth_hash = lambda: session_hash
+        return user if self.user_can_authenticate(user) else None
+
+
+def invalidate_user(pk):
+    cache.delete(USER_KEY.format(pk))
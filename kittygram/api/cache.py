@@ -0,0 +1,231 @@
+"""
+Кэш ленты и отдельных постов поверх Django cache (settings.CACHES).
+
+В кэше лежат:
+    posts:feed          - начало ленты списком (created_at, id) и признак,
+                          что в него поместилась вся лента;
+    posts:feed:version  - версия ленты для ETag: счётчик, который увеличивает
+                          каждый сброс (используется и при POSTS_CACHE_ENABLED=False).
+                          С кэшем в памяти процесса (SHARED_CACHE=False) счётчик
+                          не видит записей других процессов, и к нему добавляется
+                          последнее изменение и число постов из БД;
+    posts:post:<id>     - пост, сериализованный PostSerializer без запроса
+                          (относительные URL, без can_edit).
+
+Поля, зависящие от запроса (абсолютные URL и can_edit), дописываются
+при ответе в render_post. Записи сбрасываются при сохранении и удалении
+поста, а также при смене имени или email его автора (api/signals.py);
+update() и bulk_create сигналов не отправляют, после них нужно вызывать
+invalidate_post самостоятельно.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from .models import Post
+from .serializers import PostSerializer
+
+FEED_KEY = 'posts:feed'
+FEED_VERSION_KEY = 'posts:feed:version'
+POST_KEY = 'posts:post:{}'
+HITS_KEY = 'posts:stats:hits'
+MISSES_KEY = 'posts:stats:misses'
+
+
+def cache_enabled():
+    return settings.POSTS_CACHE_ENABLED
+
+
+def feed_rows():
+    # Только (created_at, id) - запрос читает один индекс post_created_idx
+    limit = settings.POSTS_CACHE_FEED_SIZE
+    return Post.objects.order_by('-created_at', '-id').values_list('created_at', 'id')[:limit + 1]
+
+
+def build_feed(rows):
+    limit = settings.POSTS_CACHE_FEED_SIZE
+    return rows[:limit], len(rows) <= limit
+
+
+def get_feed():
+    feed = cache.get(FEED_KEY)
+    if feed is not None:
+        record_stats(hits=1)
+        return feed
+
+    record_stats(misses=1)
+    feed = build_feed(list(feed_rows()))
+    cache.set(FEED_KEY, feed, settings.POSTS_CACHE_TIMEOUT)
+    return feed
+
+
+async def aget_feed():
+    feed = await cache.aget(FEED_KEY)
+    if feed is not None:
+        await arecord_stats(hits=1)
+        return feed
+
+    await arecord_stats(misses=1)
+    feed = build_feed([row async for row in feed_rows()])
+    await cache.aset(FEED_KEY, feed, settings.POSTS_CACHE_TIMEOUT)
+    return feed
+
+
+# Изменения постов, сделанные другими процессами, при кэше в памяти процесса
+FEED_STATS = {'updated': Max('updated_at'), 'count': Count('id')}
+
+
+def build_feed_version(stats):
+    updated = stats['updated'].isoformat() if stats['updated'] else ''
+    return f"{updated}:{stats['count']}"
+
+
+def get_feed_version():
+    # Меняется при любом создании, изменении или удалении поста;
+    # с общим кэшем - без запроса к БД
+    version = cache.get(FEED_VERSION_KEY)
+    if version is None:
+        # Начальное значение - время: после потери кэша версии не повторяются
+        cache.add(FEED_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(FEED_VERSION_KEY)
+    if not settings.SHARED_CACHE:
+        version = f"{build_feed_version(Post.objects.aggregate(**FEED_STATS))}:{version}"
+    return version
+
+
+async def aget_feed_version():
+    version = await cache.aget(FEED_VERSION_KEY)
+    if version is None:
+        await cache.aadd(FEED_VERSION_KEY, time.time_ns(), None)
+        version = await cache.aget(FEED_VERSION_KEY)
+    if not settings.SHARED_CACHE:
+        version = f"{build_feed_version(await Post.objects.aaggregate(**FEED_STATS))}:{version}"
+    return version
+
+
+def serialize_posts(posts):
+    # Без запроса в контексте: относительные URL и без can_edit
+    serialized = {}
+    for data in PostSerializer(posts, many=True).data:
+        data = dict(data)
+        data.pop('can_edit', None)
+        serialized[data['id']] = data
+    return serialized
+
+
+def cacheable(posts):
+    # Пост с необработанной фотографией не кэшируем: его статус меняет
+    # воркер run_worker, и фронтенд опрашивает пост, пока обработка не закончится
+    return {
+        POST_KEY.format(pk): data for pk, data in posts.items()
+        if data['image_status'] != Post.IMAGE_PROCESSING
+    }
+
+
+def get_posts(ids, queryset):
+    """
+    Возвращает сериализованные посты в порядке ids. Недостающие в кэше
+    посты выбираются одним запросом из queryset и кладутся в кэш.
+    """
+    keys = {POST_KEY.format(pk): pk for pk in ids}
+    posts = {keys[key]: data for key, data in cache.get_many(keys).items()}
+    missing = [pk for pk in ids if pk not in posts]
+    record_stats(hits=len(posts), misses=len(missing))
+
+    if missing:
+        fetched = serialize_posts(queryset.filter(pk__in=missing).order_by())
+        cache.set_many(cacheable(fetched), settings.POSTS_CACHE_TIMEOUT)
+        posts.update(fetched)
+
+    # Удалённые посты просто пропускаем
+    return [posts[pk] for pk in ids if pk in posts]
+
+
+async def aget_posts(ids, queryset):
+    keys = {POST_KEY.format(pk): pk for pk in ids}
+    posts = {keys[key]: data for key, data in (await cache.aget_many(keys)).items()}
+    missing = [pk for pk in ids if pk not in posts]
+    await arecord_stats(hits=len(posts), misses=len(missing))
+
+    if missing:
+        # Автор уже в select_related, сериализация к БД не обращается
+        fetched = serialize_posts(
+            [post async for post in queryset.filter(pk__in=missing).order_by()]
+        )
+        await cache.aset_many(cacheable(fetched), settings.POSTS_CACHE_TIMEOUT)
+        posts.update(fetched)
+
+    return [posts[pk] for pk in ids if pk in posts]
+
+
+def render_post(data, request):
+    # Копия из кэша, дополненная полями конкретного запроса
+    data = dict(data)
+    if data.get('image'):
+        data['image'] = request.build_absolute_uri(data['image'])
+    data['image_srcset'] = {
+        image_format: ', '.join(
+            f'{request.build_absolute_uri(url)} {width}'
+            for url, width in (item.rsplit(' ', 1) for item in srcset.split(', '))
+        )
+        for image_format, srcset in (data.get('image_srcset') or {}).items()
+    }
+    data['can_edit'] = bool(
+        request.user.is_authenticated and data['author']['id'] == request.user.id
+    )
+    return data
+
+
+def invalidate_post(pk):
+    invalidate_posts([pk])
+
+
+def invalidate_posts(pks):
+    # После bulk_create/bulk_update, которые не отправляют post_save
+    cache.delete_many([POST_KEY.format(pk) for pk in pks] + [FEED_KEY])
+    try:
+        cache.incr(FEED_VERSION_KEY)
+    except ValueError:
+        # Версии ещё нет: следующий запрос возьмёт новую
+        pass
+
+
+def record_stats(hits=0, misses=0):
+    # Счётчики общие для всех воркеров, если общий сам кэш (файл или Redis)
+    for key, value in ((HITS_KEY, hits), (MISSES_KEY, misses)):
+        if not value:
+            continue
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            if not cache.add(key, value, None):
+                cache.incr(key, value)
+
+
+async def arecord_stats(hits=0, misses=0):
+    for key, value in ((HITS_KEY, hits), (MISSES_KEY, misses)):
+        if not value:
+            continue
+        try:
+            await cache.aincr(key, value)
+        except ValueError:
+            if not await cache.aadd(key, value, None):
+                await cache.aincr(key, value)
+
+
+def get_stats():
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = values.get(HITS_KEY, 0)
+    misses = values.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,249 @@
+"""
+Массовое удаление постов и пользователей без Collector Django.
+
+QuerySet.delete() загружает в память каждый удаляемый объект (и все
+посты удаляемых пользователей), чтобы разрешить CASCADE и отправить
+сигналы. BulkDeleter вместо этого работает с множествами:
+
+    delete(queryset) - id выбираются пачками по chunk_size, для каждой пачки
+                       сначала удаляются зависимые строки (CASCADE, таблицы
+                       M2M), затем сами строки - сырыми DELETE ... WHERE id IN;
+    truncate(*models) - удаление всех строк моделей и зависимых таблиц одной
+                       командой: TRUNCATE на PostgreSQL, DELETE без WHERE
+                       (truncate-оптимизация) на SQLite.
+
+Сигналы post_delete не отправляются, поэтому записи кэша постов и
+пользователей сбрасываются здесь же (только они: в том же кэше лежат сессии
+и счётчики лимитов), а фотографии, на которые больше не ссылается ни один
+пост, удаляются в пуле потоков параллельно с удалением следующих пачек.
+"""
+
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections, models
+from django.db.models import Max, Min
+from . import search
+from .backends import USER_KEY
+from .cache import POST_KEY, invalidate_posts
+from .images import delete_derivatives, delete_orphan_images
+from .models import Post
+
+
+def cascade_tables(model, tables=None):
+    # Таблица модели и все таблицы, строки которых удаляются вместе с ней
+    tables = tables if tables is not None else []
+    if model._meta.db_table in tables:
+        return tables
+    tables.append(model._meta.db_table)
+    for field in model._meta.many_to_many:
+        cascade_tables(field.remote_field.through, tables)
+    for relation in model._meta.related_objects:
+        if relation.many_to_many:
+            cascade_tables(relation.through, tables)
+        elif relation.on_delete is models.CASCADE:
+            cascade_tables(relation.related_model, tables)
+    return tables
+
+
+class BulkDeleter:
+    def __init__(self, chunk_size=5000, workers=8, using=DEFAULT_DB_ALIAS, report=None):
+        self.chunk_size = chunk_size
+        self.using = using
+        self.report = report or (lambda message: None)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.file_tasks = []
+        self.deleted = {}
+        self.started = perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        # Пробрасываем ошибки удаления файлов
+        files = sum(task.result() for task in self.file_tasks)
+        if files:
+            self.deleted['files'] = self.deleted.get('files', 0) + files
+
+    def progress(self, model):
+        label = model._meta.verbose_name_plural
+        count = self.deleted.get(model._meta.label, 0)
+        elapsed = perf_counter() - self.started
+        rate = count / elapsed if elapsed else 0
+        self.report(f'{label}: удалено {count} ({rate:.0f} в секунду)')
+
+    def count(self, model, deleted):
+        self.deleted[model._meta.label] = self.deleted.get(model._meta.label, 0) + deleted
+
+    def delete(self, queryset):
+        """
+        Удаляет строки queryset пачками; возвращает число удалённых строк
+        самой модели (зависимые учитываются в self.deleted).
+        """
+        model = queryset.model
+        ids_queryset = queryset.using(self.using).order_by('pk').values_list('pk', flat=True)
+        total = 0
+
+        while True:
+            # Удалённые строки из выборки пропадают, поэтому всегда берём первые
+            ids = list(ids_queryset[:self.chunk_size])
+            if not ids:
+                break
+            total += self.delete_chunk(model, ids)
+            self.progress(model)
+
+        return total
+
+    def delete_chunk(self, model, ids):
+        manager = model._base_manager.using(self.using)
+
+        for field in model._meta.many_to_many:
+            through = field.remote_field.through._base_manager.using(self.using)
+            through.filter(**{f'{field.m2m_field_name()}__in': ids})._raw_delete(self.using)
+
+        for relation in model._meta.related_objects:
+            related = relation.related_model._base_manager.using(self.using)
+            if relation.many_to_many:
+                through = relation.through._base_manager.using(self.using)
+                name = relation.field.m2m_reverse_field_name()
+                through.filter(**{f'{name}__in': ids})._raw_delete(self.using)
+            elif relation.on_delete is models.CASCADE:
+                self.delete(related.filter(**{f'{relation.field.name}__in': ids}))
+            elif relation.on_delete is models.SET_NULL:
+                related.filter(**{f'{relation.field.name}__in': ids}).update(
+                    **{relation.field.name: None}
+                )
+            elif relation.on_delete is not models.DO_NOTHING:
+                raise NotSupportedError(
+                    f'{relation.related_model._meta.label}.{relation.field.name}: '
+                    f'{relation.on_delete.__name__} не поддерживается'
+                )
+
+        images = set()
+        if model is Post:
+            images = set(manager.filter(pk__in=ids).values_list('image', flat=True)) - {''}
+
+        deleted = manager.filter(pk__in=ids)._raw_delete(self.using)
+        self.count(model, deleted)
+
+        if model is Post:
+            invalidate_posts(ids)
+            self.release_images(images)
+        elif model is User:
+            cache.delete_many([USER_KEY.format(pk) for pk in ids])
+        return deleted
+
+    def release_images(self, names):
+        # Файл удаляется, только если на него не ссылается ни один оставшийся пост
+        referenced = set(
+            Post._base_manager.using(self.using).filter(image__in=names)
+                                                .values_list('image', flat=True)
+        )
+        for name in names - referenced:
+            self.file_tasks.append(self.executor.submit(remove_image, name))
+
+    def truncate(self, *models):
+        """
+        Удаляет все строки моделей и зависящих от них таблиц. Файлы
+        фотографий удаляются целиком по каталогам-шардам posts/<xx>/.
+        """
+        connection = connections[self.using]
+        tables = []
+        for model in models:
+            cascade_tables(model, tables)
+        for model in models:
+            self.count(model, model._base_manager.using(self.using).count())
+        # Диапазоны id удаляемых строк, записи которых могут быть в кэше
+        cached = [
+            (key, model._base_manager.using(self.using).aggregate(first=Min('pk'), last=Max('pk')))
+            for model, key in ((Post, POST_KEY), (User, USER_KEY))
+            if model._meta.db_table in tables
+        ]
+
+        sql = connection.ops.sql_flush(no_style(), tables, allow_cascade=True)
+        if connection.vendor == 'sqlite':
+            # Триггеры поиска отключили бы truncate-оптимизацию SQLite:
+            # убираем индекс и создаём его заново уже пустым
+            search.uninstall(connection)
+            with connection.constraint_checks_disabled():
+                connection.ops.execute_sql_flush(sql)
+            search.install(connection)
+        else:
+            connection.ops.execute_sql_flush(sql)
+
+        for model in models:
+            self.progress(model)
+
+        for key, pks in cached:
+            self.invalidate_range(key, pks['first'], pks['last'])
+        if cached:
+            invalidate_posts([])
+        if Post in models:
+            self.remove_all_images()
+
+    def invalidate_range(self, key, first, last):
+        # id выдаются подряд, поэтому перебираем диапазон, не выбирая сами id
+        if first is None:
+            return
+        for start in range(first, last + 1, self.chunk_size):
+            stop = min(start + self.chunk_size, last + 1)
+            cache.delete_many([key.format(pk) for pk in range(start, stop)])
+
+    def remove_all_images(self, root='posts'):
+        storage = Post._meta.get_field('image').storage
+        try:
+            directories, files = storage.listdir(root)
+        except FileNotFoundError:
+            return
+
+        for directory in directories:
+            self.file_tasks.append(
+                self.executor.submit(remove_directory, storage, f'{root}/{directory}')
+            )
+        for filename in files:
+            self.file_tasks.append(self.executor.submit(remove_image, f'{root}/{filename}'))
+
+
+def clear_all(batched=False, chunk_size=5000, workers=8, report=None):
+    """
+    Удаляет все посты и всех пользователей вместе с файлами фотографий
+    (clear_database, load_test_data). batched - пачками вместо TRUNCATE,
+    например если у пользователя БД нет права на TRUNCATE.
+    """
+    with BulkDeleter(chunk_size=chunk_size, workers=workers, report=report) as deleter:
+        if batched:
+            deleter.delete(Post.objects.all())
+            deleter.delete(User.objects.all())
+        else:
+            deleter.truncate(Post, User)
+
+    # Файлы, на которые не ссылались посты ещё до удаления
+    files = deleter.deleted.get('files', 0) + delete_orphan_images()
+    return {
+        'posts': deleter.deleted.get(Post._meta.label, 0),
+        'users': deleter.deleted.get(User._meta.label, 0),
+        'files': files,
+        'seconds': perf_counter() - deleter.started,
+    }
+
+
+def remove_image(name):
+    storage = Post._meta.get_field('image').storage
+    storage.delete(name)
+    delete_derivatives(name)
+    return 1
+
+
+def remove_directory(storage, directory):
+    # Каталог-шард posts/<xx>/ с оригиналами и копиями; возвращает число оригиналов
+    _, files = storage.listdir(directory)
+    shutil.rmtree(storage.path(directory), ignore_errors=True)
+    return len(files)
@@ -0,0 +1,34 @@
+"""
+Хэшеры паролей с параметрами из настроек (PASSWORD_HASHER в settings.py).
+
+Стоимость хэширования - это процессорное время синхронного воркера на каждый
+вход. PBKDF2 с 600 000 итераций занимает ~350 мс, scrypt с N=2^14 - ~80 мс
+при сопоставимой стойкости за счёт затрат памяти (16 МБ на хэш).
+Хэши старых алгоритмов и параметров пересчитываются при входе
+(Django делает это в check_password, если хэшер не первый в списке
+или must_update вернул True).
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    # Нужен пакет argon2-cffi
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
@@ -0,0 +1,196 @@
+import os
+import uuid
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from .models import Post
+
+# Ширины уменьшенных копий и форматы, в которых они сохраняются
+DERIVATIVE_WIDTHS = (320, 640, 1280)
+DERIVATIVE_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+# Параметры повторного кодирования оригинала (без EXIF и прочих метаданных)
+ORIGINAL_SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+
+
+def derivatives_dir(image_name):
+    # posts/3f/3fa2...e1.jpg -> posts/3f/derivatives/3fa2...e1
+    path = PurePosixPath(image_name)
+    return str(path.parent / 'derivatives' / path.stem)
+
+
+def derivative_name(image_name, width, extension):
+    return f'{derivatives_dir(image_name)}/{width}.{extension}'
+
+
+def delete_derivatives(image_name):
+    directory = derivatives_dir(image_name)
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        default_storage.delete(f'{directory}/{filename}')
+
+
+def release_image(image_name):
+    """
+    Снимает ссылку на файл фотографии: если ни один пост больше на него
+    не ссылается, удаляет оригинал и его уменьшенные копии.
+
+    Одновременно может сохраняться новый пост с той же фотографией (файл
+    уже существовал, и хранилище его не записывало). Поэтому файл сначала
+    переименовывается, а ссылки проверяются ещё раз: если пост успел
+    сохраниться, файл возвращается на место. Пост, сохранённый позже,
+    не найдёт файла и запишет его заново (restore_image).
+    """
+    if not image_name or Post.objects.filter(image=image_name).exists():
+        return False
+
+    path = Post._meta.get_field('image').storage.path(image_name)
+    released = f'{path}.released-{uuid.uuid4().hex}'
+    try:
+        os.rename(path, released)
+    except FileNotFoundError:
+        return False
+
+    if Post.objects.filter(image=image_name).exists():
+        os.replace(released, path)
+        return False
+    os.remove(released)
+    delete_derivatives(image_name)
+    return True
+
+
+def restore_image(image_name, content):
+    """
+    Вызывается после сохранения поста, которому хранилище отдало уже
+    существующий файл: восстанавливает файл, если его удалил release_image.
+    """
+    if image_name:
+        Post._meta.get_field('image').storage.restore(image_name, content)
+
+
+def delete_orphan_images(root='posts'):
+    # Удаляет фотографии и копии, на которые не ссылается ни один пост
+    storage = Post._meta.get_field('image').storage
+    referenced = set(Post.objects.exclude(image='').values_list('image', flat=True))
+    referenced_derivatives = {derivatives_dir(name) for name in referenced}
+    deleted = 0
+
+    def walk(directory):
+        nonlocal deleted
+        try:
+            directories, files = storage.listdir(directory)
+        except FileNotFoundError:
+            return
+
+        for filename in files:
+            name = f'{directory}/{filename}'
+            if name not in referenced:
+                storage.delete(name)
+                deleted += 1
+
+        for subdirectory in directories:
+            if subdirectory != 'derivatives':
+                walk(f'{directory}/{subdirectory}')
+                continue
+
+            sources, _ = storage.listdir(f'{directory}/derivatives')
+            for source in sources:
+                source_dir = f'{directory}/derivatives/{source}'
+                if source_dir not in referenced_derivatives:
+                    delete_derivatives(f'{directory}/{source}')
+
+    walk(root)
+    return deleted
+
+
+def strip_image_metadata(image_field):
+    """
+    Перекодирует оригинал без EXIF (геометки, модель камеры и т. п.),
+    применяя поворот из EXIF к пикселям. Возвращает имя сохранённого файла
+    и его содержимое (None, если оригинал оставлен как есть).
+    """
+    image_field.open('rb')
+    try:
+        with Image.open(image_field) as original:
+            image_format = original.format
+            # Анимацию и редкие форматы оставляем как есть
+            if getattr(original, 'is_animated', False) or image_format not in ORIGINAL_SAVE_OPTIONS:
+                return image_field.name, None
+
+            image = ImageOps.exif_transpose(original)
+            if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+
+            buffer = BytesIO()
+            image.save(buffer, format=image_format, **ORIGINAL_SAVE_OPTIONS[image_format])
+    finally:
+        image_field.close()
+
+    # Новое содержимое получает новое имя (upload_to + хэш);
+    # прежний файл освобождает вызывающий код
+    content = ContentFile(buffer.getvalue())
+    image_field.save(PurePosixPath(image_field.name).name, content, save=False)
+    return image_field.name, content
+
+
+def build_derivatives(image_field):
+    """
+    Генерирует уменьшенные копии изображения поста и возвращает их описание:
+    [{'name': 'posts/3f/derivatives/3fa2...e1/320.webp', 'width': 320, 'format': 'webp'}, ...]
+    """
+    image_field.open('rb')
+    try:
+        with Image.open(image_field) as original:
+            # Учитываем поворот из EXIF, иначе копии будут лежать на боку
+            original = ImageOps.exif_transpose(original)
+            if original.mode not in ('RGB', 'L'):
+                original = original.convert('RGB')
+
+            # Не увеличиваем картинки: ширины больше оригинала заменяются им самим
+            widths = sorted({min(width, original.width) for width in DERIVATIVE_WIDTHS})
+
+            variants = []
+            for width in widths:
+                names = {
+                    extension: derivative_name(image_field.name, width, extension)
+                    for extension in DERIVATIVE_FORMATS
+                }
+                # Имя оригинала определяется содержимым, поэтому готовые
+                # копии того же файла (дубликата) переиспользуем
+                missing = [
+                    extension for extension, name in names.items()
+                    if not default_storage.exists(name)
+                ]
+
+                if missing:
+                    height = max(1, round(original.height * width / original.width))
+                    resized = original.resize((width, height), Image.Resampling.LANCZOS)
+
+                for extension, name in names.items():
+                    if extension in missing:
+                        buffer = BytesIO()
+                        resized.save(buffer, **DERIVATIVE_FORMATS[extension])
+                        name = default_storage.save(name, ContentFile(buffer.getvalue()))
+                    variants.append({'name': name, 'width': width, 'format': extension})
+    finally:
+        image_field.close()
+
+    return variants
+
+
+def refresh_post_derivatives(post):
+    post.image_variants = build_derivatives(post.image) if post.image else []
+    post.save(update_fields=['image_variants', 'updated_at'])
@@ -0,0 +1,101 @@
+"""
+Простая очередь фоновых задач в базе данных (без внешнего брокера).
+
+Задача регистрируется декоратором @task('имя'), ставится в очередь через
+enqueue('имя', **параметры) и выполняется командой manage.py run_worker.
+"""
+
+import logging
+import traceback
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+# Задача, взятая упавшим воркером, снова становится доступной через это время
+LOCK_TIMEOUT = timedelta(minutes=10)
+RETRY_DELAY = timedelta(seconds=30)
+
+TASKS = {}
+
+
+def task(name, on_failure=None):
+    # on_failure(**payload) вызывается, когда попытки исчерпаны
+    def decorator(func):
+        TASKS[name] = (func, on_failure)
+        return func
+    return decorator
+
+
+def enqueue(task_name, **payload):
+    if task_name not in TASKS:
+        raise ValueError(f'Неизвестная фоновая задача: {task_name}')
+    return Job.objects.create(task=task_name, payload=payload)
+
+
+def available_jobs(now):
+    return Job.objects.filter(
+        Q(status=Job.STATUS_PENDING, run_after__lte=now)
+        | Q(status=Job.STATUS_RUNNING, locked_at__lt=now - LOCK_TIMEOUT)
+    )
+
+
+def claim_next_job():
+    now = timezone.now()
+    candidates = available_jobs(now).order_by('run_after', 'id').values_list('pk', flat=True)[:10]
+
+    for pk in candidates:
+        # Условный UPDATE атомарен: задачу получит только один воркер
+        claimed = available_jobs(now).filter(pk=pk).update(
+            status=Job.STATUS_RUNNING,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run_job(job):
+    if job.task not in TASKS:
+        job.status = Job.STATUS_FAILED
+        job.last_error = f'Неизвестная фоновая задача: {job.task}'
+        job.save(update_fields=['status', 'last_error'])
+        return False
+
+    func, on_failure = TASKS[job.task]
+    try:
+        func(**job.payload)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась с ошибкой', job)
+        job.last_error = traceback.format_exc()
+
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = Job.STATUS_FAILED
+            if on_failure:
+                on_failure(**job.payload)
+        else:
+            job.status = Job.STATUS_PENDING
+            job.run_after = timezone.now() + RETRY_DELAY * job.attempts
+        job.locked_at = None
+        job.save(update_fields=['status', 'last_error', 'run_after', 'locked_at'])
+        return False
+
+    # Выполненные задачи не храним, чтобы таблица оставалась маленькой
+    job.delete()
+    return True
+
+
+def run_pending_jobs(limit=None):
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
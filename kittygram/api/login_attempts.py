@@ -0,0 +1,74 @@
+"""
+Ограничение попыток входа по IP-адресу и по имени пользователя.
+
+Каждая проверка пароля стоит десятки миллисекунд процессорного времени
+воркера, поэтому после LOGIN_ATTEMPT_LIMITS попыток за окно запрос отклоняется
+с 429 ещё до authenticate(). Попытка резервируется атомарным incr счётчика
+окна до проверки пароля: параллельные запросы не проходят проверку все
+разом. Неудачная попытка так и остаётся в счётчике, успешная его
+освобождает. Retry-After - время до конца окна.
+"""
+
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+ATTEMPTS_KEY = 'auth:attempts:{}:{}:{}'
+
+
+def increment(key, timeout):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout):
+            return 1
+        return cache.incr(key)
+
+
+def decrement(key):
+    try:
+        cache.decr(key)
+    except ValueError:
+        # Окно уже истекло
+        pass
+
+
+class LoginAttempts:
+    def __init__(self, request, username):
+        ident = BaseThrottle().get_ident(request)
+        username = hashlib.md5(username.lower().encode()).hexdigest()
+        self.idents = {'ip': ident, 'username': username}
+        self.reserved = {}
+
+    def reserve(self):
+        """
+        Занимает попытку во всех областях. Возвращает 0 или, если лимит
+        исчерпан, сколько секунд ждать (попытка тогда не засчитывается).
+        """
+        now = time.time()
+        wait = 0
+        for scope, ident in self.idents.items():
+            limit, window = settings.LOGIN_ATTEMPT_LIMITS[scope]
+            key = ATTEMPTS_KEY.format(scope, ident, int(now // window))
+            self.reserved[scope] = key
+            if increment(key, window) > limit:
+                wait = max(wait, window - now % window)
+
+        if wait:
+            self.release()
+        return math.ceil(wait)
+
+    def release(self):
+        for key in self.reserved.values():
+            decrement(key)
+        self.reserved = {}
+
+    def succeeded(self):
+        # Успешный вход не тратит попытку и снимает блокировку имени, но не IP-адреса
+        username_key = self.reserved.pop('username')
+        self.release()
+        cache.delete(username_key)
@@ -0,0 +1,71 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+# Прежняя конфигурация и текущая: сессия и пользователь из кэша
+CONFIGURATIONS = [
+    ('Сессии в БД, пользователь из БД', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+    }),
+    ('Сессии cached_db, пользователь из кэша', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+        'AUTHENTICATION_BACKENDS': [
+            'api.backends.CachedModelBackend',
+            'django.contrib.auth.backends.ModelBackend',
+        ],
+    }),
+]
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает число запросов в секунду и запросов к БД для ленты '
+        'аутентифицированного пользователя с сессиями в БД и в кэше'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Количество запросов для каждой конфигурации (по умолчанию 500)',
+        )
+        parser.add_argument(
+            '--url',
+            default='/api/posts/',
+            help='Адрес запроса (по умолчанию /api/posts/)',
+        )
+
+    def measure(self, user, overrides, requests, url):
+        with override_settings(**overrides):
+            client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            client.force_login(user, backend=overrides['AUTHENTICATION_BACKENDS'][0])
+            # Прогрев: кэш ленты и первое чтение сессии
+            client.get(url)
+
+            with CaptureQueriesContext(connection) as queries:
+                started = perf_counter()
+                for _ in range(requests):
+                    response = client.get(url)
+                    if response.status_code != 200:
+                        raise RuntimeError(f'{url} вернул {response.status_code}')
+                elapsed = perf_counter() - started
+
+            client.logout()
+        return requests / elapsed, len(queries) / requests
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(username='benchmark_session_user')
+        try:
+            for title, overrides in CONFIGURATIONS:
+                rps, queries = self.measure(user, overrides, options['requests'], options['url'])
+                self.stdout.write(self.style.SUCCESS(
+                    f'{title}: {rps:.0f} запросов/с, запросов к БД на запрос: {queries:.1f}'
+                ))
+        finally:
+            user.delete()
@@ -0,0 +1,162 @@
+from concurrent.futures import ThreadPoolExecutor
+from statistics import quantiles
+from threading import Event
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections, transaction
+from api.models import Post
+
+# Стандартные настройки SQLite (журнал отката) для сравнения с api/signals.py
+SQLITE_BASELINE_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'busy_timeout': None,
+    'cache_size': None,
+    'mmap_size': None,
+    'temp_store': None,
+}
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест текущей БД (DATABASE_URL): параллельные писатели '
+        'создают и обновляют посты, читатели в это время листают ленту'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=3,
+            help='Количество параллельных писателей (по умолчанию 3, как воркеров gunicorn)',
+        )
+        parser.add_argument(
+            '--writes',
+            type=int,
+            default=200,
+            help='Количество постов, создаваемых каждым писателем (по умолчанию 200)',
+        )
+        parser.add_argument(
+            '--readers',
+            type=int,
+            default=3,
+            help='Количество параллельных читателей ленты (по умолчанию 3)',
+        )
+        parser.add_argument(
+            '--sqlite-pragmas',
+            choices=['tuned', 'default'],
+            default='tuned',
+            help='Для SQLite: tuned - WAL и прагмы из api/signals.py, '
+                 'default - стандартный журнал отката',
+        )
+
+    def writer(self, author, writes):
+        latencies = []
+        errors = 0
+
+        try:
+            for i in range(writes):
+                started = perf_counter()
+                try:
+                    # Создание и последующий PATCH, как в PostViewSet
+                    with transaction.atomic():
+                        post = Post.objects.create(title=f'Benchmark write {i}', author=author)
+                    with transaction.atomic():
+                        post.title = f'Benchmark write {i} (updated)'
+                        post.save(update_fields=['title'])
+                except OperationalError:
+                    # Например, "database is locked" в SQLite
+                    errors += 1
+                    continue
+                latencies.append((perf_counter() - started) * 1000)
+        finally:
+            # У каждого потока своё соединение, закрываем его сами
+            connections.close_all()
+
+        return latencies, errors
+
+    def reader(self, stop):
+        latencies = []
+        errors = 0
+
+        try:
+            while not stop.is_set():
+                started = perf_counter()
+                try:
+                    list(
+                        Post.objects.select_related('author')
+                        .order_by('-created_at', '-id')[:20]
+                    )
+                except OperationalError:
+                    errors += 1
+                    continue
+                latencies.append((perf_counter() - started) * 1000)
+        finally:
+            connections.close_all()
+
+        return latencies, errors
+
+    def report(self, title, results, elapsed):
+        latencies = sorted(latency for result, _ in results for latency in result)
+        errors = sum(errors for _, errors in results)
+
+        self.stdout.write('')
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write(self.style.SUCCESS(
+            f'Успешных операций: {len(latencies)}, ошибок блокировки: {errors}'
+        ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Пропускная способность: {len(latencies) / elapsed:.1f} операций/с'
+        ))
+
+        if len(latencies) >= 2:
+            percentiles = quantiles(latencies, n=100)
+            self.stdout.write(
+                f'Задержка: p50 {percentiles[49]:.2f} мс, '
+                f'p95 {percentiles[94]:.2f} мс, p99 {percentiles[98]:.2f} мс'
+            )
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        writes = options['writes']
+        readers = options['readers']
+
+        if connection.vendor == 'sqlite' and options['sqlite_pragmas'] == 'default':
+            settings.SQLITE_PRAGMAS = SQLITE_BASELINE_PRAGMAS
+            # Новые прагмы применяются при следующем открытии соединения
+            connections.close_all()
+
+        self.stdout.write(
+            f'Бэкенд: {connection.vendor}, писателей: {threads}, '
+            f'постов на писателя: {writes}, читателей: {readers}'
+        )
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.stdout.write(f'Режим журнала SQLite: {cursor.fetchone()[0]}')
+
+        authors = [
+            User.objects.create(username=f'benchmark_writer_{i}') for i in range(threads)
+        ]
+        stop = Event()
+
+        try:
+            started = perf_counter()
+            with ThreadPoolExecutor(max_workers=threads + readers) as executor:
+                read_futures = [executor.submit(self.reader, stop) for _ in range(readers)]
+                write_results = list(executor.map(
+                    lambda author: self.writer(author, writes), authors
+                ))
+                stop.set()
+                read_results = [future.result() for future in read_futures]
+            elapsed = perf_counter() - started
+        finally:
+            stop.set()
+            Post.objects.filter(author__in=authors).delete()
+            User.objects.filter(pk__in=[author.pk for author in authors]).delete()
+
+        self.report('Запись', write_results, elapsed)
+        if readers:
+            self.report('Чтение ленты', read_results, elapsed)
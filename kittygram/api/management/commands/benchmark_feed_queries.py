@@ -0,0 +1,136 @@
+from datetime import timedelta
+from random import randint
+from statistics import median
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from api.deletion import BulkDeleter
+from api.models import Post
+from api.views import PostViewSet
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу N тестовыми постами и сравнивает планы и время запросов '
+        'ленты и my_posts с индексами и без них (тестовые данные затем удаляются)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=50000,
+            help='Количество постов для заполнения (по умолчанию 50000)',
+        )
+        parser.add_argument(
+            '--authors',
+            type=int,
+            default=100,
+            help='Количество авторов (по умолчанию 100)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Сколько раз выполнять каждый запрос (по умолчанию 20)',
+        )
+
+    def seed(self, posts, authors):
+        self.stdout.write(f'Заполнение базы: {posts} постов, {authors} авторов...')
+
+        users = User.objects.bulk_create([
+            User(username=f'benchmark_author_{i}') for i in range(authors)
+        ])
+        if not users[0].pk:
+            # Бэкенд не вернул id после bulk_create
+            users = list(User.objects.filter(username__startswith='benchmark_author_'))
+
+        now = timezone.now()
+        Post.objects.bulk_create(
+            (
+                Post(
+                    title=f'Benchmark post {i}',
+                    author=users[i % len(users)],
+                    created_at=now - timedelta(seconds=randint(0, 365 * 24 * 3600)),
+                )
+                for i in range(posts)
+            ),
+            batch_size=1000,
+        )
+        return users[0]
+
+    def get_queries(self, author):
+        queryset = PostViewSet.queryset.order_by('-created_at', '-id')
+        middle = queryset[Post.objects.count() // 2]
+
+        return {
+            'Лента, первая страница': queryset[:20],
+            'Лента, страница по курсору': queryset.filter(
+                created_at__lt=middle.created_at
+            )[:20],
+            'my_posts, первая страница': queryset.filter(author_id=author.id)[:20],
+        }
+
+    def measure(self, title, queries, repeat):
+        self.stdout.write('')
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+
+        timings = {}
+        for name, queryset in queries.items():
+            samples = []
+            for _ in range(repeat):
+                started = perf_counter()
+                list(queryset.all())
+                samples.append((perf_counter() - started) * 1000)
+
+            timings[name] = median(samples)
+            self.stdout.write(f'{name}: {timings[name]:.2f} мс (медиана)')
+            self.stdout.write(queryset.explain())
+        return timings
+
+    def set_indexes(self, enabled):
+        with connection.schema_editor() as editor:
+            for index in Post._meta.indexes:
+                if enabled:
+                    editor.add_index(Post, index)
+                else:
+                    editor.remove_index(Post, index)
+
+        # Переоткрываем соединение, чтобы не получить закэшированные планы
+        connection.close()
+
+    def handle(self, *args, **options):
+        author = self.seed(options['posts'], options['authors'])
+        indexes_enabled = True
+
+        try:
+            queries = self.get_queries(author)
+
+            self.set_indexes(False)
+            indexes_enabled = False
+            before = self.measure('Без индексов', queries, options['repeat'])
+
+            self.set_indexes(True)
+            indexes_enabled = True
+            after = self.measure('С индексами', queries, options['repeat'])
+        finally:
+            if not indexes_enabled:
+                self.set_indexes(True)
+
+            self.stdout.write('')
+            self.stdout.write('Удаление тестовых данных...')
+            with BulkDeleter() as deleter:
+                deleter.delete(User.objects.filter(username__startswith='benchmark_author_'))
+
+        self.stdout.write('')
+        self.stdout.write(self.style.MIGRATE_HEADING('Итог'))
+        for name in queries:
+            speedup = before[name] / after[name] if after[name] else 0
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{name}: {before[name]:.2f} мс -> {after[name]:.2f} мс '
+                    f'(x{speedup:.1f})'
+                )
+            )
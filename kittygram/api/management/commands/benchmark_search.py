@@ -0,0 +1,111 @@
+from datetime import timedelta
+from random import choice, randint, sample, seed
+from statistics import median
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from api.deletion import BulkDeleter
+from api.models import Post
+from api.search import search_posts
+from api.views import PostViewSet
+
+WORDS = [
+    'кот', 'кошка', 'котёнок', 'рыжий', 'серый', 'пушистый', 'спит', 'играет',
+    'диван', 'окно', 'солнце', 'мышь', 'клубок', 'молоко', 'лапы', 'хвост',
+    'усы', 'мурчит', 'прыгает', 'коробка', 'утро', 'вечер', 'дача', 'двор',
+]
+# Редкое слово попадает примерно в один пост из тысячи
+RARE_WORD = 'сфинкс'
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу N тестовыми постами и сравнивает время поиска '
+        'по полнотекстовому индексу и через icontains (тестовые данные затем удаляются)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=100000,
+            help='Количество постов для заполнения (по умолчанию 100000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Сколько раз выполнять каждый запрос (по умолчанию 20)',
+        )
+
+    def text(self, length):
+        # Частые слова плюс длинный хвост уникальных, как в живых описаниях
+        words = sample(WORDS, 3) + [f'слово{randint(0, 20000)}' for _ in range(length)]
+        if randint(0, 999) == 0:
+            words.append(RARE_WORD)
+        return ' '.join(words)
+
+    def seed(self, posts):
+        self.stdout.write(f'Заполнение базы: {posts} постов...')
+        seed(1)
+        author = User.objects.create_user(username='benchmark_search_author')
+        now = timezone.now()
+
+        started = perf_counter()
+        Post.objects.bulk_create(
+            (
+                Post(
+                    title=f'{choice(WORDS)} {choice(WORDS)}',
+                    description=self.text(40),
+                    author=author,
+                    created_at=now - timedelta(seconds=randint(0, 365 * 24 * 3600)),
+                )
+                for _ in range(posts)
+            ),
+            batch_size=1000,
+        )
+        self.stdout.write(
+            f'Вставка с обновлением индекса: {perf_counter() - started:.1f} с'
+        )
+
+    def measure(self, queryset, repeat):
+        samples = []
+        for _ in range(repeat):
+            started = perf_counter()
+            results = list(queryset.all())
+            samples.append((perf_counter() - started) * 1000)
+        return median(samples), len(results)
+
+    def handle(self, *args, **options):
+        self.seed(options['posts'])
+        queryset = PostViewSet.queryset
+
+        try:
+            for text in (RARE_WORD, 'рыжий кот', 'мурчит'):
+                self.stdout.write('')
+                self.stdout.write(self.style.MIGRATE_HEADING(f'Запрос: {text}'))
+
+                indexed, found = self.measure(
+                    search_posts(queryset, text)[:20], options['repeat']
+                )
+                filters = Q()
+                for term in text.split():
+                    filters &= Q(title__icontains=term) | Q(description__icontains=term)
+                scan, _ = self.measure(
+                    queryset.filter(filters).order_by('-created_at', '-id')[:20],
+                    options['repeat']
+                )
+
+                speedup = scan / indexed if indexed else 0
+                self.stdout.write(f'Найдено на первой странице: {found}')
+                self.stdout.write(self.style.SUCCESS(
+                    f'icontains: {scan:.2f} мс -> индекс с ранжированием: {indexed:.2f} мс '
+                    f'(x{speedup:.1f}, медиана)'
+                ))
+        finally:
+            self.stdout.write('')
+            self.stdout.write('Удаление тестовых данных...')
+            with BulkDeleter() as deleter:
+                deleter.delete(User.objects.filter(username='benchmark_search_author'))
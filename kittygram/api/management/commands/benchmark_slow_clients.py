@@ -0,0 +1,186 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from statistics import quantiles
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from api.tokens import issue_tokens
+
+PROFILES = [
+    ('wsgi', 'Синхронные воркеры (WSGI)'),
+    ('asgi', 'Воркеры uvicorn (ASGI)'),
+]
+
+
+def start_server(profile, workers, port, env=None):
+    # gunicorn из gunicorn.conf.py на 127.0.0.1:port; ждёт, пока он начнёт принимать соединения
+    env = {
+        **os.environ,
+        **(env or {}),
+        'GUNICORN_PROFILE': profile,
+        'GUNICORN_WORKERS': str(workers),
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+    }
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=settings.BASE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise CommandError(f'gunicorn ({profile}) завершился при запуске')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+
+    server.terminate()
+    raise CommandError(f'gunicorn ({profile}) не начал принимать соединения')
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает gunicorn в профилях wsgi и asgi и замеряет задержку ленты, '
+        'пока медленные клиенты по кусочку отправляют загрузки фотографий'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Количество воркеров gunicorn (по умолчанию 2)',
+        )
+        parser.add_argument(
+            '--slow-clients',
+            type=int,
+            default=4,
+            help='Количество медленных загрузок одновременно (по умолчанию 4)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Количество запросов ленты во время медленных загрузок (по умолчанию 50)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=5,
+            help='Параллельных запросов ленты (по умолчанию 5)',
+        )
+        parser.add_argument(
+            '--request-timeout',
+            type=float,
+            default=10.0,
+            help='Сколько секунд ждать ответа ленты, прежде чем считать запрос неудачным',
+        )
+        parser.add_argument('--port', type=int, default=8765, help='Порт тестового сервера')
+
+    async def slow_upload(self, port, token, stop):
+        # Заявляем тело в 1 МБ и отправляем по 512 байт раз в полсекунды;
+        # запрос аутентифицирован, поэтому DRF дочитывает тело до конца
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(
+            b'POST /api/posts/ HTTP/1.1\r\n'
+            b'Host: 127.0.0.1\r\n'
+            b'Authorization: Bearer ' + token.encode() + b'\r\n'
+            b'Content-Type: multipart/form-data; boundary=slow\r\n'
+            b'Content-Length: 1048576\r\n\r\n'
+            b'--slow\r\nContent-Disposition: form-data; name="image"; filename="cat.jpg"\r\n\r\n'
+        )
+        try:
+            while not stop.is_set():
+                writer.write(b'\0' * 512)
+                await writer.drain()
+                await asyncio.sleep(0.5)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def get_feed(self, port, timeout):
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection('127.0.0.1', port), timeout
+            )
+            writer.write(
+                b'GET /api/posts/ HTTP/1.1\r\n'
+                b'Host: 127.0.0.1\r\n'
+                b'Accept: application/json\r\n'
+                b'Connection: close\r\n\r\n'
+            )
+            status_line = await asyncio.wait_for(reader.readline(), timeout)
+            await asyncio.wait_for(reader.read(), timeout)
+            writer.close()
+        except (asyncio.TimeoutError, ConnectionError):
+            return None
+        if b' 200 ' not in status_line:
+            return None
+        return time.perf_counter() - started
+
+    async def run_scenario(self, port, token, options):
+        stop = asyncio.Event()
+        uploads = [
+            asyncio.create_task(self.slow_upload(port, token, stop))
+            for _ in range(options['slow_clients'])
+        ]
+        # Даём медленным клиентам занять воркеры
+        await asyncio.sleep(1)
+
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def limited():
+            async with semaphore:
+                return await self.get_feed(port, options['request_timeout'])
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(limited() for _ in range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        await asyncio.gather(*uploads, return_exceptions=True)
+        return [latency for latency in results if latency is not None], elapsed
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'Воркеров: {options["workers"]}, медленных загрузок: {options["slow_clients"]}, '
+            f'запросов ленты: {options["requests"]}'
+        )
+
+        user = User.objects.create_user(username='benchmark_slow_client')
+        try:
+            for profile, title in PROFILES:
+                self.measure(profile, title, issue_tokens(user)['access'], options)
+        finally:
+            user.delete()
+
+    def measure(self, profile, title, token, options):
+        server = start_server(profile, options['workers'], options['port'])
+        try:
+            latencies, elapsed = asyncio.run(
+                self.run_scenario(options['port'], token, options)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+        failed = options['requests'] - len(latencies)
+        if len(latencies) >= 2:
+            cuts = quantiles(latencies, n=100)
+            timing = f'p50 {cuts[49] * 1000:.0f} мс, p95 {cuts[94] * 1000:.0f} мс'
+        else:
+            timing = 'нет успешных ответов'
+        self.stdout.write(self.style.SUCCESS(
+            f'{title}: {len(latencies) / elapsed:.1f} запросов/с, {timing}, '
+            f'ошибок и таймаутов: {failed}'
+        ))
@@ -0,0 +1,136 @@
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Barrier
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from PIL import Image
+
+# Прежняя конфигурация: весь файл до 20 МБ держится в памяти воркера
+IN_MEMORY_SETTINGS = {
+    'FILE_UPLOAD_HANDLERS': [
+        'django.core.files.uploadhandler.MemoryFileUploadHandler',
+        'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+    ],
+    'FILE_UPLOAD_MAX_MEMORY_SIZE': 20 * 1024 * 1024,
+}
+
+BOUNDARY = 'KittygramBenchmarkBoundary'
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пиковое потребление памяти (RSS) процессом при параллельной '
+        'загрузке больших изображений: буферизация в памяти и потоковая запись'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--uploads',
+            type=int,
+            default=10,
+            help='Количество параллельных загрузок (по умолчанию 10)',
+        )
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=20,
+            help='Размер каждого файла в МБ (по умолчанию 20)',
+        )
+        parser.add_argument(
+            '--mode',
+            choices=['memory', 'streaming'],
+            help='Служебный параметр: замер одного режима в отдельном процессе',
+        )
+        parser.add_argument('--body', help='Служебный параметр: путь к телу запроса')
+
+    def build_body(self, size):
+        # Настоящий JPEG-заголовок, дополненный случайными байтами так, чтобы
+        # всё тело запроса укладывалось в лимит (как 20M в nginx)
+        buffer = BytesIO()
+        Image.new('RGB', (1600, 1200), color=(200, 120, 80)).save(buffer, format='JPEG')
+        content = buffer.getvalue()
+        content += os.urandom(max(0, size - 1024 - len(content)))
+
+        body = tempfile.NamedTemporaryFile(suffix='.multipart', delete=False)
+        with body:
+            body.write(
+                f'--{BOUNDARY}\r\n'
+                f'Content-Disposition: form-data; name="title"\r\n\r\n'
+                f'Benchmark cat\r\n'
+                f'--{BOUNDARY}\r\n'
+                f'Content-Disposition: form-data; name="image"; filename="cat.jpg"\r\n'
+                f'Content-Type: image/jpeg\r\n\r\n'.encode()
+            )
+            body.write(content)
+            body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+        return body.name
+
+    def parse_upload(self, body_path, barrier):
+        with open(body_path, 'rb') as body:
+            request = WSGIRequest({
+                'REQUEST_METHOD': 'POST',
+                'PATH_INFO': '/api/posts/',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'wsgi.input': body,
+                'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+                'CONTENT_LENGTH': str(os.path.getsize(body_path)),
+            })
+            files = request.FILES
+            # Держим все загрузки одновременно, как воркеры под нагрузкой
+            barrier.wait()
+            for uploaded in files.values():
+                uploaded.close()
+        return len(files)
+
+    def measure(self, mode, uploads, body_path):
+        # Пиковый RSS процесса в КБ (Linux) до и после загрузок
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        barrier = Barrier(uploads)
+
+        overrides = IN_MEMORY_SETTINGS if mode == 'memory' else {}
+        with override_settings(**overrides), ThreadPoolExecutor(max_workers=uploads) as executor:
+            results = list(executor.map(
+                lambda _: self.parse_upload(body_path, barrier), range(uploads)
+            ))
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(f'{mode} {sum(results)} {baseline} {peak}')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self.measure(options['mode'], options['uploads'], options['body'])
+            return
+
+        uploads = options['uploads']
+        size = options['size'] * 1024 * 1024
+        self.stdout.write(f'Параллельных загрузок: {uploads}, размер файла: {options["size"]} МБ')
+
+        body_path = self.build_body(size)
+        try:
+            for mode, title in (('memory', 'Буферизация в памяти'), ('streaming', 'Потоковая запись')):
+                # Каждый режим в отдельном процессе, чтобы пики RSS не смешивались
+                output = subprocess.run(
+                    [
+                        sys.executable, sys.argv[0], 'benchmark_upload_memory',
+                        '--mode', mode,
+                        '--uploads', str(uploads),
+                        '--body', body_path,
+                    ],
+                    check=True, capture_output=True, text=True,
+                ).stdout.split()
+                parsed, baseline, peak = (int(value) for value in output[-3:])
+
+                self.stdout.write(self.style.SUCCESS(
+                    f'{title}: принято файлов {parsed}, '
+                    f'прирост пикового RSS {(peak - baseline) / 1024:.1f} МБ '
+                    f'(пик {peak / 1024:.1f} МБ)'
+                ))
+        finally:
+            os.remove(body_path)
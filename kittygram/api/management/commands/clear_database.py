@@ -1,6 +1,53 @@
 from django.core.management.base import BaseCommand
-from django.contrib.auth.models import User
-from api.models import Post
+from api.deletion import clear_all
+
+def add_deletion_arguments(parser):
+    parser.add_argument(
+        '--batched',
+        action='store_true',
+        help='Удалять пачками вместо TRUNCATE (если у пользователя БД нет права на TRUNCATE)',
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=5000,
+        help='Сколько строк удалять одним запросом при --batched (по умолчанию 5000)',
+    )
+    parser.add_argument(
+        '--file-workers',
+        type=int,
+        default=8,
+        help='Потоков для удаления файлов фотографий (по умолчанию 8)',
+    )
+
+def clear_posts_and_users(command, options):
+    deleted = clear_all(
+        batched=options['batched'],
+        chunk_size=options['chunk_size'],
+        workers=options['file_workers'],
+        report=command.stdout.write,
+    )
+
+    if deleted['posts'] > 0:
+        command.stdout.write(
+            command.style.SUCCESS(f'Удалено постов: {deleted["posts"]}')
+        )
+    else:
+        command.stdout.write('Посты уже отсутствуют')
+
+    if deleted['files'] > 0:
+        command.stdout.write(
+            command.style.SUCCESS(f'Удалено файлов фотографий: {deleted["files"]}')
+        )
+
+    if deleted['users'] > 0:
+        command.stdout.write(
+            command.style.SUCCESS(f'Удалено пользователей: {deleted["users"]}')
+        )
+    else:
+        command.stdout.write('Пользователи уже отсутствуют')
+
+    command.stdout.write(f'Очистка заняла: {deleted["seconds"]:.1f} с')
 
 class Command(BaseCommand):
     help = 'Очищает базу данных (удаляет всех пользователей и все посты)'
@@ -11,6 +58,7 @@ def add_arguments(self, parser):
             action='store_true',
             help='Пропустить подтверждение удаления',
         )
+        add_deletion_arguments(parser)
 
     def handle(self, *args, **options):
         if not options['force']:
@@ -24,24 +72,7 @@ def handle(self, *args, **options):
                 return
 
         self.stdout.write('Очистка базы данных...')
-        
-        post_count = Post.objects.count()
-        if post_count > 0:
-            Post.objects.all().delete()
-            self.stdout.write(
-                self.style.SUCCESS(f'Удалено постов: {post_count}')
-            )
-        else:
-            self.stdout.write('Посты уже отсутствуют')
-        
-        user_count = User.objects.count()
-        if user_count > 0:
-            User.objects.all().delete()
-            self.stdout.write(
-                self.style.SUCCESS(f'Удалено пользователей: {user_count}')
-            )
-        else:
-            self.stdout.write('Пользователи уже отсутствуют')
+        clear_posts_and_users(self, options)
 
         self.stdout.write('')
         self.stdout.write(
@@ -1,109 +1,256 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from random import Random
+from time import perf_counter
+
 from django.core.management.base import BaseCommand
 from django.core.management import call_command
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.utils import timezone
+from api.cache import invalidate_posts
+from api.images import DERIVATIVE_FORMATS, DERIVATIVE_WIDTHS, derivative_name
 from api.models import Post
-from random import randint
 from PIL import Image, ImageDraw, ImageFont
-from io import BytesIO
+from .clear_database import add_deletion_arguments, clear_posts_and_users
+
+TITLES = [
+    'Мой пушистый друг', 'Кошачье счастье', 'Рыжий разбойник', 'Утренняя зарядка',
+    'Сон на подоконнике', 'Охота на клубок', 'Кот и коробка', 'Вечер на диване',
+]
+DESCRIPTIONS = [
+    'Это мой любимый кот, он очень игривый и ласковый!',
+    'Просто наслаждаемся солнечным днем вместе с моим питомцем.',
+    'Опять спит на клавиатуре, работать невозможно.',
+    'Нашёл новую коробку и не хочет из неё вылезать.',
+    '',
+]
+
+
+def load_font():
+    for name in ('arial.ttf', 'DejaVuSans.ttf'):
+        try:
+            return ImageFont.truetype(name, 80)
+        except OSError:
+            pass
+    return ImageFont.load_default()
+
+
+def render_image(seed):
+    """
+    Рисует тестовую фотографию и её уменьшенные копии (выполняется в пуле
+    процессов). Возвращает (JPEG оригинала, [(ширина, расширение, байты), ...]).
+    """
+    random = Random(seed)
+    width, height = random.randint(400, 1200), random.randint(400, 1200)
+    color = (random.randint(100, 255), random.randint(100, 255), random.randint(100, 255))
+
+    image = Image.new('RGB', (width, height), color=color)
+    draw = ImageDraw.Draw(image)
+    cat_text = "Кот Шрёдингера"
+    font = load_font()
+
+    bbox = draw.textbbox((0, 0), cat_text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    x = (width - text_width) // 2
+    y = (height - text_height) // 2
+
+    draw.text((x, y), cat_text, fill=(255, 255, 255), font=font)
+
+    original = BytesIO()
+    image.save(original, format='JPEG', quality=85)
+
+    derivatives = []
+    for derivative_width in sorted({min(w, width) for w in DERIVATIVE_WIDTHS}):
+        derivative_height = max(1, round(height * derivative_width / width))
+        resized = image.resize((derivative_width, derivative_height), Image.Resampling.LANCZOS)
+        for extension, options in DERIVATIVE_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, **options)
+            derivatives.append((derivative_width, extension, buffer.getvalue()))
+
+    return original.getvalue(), derivatives
+
 
 class Command(BaseCommand):
-    help = 'Очищает базу данных (удаляет всех пользователей и все посты) и загружает в неё тестовые данные'
+    help = (
+        'Очищает базу данных (удаляет всех пользователей и все посты) и загружает в неё тестовые данные; '
+        'с --users и --posts дополнительно генерирует пользователей и посты для нагрузочного тестирования'
+    )
 
-    def create_test_image(self):
-        width, height= randint(400, 1200), randint(400, 1200)
-        color = (randint(100, 255), randint(100, 255), randint(100, 255))
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=0,
+            help='Сколько пользователей сгенерировать сверх фикстуры (по умолчанию 0)',
+        )
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=0,
+            help='Сколько постов сгенерировать сверх фикстуры (по умолчанию 0)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Процессов для рисования фотографий (по умолчанию - число ядер)',
+        )
+        parser.add_argument(
+            '--images',
+            type=int,
+            default=50,
+            help='Размер пула заранее нарисованных фотографий, общих для всех постов (по умолчанию 50)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Сколько строк вставлять одним bulk_create (по умолчанию 5000)',
+        )
+        add_deletion_arguments(parser)
 
-        image = Image.new('RGB', (width, height), color=color)
-        draw = ImageDraw.Draw(image)
-        cat_text = "Кот Шрёдингера"
+    def report(self, label, done, total, started):
+        elapsed = perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f'{label}: {done}/{total} ({rate:.0f} в секунду)')
 
-        try:
-            font = ImageFont.truetype("arial.ttf", 80)
-        except:
-            try:
-                font = ImageFont.truetype("DejaVuSans.ttf", 80)
-            except:
-                font = ImageFont.load_default()
-        
-        bbox = draw.textbbox((0, 0), cat_text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        x = (width - text_width) // 2
-        y = (height - text_height) // 2
-        
-        draw.text((x, y), cat_text, fill=(255, 255, 255), font=font)
-        
-        image_buffer = BytesIO()
-        image.save(image_buffer, format='JPEG', quality=85)
-        image_buffer.seek(0)
-
-        return image_buffer
-
-    def add_test_images_to_posts(self):
+    def render_image_pool(self, size, workers):
+        """
+        Рисует size фотографий в пуле процессов и сохраняет их в хранилище.
+        Файлы адресуются по содержимому, поэтому посты ссылаются на общие
+        файлы, а на диске их всего size. Возвращает [(имя, варианты), ...].
+        """
+        self.stdout.write(f'Рисование {size} фотографий в {workers} процессах...')
+        storage = Post._meta.get_field('image').storage
+        started = perf_counter()
+        pool = []
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for original, derivatives in executor.map(render_image, range(size)):
+                name = storage.save('posts/test_cat.jpg', ContentFile(original))
+                variants = []
+                for width, extension, content in derivatives:
+                    variant_name = derivative_name(name, width, extension)
+                    if not default_storage.exists(variant_name):
+                        variant_name = default_storage.save(variant_name, ContentFile(content))
+                    variants.append({'name': variant_name, 'width': width, 'format': extension})
+                pool.append((name, variants))
+
+                if len(pool) % 10 == 0 or len(pool) == size:
+                    self.report('Фотографий', len(pool), size, started)
+
+        return pool
+
+    def add_test_images_to_posts(self, pool):
         self.stdout.write('Добавление тестовых изображений к постам...')
-        
-        for i, post in enumerate(Post.objects.all()):
-            if not post.image:
-                image_buffer = self.create_test_image()
-                image_name = f'test_cat_{i+1}.jpg'
-                
-                post.image.save(
-                    image_name,
-                    ContentFile(image_buffer.getvalue()),
-                    save=True
-                )
 
-                self.stdout.write(
-                    self.style.SUCCESS(f'Добавлено изображение для поста "{post.title}"')
+        posts = list(Post.objects.filter(image=''))
+        now = timezone.now()
+        for i, post in enumerate(posts):
+            post.image, post.image_variants = pool[i % len(pool)]
+            post.image_status = Post.IMAGE_READY
+            post.updated_at = now
+        Post.objects.bulk_update(posts, ['image', 'image_variants', 'image_status', 'updated_at'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Добавлены изображения для постов: {len(posts)}')
+        )
+
+    def generate_users(self, count, batch_size):
+        self.stdout.write('')
+        self.stdout.write(f'Генерация пользователей: {count}...')
+        # Один хэш на всех: хэширование пароля стоит десятки миллисекунд
+        password = make_password('load_test')
+        started = perf_counter()
+
+        for start in range(0, count, batch_size):
+            User.objects.bulk_create(
+                User(
+                    username=f'load_user_{i}',
+                    email=f'load_user_{i}@example.com',
+                    password=password,
                 )
-    
+                for i in range(start, min(start + batch_size, count))
+            )
+            self.report('Пользователей', min(start + batch_size, count), count, started)
+
+    def generate_posts(self, count, pool, batch_size):
+        self.stdout.write('')
+        self.stdout.write(f'Генерация постов: {count}...')
+        author_ids = list(User.objects.values_list('id', flat=True))
+        random = Random(0)
+        now = timezone.now()
+        started = perf_counter()
+
+        for start in range(0, count, batch_size):
+            posts = []
+            for i in range(start, min(start + batch_size, count)):
+                image, variants = pool[i % len(pool)]
+                posts.append(Post(
+                    title=random.choice(TITLES),
+                    description=random.choice(DESCRIPTIONS),
+                    author_id=random.choice(author_ids),
+                    image=image,
+                    image_variants=variants,
+                    created_at=now - timedelta(seconds=random.randint(0, 365 * 24 * 3600)),
+                ))
+            Post.objects.bulk_create(posts)
+            self.report('Постов', start + len(posts), count, started)
+
     def handle(self, *args, **options):
+        started = perf_counter()
         self.stdout.write('Очистка базы данных...')
-        
-        post_count = Post.objects.count()
-        if post_count > 0:
-            Post.objects.all().delete()
-            self.stdout.write(
-                self.style.SUCCESS(f'Удалено постов: {post_count}')
-            )
-        else:
-            self.stdout.write('Посты уже отсутствуют')
-        
-        user_count = User.objects.count()
-        if user_count > 0:
-            User.objects.all().delete()
-            self.stdout.write(
-                self.style.SUCCESS(f'Удалено пользователей: {user_count}')
-            )
-        else:
-            self.stdout.write('Пользователи уже отсутствуют')
+
+        clear_posts_and_users(self, options)
 
         self.stdout.write('')
         self.stdout.write('Загрузка тестовых данных...')
-        
+
         try:
-            call_command('loaddata', 'test_data.json', app_label='api')
+            call_command('loaddata', 'test_data.json', app_label='api', stdout=self.stdout)
             self.stdout.write(
                 self.style.SUCCESS('Фикстуры успешно загружены!')
             )
 
-            self.add_test_images_to_posts()
-            
+            pool_size = max(1, min(options['images'], Post.objects.count() + options['posts']))
+            pool = self.render_image_pool(pool_size, max(1, options['workers']))
+            self.add_test_images_to_posts(pool)
+
             self.stdout.write('')
             self.stdout.write(
                 self.style.SUCCESS('Фикстуры успешно дополнены тестовыми jpg-изображениями!')
             )
 
+            if options['users'] > 0:
+                self.generate_users(options['users'], options['batch_size'])
+            if options['posts'] > 0:
+                self.generate_posts(options['posts'], pool, options['batch_size'])
+
+            # bulk_create и bulk_update не отправляют post_save
+            invalidate_posts([])
+
             self.stdout.write('')
             self.stdout.write(f'Всего постов: {Post.objects.count()}')
+            self.stdout.write(f'Всего пользователей: {User.objects.count()}')
+            self.stdout.write(f'Заняло: {perf_counter() - started:.1f} с')
             self.stdout.write('')
             self.stdout.write('Данные для тестирования:')
             self.stdout.write('1-ый пользователь: логин - tester_1 / пароль - tester_1')
             self.stdout.write('2-ой пользователь: логин - tester_2 / пароль - tester_2')
             self.stdout.write('Администратор: логин - admin / пароль - admin')
-            
+            if options['users'] > 0:
+                self.stdout.write(
+                    'Сгенерированные пользователи: логин - load_user_<N> / пароль - load_test'
+                )
+
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Ошибка при загрузке тестовых данных: {e}')
-            )
\ No newline at end of file
+            )
@@ -0,0 +1,531 @@
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from io import BytesIO
+from statistics import quantiles
+from urllib.parse import urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.cache import invalidate_posts
+from api.deletion import BulkDeleter
+from api.models import Job, Post
+from api.tokens import issue_tokens
+from PIL import Image
+from .benchmark_slow_clients import start_server
+
+USERNAME_PREFIX = 'loadtest_user_'
+PASSWORD = 'loadtest'
+BOUNDARY = 'kittygram-loadtest'
+DEFAULT_MIX = 'feed=40,detail=25,me=10,login=5,upload=5,patch=10,delete=5'
+# Запрос без ответа за это время считается ошибкой
+REQUEST_TIMEOUT = 30
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in Command.actions:
+            raise CommandError(
+                f'Неизвестный тип запроса в --mix: {name!r} '
+                f'(доступны: {", ".join(Command.actions)})'
+            )
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Вес {name!r} в --mix должен быть числом')
+    if sum(mix.values()) <= 0:
+        raise CommandError('В --mix нет ни одного запроса с положительным весом')
+    return mix
+
+
+def test_image(size=(640, 480)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color=(200, 120, 60)).save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def multipart(fields, filename, content):
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    parts.append(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'.encode() + content + b'\r\n'
+    )
+    parts.append(f'--{BOUNDARY}--\r\n'.encode())
+    return b''.join(parts)
+
+
+class HttpConnection:
+    """
+    Соединение HTTP/1.1 с keep-alive поверх asyncio (сторонних HTTP-клиентов
+    в зависимостях нет). Если сервер закрывает соединение (синхронные
+    воркеры gunicorn отвечают Connection: close), следующий запрос
+    открывает новое.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, body=b''):
+        reused = self.writer is not None
+        try:
+            return await self.send(method, path, headers or {}, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            if not reused:
+                raise
+            # Сервер закрыл простаивающее соединение: повторяем на новом
+            return await self.send(method, path, headers or {}, body)
+
+    async def send(self, method, path, headers, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}', f'Content-Length: {len(body)}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Сервер закрыл соединение')
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding') == 'chunked':
+            content = await self.read_chunked()
+        else:
+            content = await self.reader.read()
+            response_headers['connection'] = 'close'
+
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, content
+
+    async def read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await self.reader.readline()
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class VirtualClient:
+    # Пользователь нагрузочного теста: свой токен, свои посты для PATCH и DELETE
+    def __init__(self, user, token, seed):
+        self.username = user.username
+        self.headers = {'Authorization': f'Bearer {token}', 'Accept': 'application/json'}
+        self.random = random.Random(seed)
+        self.own_posts = []
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест: асинхронные клиенты отправляют смесь запросов (лента, пост, '
+        '/api/auth/me/, вход, загрузка фотографии, PATCH, DELETE) и считают RPS и '
+        'p50/p95/p99 по каждому типу запроса; результат пишется в JSON и сравнивается с базовым'
+    )
+
+    # Тип запроса -> что он делает (для отчёта)
+    actions = {
+        'feed': 'GET /api/posts/',
+        'detail': 'GET /api/posts/<id>/',
+        'me': 'GET /api/auth/me/',
+        'login': 'POST /api/auth/login/',
+        'upload': 'POST /api/posts/ (multipart)',
+        'patch': 'PATCH /api/posts/<id>/',
+        'delete': 'DELETE /api/posts/<id>/',
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help=(
+                'Адрес уже запущенного сервера, например http://127.0.0.1:8000 '
+                '(ограничения частоты запросов на нём не отключаются). Пользователи '
+                'и посты создаются в БД этой команды, а токены подписываются её '
+                'SECRET_KEY, поэтому сервер должен работать с той же БД и тем же '
+                'SECRET_KEY. Без --url запускается gunicorn с отключёнными ограничениями'
+            ),
+        )
+        parser.add_argument(
+            '--profile',
+            choices=['wsgi', 'asgi'],
+            default='wsgi',
+            help='Профиль запускаемого gunicorn (по умолчанию wsgi)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=3,
+            help='Количество воркеров запускаемого gunicorn (по умолчанию 3)',
+        )
+        parser.add_argument('--port', type=int, default=8766, help='Порт запускаемого сервера')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=20,
+            help='Количество одновременных клиентов, у каждого свой пользователь (по умолчанию 20)',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=30,
+            help='Длительность теста в секундах (по умолчанию 30)',
+        )
+        parser.add_argument(
+            '--mix',
+            default=DEFAULT_MIX,
+            help=f'Веса типов запросов (по умолчанию {DEFAULT_MIX})',
+        )
+        parser.add_argument(
+            '--seed-posts',
+            type=int,
+            default=200,
+            help='Сколько постов создать перед тестом для чтения (по умолчанию 200)',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Зерно выбора запросов')
+        parser.add_argument(
+            '--output',
+            default='loadtest.json',
+            help='Куда записать результаты (по умолчанию loadtest.json)',
+        )
+        parser.add_argument(
+            '--baseline',
+            help=(
+                'Файл результатов прошлого запуска для сравнения; '
+                'если файла нет, в него записываются текущие результаты'
+            ),
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=10,
+            help=(
+                'Допустимое падение общего RPS и рост p95 относительно базового, %%, '
+                'и рост доли ошибок, процентных пунктов (по умолчанию 10)'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency должно быть больше нуля')
+        if mix.get('detail') and options['seed_posts'] < 1:
+            raise CommandError('Для запросов detail нужен хотя бы один пост (--seed-posts)')
+
+        self.cleanup()
+        clients = self.prepare(options)
+        server = None
+        url = options['url']
+        if not url:
+            server = start_server(options['profile'], options['workers'], options['port'], env={
+                # Нагрузочный тест не должен упираться в лимиты для людей
+                'THROTTLE_ANON_READ': '1000000/s',
+                'THROTTLE_USER_READ': '1000000/s',
+                'THROTTLE_UPLOADS': '1000000/s',
+                'THROTTLE_AUTH': '1000000/s',
+                'API_ACCESS_TOKEN_MINUTES': str(int(options['duration'] // 60) + 10),
+            })
+            url = f'http://127.0.0.1:{options["port"]}'
+
+        self.stdout.write(
+            f'{url}: {options["concurrency"]} клиентов, {options["duration"]:.0f} с, смесь {options["mix"]}'
+        )
+        try:
+            elapsed = asyncio.run(self.run(url, clients, mix, options['duration']))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+            self.cleanup()
+
+        results = self.summarize(url, elapsed, options)
+        self.report(results)
+        self.save(results, options['output'])
+
+        if options['baseline']:
+            if os.path.exists(options['baseline']):
+                with open(options['baseline']) as file:
+                    baseline = json.load(file)
+                self.check_comparable(results, baseline)
+                regressions = self.compare(results, baseline, options['tolerance'])
+                if regressions:
+                    raise CommandError(
+                        f'Хуже базового более чем на {options["tolerance"]:.0f}%: '
+                        + ', '.join(regressions)
+                    )
+            else:
+                self.save(results, options['baseline'])
+                self.stdout.write(f'Базовые результаты записаны в {options["baseline"]}')
+
+    def prepare(self, options):
+        # Пользователи и посты для чтения создаются напрямую в БД сервера
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            User(username=f'{USERNAME_PREFIX}{i}', password=password)
+            for i in range(options['concurrency'])
+        )
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('id'))
+
+        self.image = test_image()
+        storage = Post._meta.get_field('image').storage
+        image = storage.save('posts/loadtest.jpg', ContentFile(self.image))
+        Post.objects.bulk_create(
+            Post(title=f'Нагрузочный тест {i}', author=users[i % len(users)], image=image)
+            for i in range(options['seed_posts'])
+        )
+        invalidate_posts([])
+        self.post_ids = list(
+            Post.objects.filter(author__in=users).values_list('id', flat=True)
+        )
+        self.created_posts = []
+
+        return [
+            VirtualClient(user, issue_tokens(user)['access'], options['seed'] * 1000 + i)
+            for i, user in enumerate(users)
+        ]
+
+    def cleanup(self):
+        # Посты и задачи обработки фотографий удаляются вместе с пользователями
+        created = getattr(self, 'created_posts', [])
+        Job.objects.filter(task='process_post_image', payload__post_id__in=created).delete()
+        with BulkDeleter() as deleter:
+            deleter.delete(User.objects.filter(username__startswith=USERNAME_PREFIX))
+
+    async def run(self, url, clients, mix, duration):
+        address = urlsplit(url)
+        if address.scheme != 'http':
+            raise CommandError('Поддерживается только http://')
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+        names, weights = list(mix), list(mix.values())
+        deadline = time.monotonic() + duration
+
+        async def client_loop(client):
+            connection = HttpConnection(address.hostname, address.port or 80)
+            try:
+                while time.monotonic() < deadline:
+                    name = client.random.choices(names, weights)[0]
+                    await self.perform(connection, client, name)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for client in clients))
+        return time.perf_counter() - started
+
+    async def perform(self, connection, client, name):
+        if name in ('patch', 'delete') and not client.own_posts:
+            # Изменять и удалять можно только свои посты: сначала создаём
+            name = 'upload'
+
+        headers = dict(client.headers)
+        body = b''
+        if name == 'feed':
+            method, path = 'GET', '/api/posts/'
+        elif name == 'detail':
+            method, path = 'GET', f'/api/posts/{client.random.choice(self.post_ids)}/'
+        elif name == 'me':
+            method, path = 'GET', '/api/auth/me/'
+        elif name == 'login':
+            method, path = 'POST', '/api/auth/login/'
+            headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+            body = json.dumps({'username': client.username, 'password': PASSWORD}).encode()
+        elif name == 'upload':
+            method, path = 'POST', '/api/posts/'
+            headers['Content-Type'] = f'multipart/form-data; boundary={BOUNDARY}'
+            body = multipart({'title': 'Кот под нагрузкой', 'description': ''}, 'cat.jpg', self.image)
+        elif name == 'patch':
+            method, path = 'PATCH', f'/api/posts/{client.random.choice(client.own_posts)}/'
+            headers['Content-Type'] = 'application/json'
+            body = json.dumps({'title': f'Изменён {time.time():.0f}'}).encode()
+        else:
+            method, path = 'DELETE', f'/api/posts/{client.own_posts.pop()}/'
+
+        started = time.perf_counter()
+        try:
+            status, content = await asyncio.wait_for(
+                connection.request(method, path, headers, body), REQUEST_TIMEOUT
+            )
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+            connection.close()
+            self.statuses[name]['error'] += 1
+            return
+        self.latencies[name].append(time.perf_counter() - started)
+        self.statuses[name][str(status)] += 1
+
+        if name == 'upload' and status == 201:
+            post_id = json.loads(content)['id']
+            client.own_posts.append(post_id)
+            self.created_posts.append(post_id)
+
+    def summarize(self, url, elapsed, options):
+        endpoints = {}
+        total = 0
+        total_errors = 0
+        for name in self.actions:
+            latencies = self.latencies.get(name, [])
+            statuses = self.statuses.get(name, Counter())
+            count = sum(statuses.values())
+            if not count:
+                continue
+            errors = sum(n for code, n in statuses.items() if code == 'error' or int(code) >= 400)
+            if len(latencies) >= 2:
+                cuts = quantiles(latencies, n=100)
+                p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+            else:
+                p50 = p95 = p99 = latencies[0] if latencies else 0.0
+            endpoints[name] = {
+                'request': self.actions[name],
+                'requests': count,
+                'errors': errors,
+                'statuses': dict(statuses),
+                'rps': round(count / elapsed, 2),
+                'p50_ms': round(p50 * 1000, 2),
+                'p95_ms': round(p95 * 1000, 2),
+                'p99_ms': round(p99 * 1000, 2),
+            }
+            total += count
+            total_errors += errors
+
+        return {
+            'started_at': timezone.now().isoformat(),
+            'url': url,
+            'profile': None if options['url'] else options['profile'],
+            'workers': None if options['url'] else options['workers'],
+            'concurrency': options['concurrency'],
+            'duration': round(elapsed, 2),
+            'mix': options['mix'],
+            'total': {
+                'requests': total,
+                'errors': total_errors,
+                'rps': round(total / elapsed, 2),
+            },
+            'endpoints': endpoints,
+        }
+
+    def report(self, results):
+        self.stdout.write('')
+        for name, row in results['endpoints'].items():
+            self.stdout.write(
+                f'{name:<7} {row["requests"]:>7} запросов {row["rps"]:>8.1f}/с  '
+                f'p50 {row["p50_ms"]:>7.1f} мс  p95 {row["p95_ms"]:>7.1f} мс  '
+                f'p99 {row["p99_ms"]:>7.1f} мс  ошибок {row["errors"]}'
+            )
+        total = results['total']
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего: {total["requests"]} запросов, {total["rps"]:.1f} в секунду, ошибок {total["errors"]}'
+        ))
+
+    def save(self, results, path):
+        with open(path, 'w') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты записаны в {path}')
+
+    def check_comparable(self, results, baseline):
+        # Результаты разных конфигураций сравнивать бессмысленно
+        differences = [
+            f'{key}: {baseline.get(key)} -> {results[key]}'
+            for key in ('profile', 'workers', 'concurrency')
+            if baseline.get(key) != results[key]
+        ]
+        if parse_mix(baseline.get('mix') or DEFAULT_MIX) != parse_mix(results['mix']):
+            differences.append(f'mix: {baseline.get("mix")} -> {results["mix"]}')
+        if differences:
+            raise CommandError(
+                'Базовые результаты получены с другими параметрами ('
+                + ', '.join(differences) + '); запишите новые в другой файл --baseline'
+            )
+
+    def compare(self, results, baseline, tolerance):
+        """
+        Сравнивает общий RPS, p95 каждого типа запроса и долю ошибок
+        (всего и по типам) с базовыми результатами; возвращает то, что
+        ухудшилось больше чем на tolerance (% для RPS и p95, процентные
+        пункты для доли ошибок). RPS отдельных типов зависит от случайного
+        выбора в смеси, поэтому выводится, но не проверяется.
+        """
+        self.stdout.write('')
+        self.stdout.write('Сравнение с базовыми результатами:')
+        regressions = []
+
+        def check(label, line, worse):
+            if worse:
+                regressions.append(label)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        before, after = baseline['total']['rps'], results['total']['rps']
+        rps_change = change(before, after)
+        check(
+            'RPS', f'Всего   RPS {before:.1f} -> {after:.1f} ({rps_change:+.0f}%)',
+            rps_change < -tolerance,
+        )
+        # Быстрые ответы 5xx не должны сойти за ускорение
+        before, after = error_rate(baseline['total']), error_rate(results['total'])
+        check(
+            'ошибки', f'Всего   ошибок {before:.1f}% -> {after:.1f}%', after - before > tolerance,
+        )
+
+        for name, row in results['endpoints'].items():
+            before = baseline.get('endpoints', {}).get(name)
+            if not before:
+                continue
+            p95_change = change(before['p95_ms'], row['p95_ms'])
+            check(
+                f'{name} p95',
+                f'{name:<7} RPS {before["rps"]:.1f} -> {row["rps"]:.1f}, '
+                f'p95 {before["p95_ms"]:.1f} -> {row["p95_ms"]:.1f} мс ({p95_change:+.0f}%)',
+                p95_change > tolerance,
+            )
+            errors_before, errors_after = error_rate(before), error_rate(row)
+            check(
+                f'{name} ошибки',
+                f'{name:<7} ошибок {errors_before:.1f}% -> {errors_after:.1f}%',
+                errors_after - errors_before > tolerance,
+            )
+        return regressions
+
+
+def change(before, after):
+    # Изменение в процентах
+    return (after - before) / before * 100 if before else 0.0
+
+
+def error_rate(row):
+    # Доля ответов с ошибкой, %
+    return row['errors'] / row['requests'] * 100 if row['requests'] else 0.0
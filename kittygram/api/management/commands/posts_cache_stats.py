@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from api.cache import get_stats, reset_stats
+
+class Command(BaseCommand):
+    help = 'Показывает долю попаданий в кэш ленты и постов (api/cache.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить счётчики после вывода',
+        )
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        self.stdout.write(f'Попаданий: {stats["hits"]}')
+        self.stdout.write(f'Промахов: {stats["misses"]}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Доля попаданий: {stats["hit_ratio"]:.1%}')
+        )
+
+        if options['reset']:
+            reset_stats()
+            self.stdout.write('Счётчики обнулены')
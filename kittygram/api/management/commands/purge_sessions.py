@@ -0,0 +1,43 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет истёкшие сессии из БД пачками, не блокируя надолго таблицу '
+        '(в отличие от clearsessions, удаляющего всё одним запросом)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько сессий удалять одним запросом (по умолчанию 1000)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.05,
+            help='Пауза между пачками в секундах, чтобы пропустить запросы приложения (по умолчанию 0.05)',
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now)
+        deleted = 0
+
+        while True:
+            # Выборка по индексу expire_date, удаление по первичному ключу
+            keys = list(expired.values_list('session_key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            self.stdout.write(f'Удалено сессий: {deleted}')
+            time.sleep(options['sleep'])
+
+        # Истёкшие записи в кэше (cached_db) удаляются по собственному таймауту
+        self.stdout.write(self.style.SUCCESS(f'Готово, удалено истёкших сессий: {deleted}'))
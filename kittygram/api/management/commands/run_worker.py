@@ -0,0 +1,60 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from api.jobs import claim_next_job, run_job
+
+class Command(BaseCommand):
+    help = 'Запускает воркер фоновых задач (обработка фотографий и т. п.) из очереди в БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить все готовые задачи и завершиться',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Пауза между опросами пустой очереди в секундах (по умолчанию 1)',
+        )
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.stdout.write('Воркер фоновых задач запущен')
+        processed = 0
+
+        while self.running:
+            # Соединение с БД живёт долго, поэтому проверяем его, как после запроса
+            close_old_connections()
+
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            started = time.perf_counter()
+            if run_job(job):
+                processed += 1
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'{job.task}: выполнено за {time.perf_counter() - started:.2f} с'
+                    )
+                )
+            else:
+                self.stdout.write(
+                    self.style.ERROR(f'{job.task}: ошибка (попытка {job.attempts})')
+                )
+
+        self.stdout.write(f'Воркер остановлен, выполнено задач: {processed}')
+
+    def stop(self, signum, frame):
+        # Текущая задача дорабатывает, новые не берутся
+        self.running = False
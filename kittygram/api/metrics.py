@@ -0,0 +1,232 @@
+"""
+Метрики запросов для Prometheus (/api/metrics/).
+
+MetricsMiddleware на каждый запрос записывает в память процесса время
+ответа (гистограмма), число и время SQL-запросов, размер ответа и тела
+запроса - по маршруту (имя URL: post-list, post-detail, login, ...),
+методу и статусу. Горячий путь - обновление словаря под блокировкой,
+без обращений к кэшу и БД.
+
+Раз в METRICS_FLUSH_INTERVAL секунд фоновый поток процесса записывает
+его счётчики в METRICS_DIR/<pid>.json (атомарно, через переименование),
+не задерживая запросы и цикл событий ASGI, а /api/metrics/
+суммирует файлы всех воркеров gunicorn. Без METRICS_DIR видны только
+счётчики процесса, который ответил на запрос, как у кэша locmem://.
+"""
+
+import atexit
+import json
+import os
+import tempfile
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from pathlib import Path
+from time import perf_counter, sleep
+
+from django.conf import settings
+
+# Верхние границы корзин гистограммы времени ответа, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Остальные методы (их может прислать любой клиент) попадают в одну серию
+# other, иначе каждый новый метод навсегда добавлял бы серии в память
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+# Позиции в списке счётчиков серии; дальше идут корзины гистограммы
+COUNT, SECONDS, QUERIES, QUERY_SECONDS, RESPONSE_BYTES, REQUEST_BYTES = range(6)
+FIELDS = 6
+
+# Счётчики SQL текущего запроса; переменная контекста видна и в потоках
+# sync_to_async, поэтому запросы async view тоже учитываются
+current_queries = ContextVar('current_queries', default=None)
+
+
+class QueryStats:
+    __slots__ = ('count', 'seconds', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        # Список (sql, секунды), пока запрос профилируется (api/profiling.py)
+        self.statements = None
+
+
+def record_query(execute, sql, params, many, context):
+    # Обёртка соединения (connection.execute_wrappers, api/signals.py)
+    stats = current_queries.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = perf_counter() - started
+        stats.count += 1
+        stats.seconds += elapsed
+        if stats.statements is not None:
+            stats.statements.append((sql, elapsed))
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        # Процесс, в котором запущен поток записи: после fork воркера
+        # gunicorn поток родителя в нём не работает
+        self.flusher_pid = None
+
+    def record(self, route, method, status, seconds, queries, response_bytes, request_bytes):
+        if self.flusher_pid != os.getpid():
+            self.start_flusher()
+        if method not in METHODS:
+            method = 'other'
+        key = (route, method, str(status))
+        bucket = FIELDS + bisect_left(LATENCY_BUCKETS, seconds)
+
+        with self.lock:
+            values = self.series.get(key)
+            if values is None:
+                values = self.series[key] = [0] * (FIELDS + len(LATENCY_BUCKETS) + 1)
+            values[COUNT] += 1
+            values[SECONDS] += seconds
+            values[QUERIES] += queries.count
+            values[QUERY_SECONDS] += queries.seconds
+            values[RESPONSE_BYTES] += response_bytes
+            values[REQUEST_BYTES] += request_bytes
+            values[bucket] += 1
+
+    def start_flusher(self):
+        with self.lock:
+            if self.flusher_pid == os.getpid():
+                return
+            self.flusher_pid = os.getpid()
+        threading.Thread(target=self.run_flusher, name='metrics-flusher', daemon=True).start()
+
+    def run_flusher(self):
+        while True:
+            sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError:
+                # Каталог недоступен; попробуем в следующий раз
+                continue
+
+    def snapshot(self):
+        with self.lock:
+            return [[*key, *values] for key, values in self.series.items()]
+
+    def flush(self):
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(path, Path(directory) / f'{os.getpid()}.json')
+
+    def collect(self):
+        """
+        Суммирует счётчики всех процессов: {(маршрут, метод, статус): [...]}.
+        Файлы завершившихся воркеров тоже учитываются - счётчики не убывают.
+        """
+        self.flush()
+        rows = []
+        directory = settings.METRICS_DIR
+        if directory and os.path.isdir(directory):
+            for path in Path(directory).glob('*.json'):
+                try:
+                    rows.extend(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    # Файл заменяют прямо сейчас; следующий сбор его увидит
+                    continue
+        else:
+            rows = self.snapshot()
+
+        totals = {}
+        for row in rows:
+            key, values = tuple(row[:3]), row[3:]
+            if key in totals:
+                totals[key] = [a + b for a, b in zip(totals[key], values)]
+            else:
+                totals[key] = values
+        return totals
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name
+
+
+def body_size(request):
+    try:
+        return int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return 0
+
+
+def response_size(response):
+    if response.streaming:
+        return int(response.get('Content-Length') or 0)
+    return len(response.content)
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(totals, cache_stats=None):
+    """Текстовый формат Prometheus 0.0.4."""
+    lines = []
+
+    def metric(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    def labels(key, **extra):
+        route, method, status = key
+        pairs = {'route': route, 'method': method, 'status': status, **extra}
+        return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs.items()) + '}'
+
+    series = sorted(totals.items())
+
+    name = 'kittygram_http_request_duration_seconds'
+    metric(name, 'histogram', 'Время ответа')
+    for key, values in series:
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, values[FIELDS:]):
+            cumulative += count
+            lines.append(f'{name}_bucket{labels(key, le=repr(bound))} {cumulative}')
+        lines.append(f'{name}_bucket{labels(key, le="+Inf")} {values[COUNT]}')
+        lines.append(f'{name}_sum{labels(key)} {values[SECONDS]!r}')
+        lines.append(f'{name}_count{labels(key)} {values[COUNT]}')
+
+    for name, index, help_text in (
+        ('kittygram_db_queries_total', QUERIES, 'Число SQL-запросов'),
+        ('kittygram_db_query_duration_seconds_total', QUERY_SECONDS, 'Время SQL-запросов'),
+        ('kittygram_http_response_bytes_total', RESPONSE_BYTES, 'Размер тел ответов'),
+        ('kittygram_http_request_bytes_total', REQUEST_BYTES, 'Размер тел запросов (загрузки)'),
+    ):
+        metric(name, 'counter', help_text)
+        for key, values in series:
+            lines.append(f'{name}{labels(key)} {values[index]!r}')
+
+    if cache_stats is not None:
+        metric('kittygram_posts_cache_hits_total', 'counter', 'Попадания в кэш постов')
+        lines.append(f'kittygram_posts_cache_hits_total {cache_stats["hits"]}')
+        metric('kittygram_posts_cache_misses_total', 'counter', 'Промахи кэша постов')
+        lines.append(f'kittygram_posts_cache_misses_total {cache_stats["misses"]}')
+
+    return '\n'.join(lines) + '\n'
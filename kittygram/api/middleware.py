@@ -0,0 +1,160 @@
+import threading
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from .metrics import QueryStats, body_size, current_queries, registry, response_size, route_name
+from .profiling import requested_profile
+from .throttling import is_upload
+
+
+class MetricsMiddleware:
+    """
+    Записывает время ответа, SQL-запросы и размеры запроса и ответа
+    в счётчики api/metrics.py. Стоит первой, чтобы учитывать и ответы
+    остальных middleware (например, 429 от UploadConcurrencyMiddleware).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        queries = QueryStats()
+        token = current_queries.set(queries)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        self.record(request, response, perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryStats()
+        token = current_queries.set(queries)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        self.record(request, response, perf_counter() - started, queries)
+        return response
+
+    def record(self, request, response, seconds, queries):
+        registry.record(
+            route_name(request), request.method, response.status_code, seconds,
+            queries, response_size(response), body_size(request),
+        )
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запрос по заголовку X-Profile-Token или случайной выборке
+    (api/profiling.py). Стоит сразу после MetricsMiddleware, чтобы видеть
+    все остальные middleware.
+
+    В профиле ASGI стеки снимаются со всех потоков воркера: код запроса
+    выполняется и в цикле событий, и в потоках sync_to_async, поэтому
+    в профиль могут попасть параллельные запросы.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        profile = requested_profile(request, {threading.get_ident()})
+        if profile is None:
+            return self.get_response(request)
+
+        profile.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+        profile.save(request, response)
+        return response
+
+    async def __acall__(self, request):
+        profile = requested_profile(request)
+        if profile is None:
+            return await self.get_response(request)
+
+        profile.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.stop()
+        await sync_to_async(profile.save)(request, response)
+        return response
+
+
+class UploadConcurrencyMiddleware:
+    """
+    Ограничивает число загрузок фотографий, которые воркер обрабатывает
+    одновременно (MAX_CONCURRENT_UPLOADS). Лишние загрузки получают 429
+    с Retry-After до разбора multipart: файл не пишется на диск и не
+    обрабатывается. Само тело к этому моменту уже принято - его буферизует
+    nginx, а в профиле ASGI обработчик Django читает его до middleware.
+    Чтобы тело лишних загрузок не принималось вовсе, общее число загрузок
+    ограничивает и nginx (limit_conn uploads в nginx.conf).
+
+    Счётчик свой у каждого процесса: в синхронном воркере gunicorn запрос
+    всегда один, ограничение работает для потоков и воркеров uvicorn (ASGI).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slots = threading.BoundedSemaphore(settings.MAX_CONCURRENT_UPLOADS)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if not is_upload(request):
+            return self.get_response(request)
+        if not self.slots.acquire(blocking=False):
+            return self.too_many_uploads()
+        try:
+            return self.get_response(request)
+        finally:
+            self.slots.release()
+
+    async def __acall__(self, request):
+        if not is_upload(request):
+            return await self.get_response(request)
+        if not self.slots.acquire(blocking=False):
+            return self.too_many_uploads()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.slots.release()
+
+    def too_many_uploads(self):
+        response = JsonResponse(
+            {'error': 'Сервер обрабатывает слишком много загрузок, повторите позже'},
+            status=429
+        )
+        response['Retry-After'] = str(settings.UPLOAD_RETRY_AFTER)
+        return response
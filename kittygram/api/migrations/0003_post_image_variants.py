@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_post_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Уменьшенные копии фотографии'),
+        ),
+    ]
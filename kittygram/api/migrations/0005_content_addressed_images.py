@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:15
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_background_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(db_index=True, storage=api.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Фотография кота'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from api import search
+
+
+def install_search(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_post_updated_at'),
+    ]
+
+    # Полнотекстовый индекс по title и description (api/search.py):
+    # FTS5 с триггерами на SQLite, tsvector + GIN на PostgreSQL
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
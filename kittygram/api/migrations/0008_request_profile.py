@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:07
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время запроса')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('path', models.CharField(max_length=2000, verbose_name='Адрес')),
+                ('route', models.CharField(max_length=200, verbose_name='Маршрут')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='Статус ответа')),
+                ('duration', models.FloatField(verbose_name='Время ответа, с')),
+                ('query_count', models.PositiveIntegerField(verbose_name='SQL-запросов')),
+                ('query_seconds', models.FloatField(verbose_name='Время SQL-запросов, с')),
+                ('samples', models.PositiveIntegerField(verbose_name='Снимков стека')),
+                ('trigger', models.CharField(choices=[('header', 'Заголовок X-Profile-Token'), ('sample', 'Случайная выборка')], max_length=20, verbose_name='Причина')),
+                ('username', models.CharField(blank=True, max_length=150, verbose_name='Запросил')),
+                ('stacks', models.FileField(blank=True, upload_to='.profiles/', verbose_name='Стеки')),
+                ('sql', models.JSONField(blank=True, default=list, verbose_name='SQL-запросы')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
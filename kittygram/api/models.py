@@ -1,18 +1,115 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from .storage import post_image_storage
 
 class Post(models.Model):
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = [
+        (IMAGE_PROCESSING, 'Обрабатывается'),
+        (IMAGE_READY, 'Готово'),
+        (IMAGE_FAILED, 'Ошибка обработки'),
+    ]
+
     title = models.CharField(max_length=200, verbose_name='Название')
     description = models.TextField(blank=True, verbose_name='Описание')
-    image = models.ImageField(upload_to='posts/', verbose_name='Фотография кота')
+    # Файлы именуются по SHA-256 содержимого, индекс нужен для подсчёта ссылок
+    image = models.ImageField(
+        upload_to='posts/',
+        storage=post_image_storage,
+        db_index=True,
+        verbose_name='Фотография кота'
+    )
+    image_variants = models.JSONField(
+        default=list, blank=True, editable=False, verbose_name='Уменьшенные копии фотографии'
+    )
+    image_status = models.CharField(
+        max_length=20,
+        choices=IMAGE_STATUS_CHOICES,
+        default=IMAGE_READY,
+        verbose_name='Статус обработки фотографии'
+    )
     author = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Автор')
     created_at = models.DateTimeField(default=timezone.now, verbose_name='Время публикации')
+    # Версия поста для ETag/Last-Modified; при save(update_fields=...) указывать явно
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Время изменения')
     
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ['-created_at']
+        indexes = [
+            # Общая лента: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+            # Посты автора (my_posts): WHERE author_id = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+        ]
     
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+class Job(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    task = models.CharField(max_length=100, verbose_name='Задача')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name='Статус'
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    run_after = models.DateTimeField(default=timezone.now, verbose_name='Запустить после')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='Взята в работу')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Время создания')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} #{self.pk}'
+
+
+class RequestProfile(models.Model):
+    TRIGGER_HEADER = 'header'
+    TRIGGER_SAMPLE = 'sample'
+    TRIGGER_CHOICES = [
+        (TRIGGER_HEADER, 'Заголовок X-Profile-Token'),
+        (TRIGGER_SAMPLE, 'Случайная выборка'),
+    ]
+
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Время запроса')
+    method = models.CharField(max_length=10, verbose_name='Метод')
+    path = models.CharField(max_length=2000, verbose_name='Адрес')
+    route = models.CharField(max_length=200, verbose_name='Маршрут')
+    status_code = models.PositiveSmallIntegerField(verbose_name='Статус ответа')
+    duration = models.FloatField(verbose_name='Время ответа, с')
+    query_count = models.PositiveIntegerField(verbose_name='SQL-запросов')
+    query_seconds = models.FloatField(verbose_name='Время SQL-запросов, с')
+    samples = models.PositiveIntegerField(verbose_name='Снимков стека')
+    trigger = models.CharField(max_length=20, choices=TRIGGER_CHOICES, verbose_name='Причина')
+    username = models.CharField(max_length=150, blank=True, verbose_name='Запросил')
+    # Свёрнутые стеки (формат flamegraph.pl и speedscope): "a;b;c число_снимков"
+    stacks = models.FileField(upload_to='.profiles/', blank=True, verbose_name='Стеки')
+    sql = models.JSONField(default=list, blank=True, verbose_name='SQL-запросы')
+
+    class Meta:
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
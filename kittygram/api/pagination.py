@@ -0,0 +1,206 @@
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class PostCursorPagination(BasePagination):
+    """
+    Keyset-пагинация ленты по паре (created_at, id).
+
+    Курсор хранит позицию последнего (или первого) поста страницы, поэтому
+    следующая страница выбирается условием WHERE по индексу без OFFSET.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        queryset = queryset.order_by('-created_at', '-id')
+
+        if cursor is None:
+            reverse = False
+        else:
+            created_at, pk, reverse = cursor
+            if reverse:
+                # Листаем назад: берём посты новее курсора в обратном порядке
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+                ).order_by('created_at', 'id')
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                )
+
+        # Берём на одну запись больше, чтобы узнать, есть ли продолжение
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        self.positions = [(post.created_at, post.pk) for post in results]
+        return results
+
+    def paginate_rows(self, rows, complete, request):
+        """
+        Та же пагинация по готовому списку (created_at, id), отсортированному
+        по убыванию (начало ленты из api/cache.py). Возвращает id постов
+        страницы или None, если страница выходит за пределы списка, а лента
+        в нём поместилась не целиком - тогда страница берётся из БД.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[2]
+
+        if reverse:
+            end = count_newer(rows, cursor[:2])
+            start = max(0, end - self.page_size)
+            self.has_next = True
+            self.has_previous = start > 0
+        else:
+            start = 0 if cursor is None else count_newer(rows, cursor[:2], inclusive=True)
+            end = start + self.page_size
+            if end >= len(rows) and not complete:
+                return None
+            self.has_next = end < len(rows)
+            self.has_previous = cursor is not None
+
+        self.page = [tuple(row) for row in rows[start:end]]
+        self.positions = self.page
+        return [pk for created_at, pk in self.page]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            created_at = parse_datetime(tokens['t'][0])
+            pk = int(tokens['i'][0])
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        return created_at, pk, reverse
+
+    def encode_cursor(self, position, reverse):
+        created_at, pk = position
+        tokens = {'t': created_at.isoformat(), 'i': pk}
+        if reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Пустая страница при движении назад — возвращаемся к началу ленты
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.positions[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.positions[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+def count_newer(rows, position, inclusive=False):
+    # Сколько строк списка, отсортированного по убыванию, новее позиции
+    # (inclusive - вместе с самой позицией); двоичный поиск
+    low, high = 0, len(rows)
+    while low < high:
+        middle = (low + high) // 2
+        row = tuple(rows[middle])
+        if row > position or (inclusive and row == position):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class PostSearchPagination(PostCursorPagination):
+    """
+    Пагинация результатов поиска (?search=): они отсортированы по
+    релевантности, а не по времени, поэтому курсор - смещение (offset).
+    COUNT(*) не выполняется: берём на одну запись больше.
+    """
+    offset_query_param = 'offset'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        try:
+            self.offset = max(0, int(request.query_params.get(self.offset_query_param, 0)))
+        except ValueError:
+            self.offset = 0
+
+        results = list(queryset[self.offset:self.offset + self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.has_previous = self.offset > 0
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.base_url, self.offset_query_param, self.offset + self.page_size
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        offset = self.offset - self.page_size
+        if offset <= 0:
+            return remove_query_param(self.base_url, self.offset_query_param)
+        return replace_query_param(self.base_url, self.offset_query_param, offset)
@@ -0,0 +1,176 @@
+"""
+Профилирование отдельных запросов в продакшене (ProfilingMiddleware).
+
+Запрос профилируется, если в нём есть заголовок X-Profile-Token с токеном,
+подписанным SECRET_KEY (выдаётся персоналу в админке, раздел «Профили
+запросов»), либо если он попал в случайную выборку доли PROFILE_SAMPLE_RATE.
+
+Пока запрос выполняется, фоновый поток каждые PROFILE_INTERVAL секунд
+снимает стек потока запроса (sys._current_frames) - статистический профиль
+без трассировки каждого вызова. SQL-запросы (без параметров) собирает
+обёртка соединения из api/metrics.py. Результат - модель RequestProfile
+и файл свёрнутых стеков, который открывают flamegraph.pl и speedscope.
+
+Без заголовка и с PROFILE_SAMPLE_RATE = 0 middleware только проверяет
+наличие заголовка. Токен действует, только пока выдавший его пользователь
+остаётся активным сотрудником. Старые профили удаляет фоновая задача
+prune_request_profiles (api/tasks.py), которую ставит в очередь каждый
+PRUNE_EVERY-й сохранённый профиль.
+"""
+
+import random
+import sys
+import threading
+from collections import Counter
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.files.base import ContentFile
+from .jobs import enqueue
+from .metrics import QueryStats, current_queries, route_name
+from .models import RequestProfile
+
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+TOKEN_SALT = 'api.profiling'
+# Сколько SQL-запросов сохранять в профиле
+MAX_STATEMENTS = 1000
+# Каждый какой профиль ставит в очередь удаление старых
+PRUNE_EVERY = 100
+
+
+def issue_token(user):
+    return signing.dumps(user.username, salt=TOKEN_SALT)
+
+
+def load_token(token):
+    # Имя пользователя, выдавшего токен, или None
+    try:
+        username = signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    # Снятие прав персонала или блокировка отзывают выданные токены
+    if not User.objects.filter(username=username, is_staff=True, is_active=True).exists():
+        return None
+    return username
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}"
+
+
+def fold(frame):
+    # Стек от корня к листу через ";", как в collapsed-формате flamegraph.pl
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """
+    Снимает стеки потоков thread_ids (None - всех, кроме своего) каждые
+    interval секунд, пока не вызван stop().
+    """
+
+    def __init__(self, thread_ids=None, interval=0.005):
+        self.thread_ids = thread_ids
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='profiling-sampler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                self.stacks[fold(frame)] += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class Profile:
+    """Один профилируемый запрос: стеки, SQL и время."""
+
+    def __init__(self, trigger, username='', thread_ids=None):
+        self.trigger = trigger
+        self.username = username
+        self.sampler = Sampler(thread_ids, settings.PROFILE_INTERVAL)
+        self.queries = current_queries.get()
+        self.token = None
+        if self.queries is None:
+            # MetricsMiddleware не подключена
+            self.queries = QueryStats()
+            self.token = current_queries.set(self.queries)
+
+    def start(self):
+        self.queries.statements = []
+        self.queries_before = (self.queries.count, self.queries.seconds)
+        self.started = perf_counter()
+        self.sampler.start()
+
+    def stop(self):
+        self.sampler.stop()
+        self.duration = perf_counter() - self.started
+        self.statements, self.queries.statements = self.queries.statements, None
+        if self.token is not None:
+            current_queries.reset(self.token)
+
+    def save(self, request, response):
+        # Запросы сохранения профиля в метрики запроса не попадают
+        token = current_queries.set(None)
+        try:
+            count, seconds = self.queries_before
+            profile = RequestProfile(
+                method=request.method,
+                path=request.get_full_path()[:2000],
+                route=route_name(request),
+                status_code=response.status_code,
+                duration=self.duration,
+                query_count=self.queries.count - count,
+                query_seconds=self.queries.seconds - seconds,
+                samples=self.sampler.samples,
+                trigger=self.trigger,
+                username=self.username,
+                sql=[
+                    [sql, round(elapsed, 6)] for sql, elapsed in self.statements[:MAX_STATEMENTS]
+                ],
+            )
+            profile.stacks.save('stacks.folded', ContentFile(self.sampler.folded()), save=False)
+            profile.save()
+            if profile.pk % PRUNE_EVERY == 0:
+                enqueue('prune_request_profiles')
+            return profile
+        finally:
+            current_queries.reset(token)
+
+
+def requested_profile(request, thread_ids=None):
+    """Profile, если запрос нужно профилировать, иначе None."""
+    token = request.META.get(TOKEN_HEADER)
+    if token:
+        username = load_token(token)
+        if username is not None:
+            return Profile(RequestProfile.TRIGGER_HEADER, username, thread_ids)
+
+    rate = settings.PROFILE_SAMPLE_RATE
+    if rate and random.random() < rate:
+        return Profile(RequestProfile.TRIGGER_SAMPLE, thread_ids=thread_ids)
+    return None
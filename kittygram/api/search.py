@@ -0,0 +1,177 @@
+"""
+Полнотекстовый поиск по названию и описанию постов (?search= в ленте
+и поиск в админке).
+
+SQLite: виртуальная таблица FTS5 api_post_fts с внешним содержимым
+(content='api_post'), её поддерживают триггеры на INSERT, UPDATE и DELETE.
+Ранжирование - bm25, совпадение в названии весит больше, чем в описании.
+
+PostgreSQL: генерируемый столбец api_post.search_vector (название с весом A,
+описание - B) с GIN-индексом, ранжирование - ts_rank.
+
+Индекс обновляет сама БД, в том числе после bulk_create, update() и удаления
+без сигналов. Модель Post о нём не знает: схему создаёт миграция
+0007_post_search. Если миграция пересоздаст таблицу api_post (так SQLite
+меняет столбцы), триггеры пропадут - их возвращает обработчик post_migrate
+(api/signals.py) или manage.py rebuild_search_index.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+# Конфигурация PostgreSQL для стемминга; на ней построен search_vector
+SEARCH_CONFIG = 'russian'
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+TERM_RE = re.compile(r'\w+')
+# Миграция, создающая индекс
+MIGRATION = ('api', '0007_post_search')
+
+SQLITE_TABLE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS api_post_fts USING fts5(
+        title, description,
+        content='api_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS api_post_fts_insert AFTER INSERT ON api_post BEGIN
+        INSERT INTO api_post_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_post_fts_delete AFTER DELETE ON api_post BEGIN
+        INSERT INTO api_post_fts(api_post_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_post_fts_update
+    AFTER UPDATE OF title, description ON api_post BEGIN
+        INSERT INTO api_post_fts(api_post_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO api_post_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+SQLITE_TRIGGER_NAMES = ['api_post_fts_insert', 'api_post_fts_delete', 'api_post_fts_update']
+SQLITE_DROP = [
+    *(f'DROP TRIGGER IF EXISTS {name}' for name in SQLITE_TRIGGER_NAMES),
+    'DROP TABLE IF EXISTS api_post_fts',
+]
+
+POSTGRES_SCHEMA = [
+    f"""
+    ALTER TABLE api_post ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX IF NOT EXISTS post_search_idx ON api_post USING gin (search_vector)',
+]
+POSTGRES_DROP = [
+    'DROP INDEX IF EXISTS post_search_idx',
+    'ALTER TABLE api_post DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def execute(connection, statements):
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def install(connection):
+    # Создаёт индекс, если его нет, и заполняет его существующими постами
+    if connection.vendor == 'sqlite':
+        execute(connection, [SQLITE_TABLE, *SQLITE_TRIGGERS])
+        rebuild(connection)
+    elif connection.vendor == 'postgresql':
+        execute(connection, POSTGRES_SCHEMA)
+
+
+def ensure_installed(connection):
+    # Как install(), но на SQLite индекс перестраивается, только если
+    # пропал хотя бы один триггер
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                SQLITE_TRIGGER_NAMES,
+            )
+            if cursor.fetchone()[0] == len(SQLITE_TRIGGER_NAMES):
+                return
+    install(connection)
+
+
+def uninstall(connection):
+    if connection.vendor == 'sqlite':
+        execute(connection, SQLITE_DROP)
+    elif connection.vendor == 'postgresql':
+        execute(connection, POSTGRES_DROP)
+
+
+def rebuild(connection):
+    # Перестраивает индекс из api_post и сливает его сегменты
+    if connection.vendor == 'sqlite':
+        execute(connection, [
+            "INSERT INTO api_post_fts(api_post_fts) VALUES ('rebuild')",
+            "INSERT INTO api_post_fts(api_post_fts) VALUES ('optimize')",
+        ])
+    elif connection.vendor == 'postgresql':
+        execute(connection, ['REINDEX INDEX post_search_idx', 'ANALYZE api_post'])
+
+
+def fts_query(text):
+    # Ввод пользователя не должен попасть в синтаксис FTS5: каждое слово
+    # берём в кавычки и ищем по префиксу, слова объединяются через AND
+    return ' '.join(f'"{term}"*' for term in TERM_RE.findall(text))
+
+
+def search_posts(queryset, text):
+    """
+    Посты queryset, найденные по тексту, от самых релевантных к менее
+    релевантным (при равной релевантности - новые раньше).
+    """
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'sqlite':
+        query = fts_query(text)
+        if not query:
+            return queryset.none()
+        # Ранги всех совпадений считаются один раз (MATERIALIZED, SQLite 3.35+),
+        # подзапрос по строке берёт ранг из них: MATCH на каждую строку
+        # в коррелированном подзапросе на порядки медленнее
+        rank = RawSQL(
+            'WITH ranks AS MATERIALIZED ('
+            f'SELECT rowid, bm25(api_post_fts, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}) AS score '
+            'FROM api_post_fts WHERE api_post_fts MATCH %s'
+            ') SELECT score FROM ranks WHERE ranks.rowid = api_post.id',
+            [query], output_field=FloatField(),
+        )
+        return queryset.filter(
+            id__in=RawSQL('SELECT rowid FROM api_post_fts WHERE api_post_fts MATCH %s', [query])
+        ).annotate(search_rank=rank).order_by('search_rank', '-created_at', '-id')
+
+    if vendor == 'postgresql':
+        query = 'websearch_to_tsquery(%s, %s)'
+        return queryset.filter(
+            RawSQL(f'api_post.search_vector @@ {query}', [SEARCH_CONFIG, text], output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(
+                f'ts_rank(api_post.search_vector, {query})', [SEARCH_CONFIG, text],
+                output_field=FloatField(),
+            )
+        ).order_by('-search_rank', '-created_at', '-id')
+
+    # Другие СУБД: без индекса, сканированием
+    return queryset.filter(
+        Q(title__icontains=text) | Q(description__icontains=text)
+    ).order_by('-created_at', '-id')
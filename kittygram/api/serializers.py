@@ -1,5 +1,9 @@
+from urllib.parse import urlsplit
+
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
 from .models import Post
 
 class UserSerializer(serializers.ModelSerializer):
@@ -10,16 +14,39 @@ class Meta:
 class PostSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     can_edit = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Post
-        fields = ['id', 'title', 'description', 'image', 'author', 'created_at', 'can_edit']
-        read_only_fields = ['author', 'created_at', 'can_edit']
+        fields = [
+            'id', 'title', 'description', 'image', 'image_srcset', 'image_status',
+            'author', 'created_at', 'updated_at', 'can_edit'
+        ]
+        read_only_fields = ['author', 'created_at', 'updated_at', 'can_edit', 'image_status']
+
+    def to_internal_value(self, data):
+        # Файл, отклонённый ещё при загрузке (api/uploads.py)
+        rejected = getattr(self.context.get('request'), 'rejected_uploads', None)
+        if rejected:
+            raise serializers.ValidationError(rejected)
+        return super().to_internal_value(data)
+
+    def get_image_srcset(self, obj):
+        # {'webp': '<url> 320w, <url> 640w', 'jpeg': ...} для атрибута srcset
+        request = self.context.get('request')
+        srcset = {}
+        for variant in obj.image_variants or []:
+            url = default_storage.url(variant['name'])
+            if request:
+                url = request.build_absolute_uri(url)
+            srcset.setdefault(variant['format'], []).append(f"{url} {variant['width']}w")
+        return {image_format: ', '.join(items) for image_format, items in srcset.items()}
 
     def get_can_edit(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.author == request.user
+            # Сравниваем по author_id, не загружая связанный объект
+            return obj.author_id == request.user.id
         return False
 
     def update(self, instance, validated_data):
@@ -30,10 +57,50 @@ def update(self, instance, validated_data):
         # Обновляем изображение только если оно передано
         if 'image' in validated_data:
             instance.image = validated_data['image']
+            instance.image_status = validated_data.get('image_status', instance.image_status)
         
         instance.save()
         return instance
 
+class PostCompactSerializer(PostSerializer):
+    """
+    Облегчённое представление для ?fields= и ?expand=: остаются только
+    перечисленные в fields поля, автор выводится числом (id), пока его
+    не раскрыли через expand=author.
+    """
+    author = serializers.IntegerField(source='author_id', read_only=True)
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'author' in expand:
+            self.fields['author'] = UserSerializer(read_only=True)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class PostBatchCreateSerializer(serializers.ModelSerializer):
+    # Фотография - ссылка на уже загруженный файл (имя или URL из ответа API):
+    # файлы адресуются по содержимому, повторно передавать их не нужно
+    image = serializers.CharField()
+
+    class Meta:
+        model = Post
+        fields = ['title', 'description', 'image']
+
+    def validate_image(self, value):
+        name = urlsplit(value).path
+        if name.startswith(settings.MEDIA_URL):
+            name = name[len(settings.MEDIA_URL):]
+        return name
+
+class PostBatchUpdateSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField()
+
+    class Meta:
+        model = Post
+        fields = ['id', 'title', 'description']
+        extra_kwargs = {'title': {'required': False}}
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True, min_length=8, style={'input_type': 'password'}
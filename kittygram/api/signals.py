@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_delete, post_init, post_migrate, post_save
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+from . import search
+from .backends import invalidate_user
+from .cache import invalidate_post, invalidate_posts
+from .metrics import record_query
+from .models import Post, RequestProfile
+
+# Настройки SQLite для нескольких воркеров gunicorn на одном узле:
+# WAL не блокирует читателей во время записи, NORMAL в режиме WAL
+# не теряет согласованность при сбое, busy_timeout ждёт блокировку
+# вместо немедленной ошибки "database is locked".
+SQLITE_DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # мс
+    'cache_size': -20000,  # отрицательное значение - в КиБ (~20 МБ)
+    'mmap_size': 128 * 1024 * 1024,  # байты
+    'temp_store': 'MEMORY',
+}
+
+
+def get_sqlite_pragmas():
+    # settings.SQLITE_PRAGMAS переопределяет значения по умолчанию,
+    # None отключает установку конкретной прагмы
+    pragmas = {**SQLITE_DEFAULT_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+    return {name: value for name, value in pragmas.items() if value is not None}
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in get_sqlite_pragmas().items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def count_queries(sender, connection, **kwargs):
+    # Число и время SQL-запросов для /api/metrics/ (api/metrics.py);
+    # сигнал приходит при каждом переподключении того же объекта соединения
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    # Миграция, пересоздавшая таблицу api_post (так SQLite меняет столбцы),
+    # удаляет триггеры поиска (api/search.py): возвращаем их после migrate
+    if sender.label != 'api':
+        return
+    connection = connections[using]
+    if search.MIGRATION in MigrationRecorder(connection).applied_migrations():
+        search.ensure_installed(connection)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_cache(sender, instance, **kwargs):
+    # Сбрасываем сразу и ещё раз после коммита: параллельный запрос мог
+    # успеть положить в кэш данные, прочитанные до завершения транзакции
+    pk = instance.pk
+    invalidate_post(pk)
+    transaction.on_commit(lambda: invalidate_post(pk))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+def author_fields(user):
+    # Отложенные поля (.only(), .defer()) не читаем, их значение неизвестно
+    return user.__dict__.get('username'), user.__dict__.get('email')
+
+
+@receiver(post_init, sender=User)
+def remember_author_fields(sender, instance, **kwargs):
+    instance._author_fields = author_fields(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_posts(sender, instance, created, update_fields=None, **kwargs):
+    # Имя и email автора встроены в закэшированные посты и ETag ленты.
+    # Посты автора выбираем, только если они действительно изменились:
+    # set_password, вход (last_login) и правка в админке их обычно не меняют
+    previous, instance._author_fields = instance._author_fields, author_fields(instance)
+    if created or (update_fields is not None and not {'username', 'email'} & set(update_fields)):
+        return
+    if previous == instance._author_fields and None not in previous:
+        return
+    ids = list(Post.objects.filter(author_id=instance.pk).values_list('id', flat=True))
+    invalidate_posts(ids)
+    transaction.on_commit(lambda: invalidate_posts(ids))
+
+
+@receiver(post_delete, sender=RequestProfile)
+def delete_profile_stacks(sender, instance, **kwargs):
+    if instance.stacks:
+        instance.stacks.delete(save=False)
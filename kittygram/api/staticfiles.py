@@ -0,0 +1,96 @@
+"""
+Хранилище статики для collectstatic: собирает фронтенд (kittygram/frontend)
+так, чтобы nginx мог кэшировать его навсегда и отдавать сжатым.
+
+- css/ и js/ фронтенда получают хэш содержимого в имени
+  (css/style.css -> css/style.3f2a1b9c0d4e.css): изменённый файл получает
+  новый адрес, поэтому старый можно кэшировать с immutable;
+- страницы html/*.html кладутся в корень STATIC_ROOT, откуда их отдаёт
+  location / в nginx, и ссылки в них заменяются на хэшированные имена.
+  Сами страницы имён не меняют и кэшируются с проверкой (no-cache);
+- рядом с текстовыми файлами, в том числе статикой админки и DRF, пишутся
+  сжатые копии .gz для gzip_static и .br, если установлен пакет brotli.
+"""
+
+import gzip
+import hashlib
+import posixpath
+import re
+
+from django.contrib.staticfiles.storage import StaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HASHED_DIRECTORIES = ('css/', 'js/')
+PAGES_DIRECTORY = 'html/'
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.html', '.svg', '.json', '.txt', '.map')
+# Файлы меньше этого размера сжимать бессмысленно
+MIN_COMPRESS_SIZE = 256
+REFERENCE_RE = re.compile(r'(?P<attribute>\b(?:href|src))="(?P<url>[^"#?]+)"')
+
+
+def hashed_name(name, content):
+    root, extension = posixpath.splitext(name)
+    return f'{root}.{hashlib.md5(content).hexdigest()[:12]}{extension}'
+
+
+def rewrite_references(html, names):
+    # Заменяет ссылки href="css/style.css" и src="js/auth.js" на хэшированные
+    def replace(match):
+        url = names.get(match['url'], match['url'])
+        return f'{match["attribute"]}="{url}"'
+
+    return REFERENCE_RE.sub(replace, html)
+
+
+class FrontendStaticFilesStorage(StaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+
+        names = {}
+        for name in sorted(paths):
+            if name.startswith(HASHED_DIRECTORIES):
+                content = self.read(name)
+                names[name] = self.write(hashed_name(name, content), content)
+                yield name, names[name], True
+
+        pages = []
+        for name in sorted(paths):
+            if name.startswith(PAGES_DIRECTORY) and name.endswith('.html'):
+                html = rewrite_references(self.read(name).decode(), names)
+                pages.append(self.write(name[len(PAGES_DIRECTORY):], html.encode()))
+                yield name, pages[-1], True
+
+        for name in [*paths, *names.values(), *pages]:
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(name)
+
+    def read(self, name):
+        with self.open(name) as file:
+            return file.read()
+
+    def write(self, name, content):
+        if self.exists(name):
+            self.delete(name)
+        return self.save(name, ContentFile(content))
+
+    def compress(self, name):
+        content = self.read(name)
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+
+        # mtime=0: одинаковые файлы дают одинаковые архивы при каждой сборке
+        variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(content)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(content):
+                self.write(name + suffix, compressed)
+            elif self.exists(name + suffix):
+                # Копия от прошлой сборки устарела
+                self.delete(name + suffix)
@@ -0,0 +1,56 @@
+import hashlib
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_hash(content):
+    # Хэш мог быть посчитан ещё при приёме файла (api/uploads.py)
+    digest = getattr(content, 'content_hash', None)
+    if digest:
+        return digest
+
+    sha256 = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return sha256.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище фотографий, в котором имя файла - SHA-256 его содержимого:
+    posts/cat.jpg -> posts/3f/3fa2...e1.jpg
+
+    Одинаковые фотографии сохраняются на диск один раз, а посты ссылаются
+    на общий файл. Количество ссылок - это число постов с таким image,
+    файл удаляется, когда ссылок не остаётся (api.images.release_image).
+    Содержимое по URL никогда не меняется, поэтому nginx может отдавать
+    его с долгим кэшированием.
+    """
+
+    def _save(self, name, content):
+        digest = content_hash(content)
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        name = posixpath.join(directory, digest[:2], f'{digest}{extension}')
+
+        if self.exists(name):
+            # Дубликат: второй раз на диск не пишем. Пока строка поста не
+            # сохранена, файл может удалить параллельный release_image,
+            # поэтому после сохранения вызывается restore()
+            return name
+        return super()._save(name, content)
+
+    def restore(self, name, content):
+        # Записывает content под уже вычисленным именем, если файла нет
+        if not self.exists(name):
+            super()._save(name, content)
+
+
+post_image_storage = ContentAddressedStorage()
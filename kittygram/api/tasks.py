@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.utils import timezone
+from .cache import invalidate_post
+from .images import refresh_post_derivatives, release_image, restore_image, strip_image_metadata
+from .jobs import task
+from .models import Post, RequestProfile
+
+
+def mark_image_failed(post_id):
+    Post.objects.filter(pk=post_id).update(
+        image_status=Post.IMAGE_FAILED, updated_at=timezone.now()
+    )
+    # update() не отправляет post_save
+    invalidate_post(post_id)
+
+
+@task('process_post_image', on_failure=mark_image_failed)
+def process_post_image(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+
+    uploaded_name = post.image.name
+    post.image.name, content = strip_image_metadata(post.image)
+    refresh_post_derivatives(post)
+
+    post.image_status = Post.IMAGE_READY
+    post.save(update_fields=['image', 'image_status', 'updated_at'])
+    if content is not None:
+        restore_image(post.image.name, content)
+
+    # Исходный файл с метаданными больше не нужен, если на него никто не ссылается
+    if post.image.name != uploaded_name:
+        release_image(uploaded_name)
+
+
+@task('prune_request_profiles')
+def prune_request_profiles():
+    # Файлы стеков удаляет обработчик post_delete (api/signals.py)
+    RequestProfile.objects.filter(
+        created_at__lt=timezone.now() - settings.PROFILE_MAX_AGE
+    ).delete()
+    stale = RequestProfile.objects.order_by('-created_at', '-id').values_list('pk', flat=True)
+    RequestProfile.objects.filter(pk__in=list(stale[settings.PROFILE_MAX_COUNT:])).delete()
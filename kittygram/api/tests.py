@@ -1,19 +1,76 @@
-from django.test import TestCase
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.hashers import make_password
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import (
+    LiveServerTestCase, RequestFactory, TestCase, TransactionTestCase, override_settings
+)
 from django.contrib.auth.models import User
+from django.http import HttpResponse
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from .models import Post
+from . import async_views, search
+from .backends import USER_KEY, CachedModelBackend
+from .cache import POST_KEY, get_feed_version, get_stats, reset_stats
+from .deletion import BulkDeleter
+from .images import release_image
+from .middleware import UploadConcurrencyMiddleware
+from .metrics import registry
+from .jobs import MAX_ATTEMPTS, claim_next_job, enqueue, run_pending_jobs
+from .login_attempts import LoginAttempts
+from .management.commands.loadtest import Command as LoadTestCommand
+from .models import Job, Post, RequestProfile
+from .pagination import PostCursorPagination
+from .profiling import Sampler, issue_token
+from .signals import get_sqlite_pragmas
+from kittygram.caches import parse_cache_url
+from kittygram.database import parse_database_url
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
 import tempfile
+import threading
+import time
 from PIL import Image
 
-def create_test_image():
-    image = Image.new('RGB', (100, 100), color='red')
+def create_test_image(size=(100, 100)):
+    image = Image.new('RGB', size, color='red')
     file = tempfile.NamedTemporaryFile(suffix='.jpg')
     image.save(file)
     file.seek(0)
     return file
 
+
+class TempMediaMixin:
+    # Фотографии, копии и загрузки каждого теста - во временном MEDIA_ROOT,
+    # а не в media/ проекта
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = self.settings(
+            MEDIA_ROOT=media_root.name,
+            FILE_UPLOAD_TEMP_DIR=os.path.join(media_root.name, '.uploads'),
+        )
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.media_root = media_root.name
+
 class PostModelTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -106,14 +163,14 @@ def test_create_post_unauthenticated(self):
             
             response = self.client.post(url, data, format='multipart')
         
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
     
     def test_get_posts_list(self):
         url = reverse('post-list')
         response = self.client.get(url)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
     
     def test_update_own_post(self):
         self.client.force_authenticate(user=self.user)
@@ -160,6 +217,1919 @@ def test_delete_other_user_post(self):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.assertEqual(Post.objects.count(), 1)
 
+class ImageDerivativeTests(TempMediaMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def create_post(self, size):
+        with create_test_image(size) as image:
+            response = self.client.post(
+                reverse('post-list'),
+                {'title': 'Big Cat', 'image': image},
+                format='multipart'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['image_status'], Post.IMAGE_PROCESSING)
+
+        # Фотографию обрабатывает фоновый воркер
+        run_pending_jobs()
+        return self.client.get(reverse('post-detail', args=[response.data['id']]))
+
+    def test_derivatives_generated_on_upload(self):
+        response = self.create_post((1600, 800))
+        post = Post.objects.get(pk=response.data['id'])
+
+        self.assertEqual(
+            sorted((v['width'], v['format']) for v in post.image_variants),
+            [(w, f) for w in (320, 640, 1280) for f in ('jpeg', 'webp')]
+        )
+        for variant in post.image_variants:
+            self.assertTrue(default_storage.exists(variant['name']))
+            with default_storage.open(variant['name']) as file, Image.open(file) as image:
+                self.assertEqual(image.width, variant['width'])
+
+        self.assertIn('320w', response.data['image_srcset']['webp'])
+        self.assertIn('1280w', response.data['image_srcset']['jpeg'])
+
+    def test_small_image_not_upscaled(self):
+        response = self.create_post((100, 100))
+        post = Post.objects.get(pk=response.data['id'])
+        self.assertEqual({v['width'] for v in post.image_variants}, {100})
+
+    def test_derivatives_replaced_on_image_update(self):
+        response = self.create_post((1600, 800))
+        post = Post.objects.get(pk=response.data['id'])
+        old_variants = post.image_variants
+
+        with create_test_image((500, 500)) as image:
+            response = self.client.patch(
+                reverse('post-detail', args=[post.id]),
+                {'image': image},
+                format='multipart'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['image_status'], Post.IMAGE_PROCESSING)
+        run_pending_jobs()
+
+        post.refresh_from_db()
+        self.assertEqual({v['width'] for v in post.image_variants}, {320, 500})
+        for variant in old_variants:
+            self.assertFalse(default_storage.exists(variant['name']))
+
+    def test_derivatives_deleted_with_post(self):
+        response = self.create_post((700, 700))
+        post = Post.objects.get(pk=response.data['id'])
+
+        self.client.delete(reverse('post-detail', args=[post.id]))
+        for variant in post.image_variants:
+            self.assertFalse(default_storage.exists(variant['name']))
+
+class StreamingUploadTests(TempMediaMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, content, name='cat.jpg'):
+        file = SimpleUploadedFile(name, content, content_type='image/jpeg')
+        return self.client.post(
+            reverse('post-list'),
+            {'image': file, 'title': 'Cat'},
+            format='multipart'
+        )
+
+    def test_not_an_image_rejected(self):
+        response = self.upload(b'not an image at all' * 1000)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', response.data)
+        self.assertEqual(Post.objects.count(), 0)
+
+    def test_unsupported_format_rejected(self):
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, format='BMP')
+        response = self.upload(buffer.getvalue(), name='cat.bmp')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('JPEG', str(response.data['image']))
+
+    def test_oversized_upload_rejected(self):
+        with create_test_image() as image, self.settings(POST_IMAGE_MAX_UPLOAD_SIZE=100):
+            response = self.upload(image.read())
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', response.data)
+
+    def test_upload_spooled_to_temp_file(self):
+        with create_test_image() as image:
+            content = image.read()
+        # Хвост после конца JPEG: заголовок разбирается до получения всего файла
+        response = self.upload(content + os.urandom(512 * 1024))
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        post = Post.objects.get()
+        self.assertEqual(post.image.size, len(content) + 512 * 1024)
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, '.uploads')), [])
+
+class PhotoUploadMixin(TempMediaMixin):
+    # Загрузка одной и той же фотографии через API
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+        with create_test_image((400, 300)) as image:
+            self.content = image.read()
+
+    def upload(self, name='cat.jpg'):
+        response = self.client.post(
+            reverse('post-list'),
+            {'title': 'Cat', 'image': SimpleUploadedFile(name, self.content)},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Post.objects.get(pk=response.data['id'])
+
+    def count_files(self):
+        return sum(len(files) for _, _, files in os.walk(settings.MEDIA_ROOT))
+
+
+class ContentAddressedStorageTests(PhotoUploadMixin, APITestCase):
+    def test_file_named_by_content_hash(self):
+        post = self.upload()
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(post.image.name, f'posts/{digest[:2]}/{digest}.jpg')
+
+    def test_duplicates_share_one_file(self):
+        first = self.upload('first.jpg')
+        second = self.upload('second.jpg')
+        run_pending_jobs()
+        first.refresh_from_db()
+        second.refresh_from_db()
+
+        self.assertEqual(first.image.name, second.image.name)
+        # Один оригинал без EXIF и 4 копии (320 и 400 px): исходный файл освобождён
+        self.assertEqual(self.count_files(), 5)
+        self.assertEqual(first.image.name.count('/'), 2)
+
+    def test_file_deleted_with_last_reference(self):
+        first = self.upload()
+        second = self.upload()
+        run_pending_jobs()
+        first.refresh_from_db()
+        image_name = first.image.name
+
+        self.client.delete(reverse('post-detail', args=[first.id]))
+        self.assertTrue(default_storage.exists(image_name))
+
+        self.client.delete(reverse('post-detail', args=[second.id]))
+        self.assertFalse(default_storage.exists(image_name))
+        self.assertEqual(self.count_files(), 0)
+
+    def test_release_keeps_file_saved_concurrently(self):
+        post = self.upload()
+        image_name = post.image.name
+        post.delete()
+        original_rename = os.rename
+
+        def rename_and_save(source, destination):
+            # Пока файл переименовывается, сохраняется пост с той же фотографией
+            original_rename(source, destination)
+            Post.objects.create(title='Cat', image=image_name, author=self.user)
+
+        with mock.patch('api.images.os.rename', rename_and_save):
+            self.assertFalse(release_image(image_name))
+        self.assertTrue(default_storage.exists(image_name))
+
+
+class BulkDeletionTests(PhotoUploadMixin, APITestCase):
+    def test_clear_database_removes_media(self):
+        self.upload()
+        run_pending_jobs()
+
+        call_command('clear_database', '--force', stdout=StringIO())
+        self.assertEqual(self.count_files(), 0)
+
+    @override_settings(POSTS_CACHE_ENABLED=True, SHARED_CACHE=True)
+    def test_clear_database_keeps_unrelated_cache(self):
+        post = self.upload()
+        run_pending_jobs()
+        self.client.get(reverse('post-detail', args=[post.id]))
+        CachedModelBackend().get_user(self.user.id)
+        # Сессии и счётчики лимитов лежат в том же кэше
+        cache.set('throttle:test', 1)
+        version = get_feed_version()
+
+        call_command('clear_database', '--force', stdout=StringIO())
+        self.assertIsNone(cache.get(POST_KEY.format(post.id)))
+        self.assertIsNone(cache.get(USER_KEY.format(self.user.id)))
+        self.assertEqual(cache.get('throttle:test'), 1)
+        self.assertNotEqual(get_feed_version(), version)
+
+    def test_clear_database_batched(self):
+        self.upload()
+        run_pending_jobs()
+        other = User.objects.create_user(username='otheruser')
+        Post.objects.create(title='Cat', image=Post.objects.get().image.name, author=other)
+
+        call_command(
+            'clear_database', '--force', '--batched', '--chunk-size', '1', stdout=StringIO()
+        )
+        self.assertEqual(Post.objects.count(), 0)
+        self.assertEqual(User.objects.count(), 0)
+        self.assertEqual(self.count_files(), 0)
+
+    def test_bulk_delete_cascades_and_keeps_shared_files(self):
+        post = self.upload()
+        run_pending_jobs()
+        post.refresh_from_db()
+        other = User.objects.create_user(username='otheruser')
+        kept = Post.objects.create(title='Cat', image=post.image.name, author=other)
+        self.user.groups.create(name='Коты')
+
+        # Пост и пользователь в кэше
+        self.client.get(reverse('post-detail', args=[post.id]))
+        self.assertIsNotNone(CachedModelBackend().get_user(self.user.id))
+
+        with BulkDeleter(chunk_size=1) as deleter:
+            deleter.delete(User.objects.filter(pk=self.user.pk))
+
+        self.assertEqual(deleter.deleted, {'auth.User': 1, 'api.Post': 1})
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(list(Post.objects.all()), [kept])
+        self.assertTrue(default_storage.exists(post.image.name))
+        self.assertIsNone(CachedModelBackend().get_user(self.user.id))
+
+        self.client.force_authenticate(user=other)
+        response = self.client.get(reverse('post-detail', args=[post.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        with BulkDeleter() as deleter:
+            deleter.delete(Post.objects.all())
+        self.assertEqual(deleter.deleted['files'], 1)
+        self.assertEqual(self.count_files(), 0)
+
+
+class LoadTestDataTests(PhotoUploadMixin, APITestCase):
+    def test_load_test_data_reuses_image_pool(self):
+        self.upload()
+        call_command(
+            'load_test_data', users=3, posts=10, workers=1, images=2, batch_size=4,
+            stdout=StringIO()
+        )
+
+        self.assertEqual(User.objects.filter(username__startswith='load_user_').count(), 3)
+        # 6 постов фикстуры и 10 сгенерированных, у всех одна из двух фотографий
+        self.assertEqual(Post.objects.count(), 16)
+        self.assertEqual(Post.objects.filter(image='').count(), 0)
+        self.assertEqual(len(set(Post.objects.values_list('image', flat=True))), 2)
+
+        post = Post.objects.filter(author__username__startswith='load_user_').first()
+        self.assertEqual(post.image_status, Post.IMAGE_READY)
+        self.assertTrue(default_storage.exists(post.image.name))
+        for variant in post.image_variants:
+            self.assertTrue(default_storage.exists(variant['name']))
+
+
+class ContentAddressedRestoreTests(TempMediaMixin, TransactionTestCase):
+    # Файл восстанавливается в transaction.on_commit, пока загруженный файл
+    # ещё не удалён, поэтому нужен настоящий коммит, а не транзакция теста
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='testuser'))
+
+        with create_test_image((400, 300)) as image:
+            self.content = image.read()
+
+    def upload(self):
+        response = self.client.post(
+            reverse('post-list'),
+            {'title': 'Cat', 'image': SimpleUploadedFile('cat.jpg', self.content)},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Post.objects.get(pk=response.data['id'])
+
+    def test_duplicate_restored_after_concurrent_release(self):
+        image_name = self.upload().image.name
+        storage = Post._meta.get_field('image').storage
+        original_save = type(storage)._save
+
+        def save_and_release(storage, name, content):
+            # Между проверкой дубликата и сохранением поста файл удаляет
+            # release_image последнего поста с этой фотографией
+            name = original_save(storage, name, content)
+            storage.delete(name)
+            return name
+
+        with mock.patch.object(type(storage), '_save', save_and_release):
+            post = self.upload()
+
+        self.assertEqual(post.image.name, image_name)
+        self.assertTrue(default_storage.exists(image_name))
+
+
+class BackgroundJobTests(TempMediaMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_upload_returns_before_processing(self):
+        with create_test_image() as image:
+            response = self.client.post(
+                reverse('post-list'),
+                {'title': 'Cat', 'image': image},
+                format='multipart'
+            )
+
+        self.assertEqual(response.data['image_status'], Post.IMAGE_PROCESSING)
+        self.assertEqual(response.data['image_srcset'], {})
+        self.assertEqual(Job.objects.filter(task='process_post_image').count(), 1)
+
+        self.assertEqual(run_pending_jobs(), 1)
+        self.assertFalse(Job.objects.exists())
+
+        post = Post.objects.get(pk=response.data['id'])
+        self.assertEqual(post.image_status, Post.IMAGE_READY)
+
+    def test_exif_stripped_from_original(self):
+        image = Image.new('RGB', (200, 100), color='blue')
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90°
+        exif[0x010F] = 'Secret Camera'  # Make
+        file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        image.save(file, exif=exif)
+        file.seek(0)
+
+        with file:
+            response = self.client.post(
+                reverse('post-list'),
+                {'title': 'Cat', 'image': file},
+                format='multipart'
+            )
+        run_pending_jobs()
+
+        post = Post.objects.get(pk=response.data['id'])
+        with post.image.open('rb'), Image.open(post.image) as stored:
+            self.assertEqual(len(stored.getexif()), 0)
+            self.assertEqual(stored.size, (100, 200))
+
+    def test_failed_job_retried_then_marks_post(self):
+        post = Post.objects.create(
+            title='Broken', author=self.user, image='posts/missing.jpg',
+            image_status=Post.IMAGE_PROCESSING
+        )
+        job = enqueue('process_post_image', post_id=post.pk)
+
+        with self.assertLogs('api.jobs', level='ERROR'):
+            for _ in range(MAX_ATTEMPTS):
+                # Пропускаем паузу перед повторной попыткой
+                Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+                self.assertEqual(run_pending_jobs(), 1)
+
+        job.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertEqual(job.attempts, MAX_ATTEMPTS)
+        self.assertEqual(post.image_status, Post.IMAGE_FAILED)
+
+    def test_job_claimed_once(self):
+        post = Post.objects.create(title='Cat', author=self.user)
+        enqueue('process_post_image', post_id=post.pk)
+
+        self.assertIsNotNone(claim_next_job())
+        self.assertIsNone(claim_next_job())
+
+class PaginationTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+
+        # Половина постов с одинаковым временем, чтобы проверить разбор по id
+        same_time = timezone.now()
+        for i in range(25):
+            Post.objects.create(
+                title=f'Post {i}',
+                author=self.user,
+                created_at=same_time if i % 2 else same_time - timedelta(minutes=i)
+            )
+
+    def collect_ids(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(post['id'] for post in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_cover_feed_in_order(self):
+        ids = self.collect_ids(reverse('post-list') + '?page_size=7')
+
+        expected = list(
+            Post.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_previous_page(self):
+        url = reverse('post-list') + '?page_size=10'
+        first = self.client.get(url).data
+        second = self.client.get(first['next']).data
+        self.assertIsNone(first['previous'])
+
+        back = self.client.get(second['previous']).data
+        self.assertEqual(
+            [post['id'] for post in back['results']],
+            [post['id'] for post in first['results']]
+        )
+
+    def test_page_size_is_bounded(self):
+        with mock.patch.object(PostCursorPagination, 'max_page_size', 5):
+            response = self.client.get(reverse('post-list') + '?page_size=1000')
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('post-list') + '?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_my_posts_paginated(self):
+        self.client.force_authenticate(user=self.user)
+        ids = self.collect_ids(reverse('post-my-posts') + '?page_size=10')
+        self.assertEqual(len(ids), 25)
+
+# Запросы к БД без кэша ленты (он же путь для my_posts и глубоких страниц);
+# для списков к выборке страницы добавляется запрос версии ленты для ETag
+@override_settings(POSTS_CACHE_ENABLED=False)
+# Версия ленты для ETag - из общего кэша, без запроса к БД
+@override_settings(SHARED_CACHE=True)
+class QueryCountTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.post = Post.objects.create(title='First Post', author=self.user)
+
+    def create_posts(self, count):
+        for i in range(count):
+            author = User.objects.create_user(username=f'author_{i}')
+            Post.objects.create(title=f'Post {i}', author=author)
+            Post.objects.create(title=f'Own Post {i}', author=self.user)
+
+    def assertConstantQueries(self, num, url):
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.create_posts(10)
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_list_query_count(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.assertConstantQueries(1, reverse('post-list'))
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_list_query_count_anonymous(self):
+        self.assertConstantQueries(1, reverse('post-list'))
+
+    def test_retrieve_query_count(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.assertConstantQueries(
+            1, reverse('post-detail', args=[self.post.id])
+        )
+        self.assertTrue(response.data['can_edit'])
+
+    def test_my_posts_query_count(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.assertConstantQueries(1, reverse('post-my-posts'))
+        self.assertEqual(len(response.data['results']), 11)
+
+    def test_my_posts_requires_authentication(self):
+        response = self.client.get(reverse('post-my-posts'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+@override_settings(POSTS_CACHE_ENABLED=True, SHARED_CACHE=True)
+class PostCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            password='otherpass123'
+        )
+        self.post = Post.objects.create(title='Cached Post', author=self.user)
+
+    def test_warm_cache_skips_database(self):
+        list_url = reverse('post-list')
+        detail_url = reverse('post-detail', args=[self.post.id])
+        self.client.get(list_url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(list_url)
+            self.client.get(detail_url)
+        self.assertEqual(response.data['results'][0]['title'], 'Cached Post')
+
+    def test_processing_post_not_cached(self):
+        # Статус меняет воркер run_worker, возможно в другом процессе
+        Post.objects.filter(pk=self.post.pk).update(image_status=Post.IMAGE_PROCESSING)
+        url = reverse('post-detail', args=[self.post.id])
+        self.assertEqual(self.client.get(url).data['image_status'], Post.IMAGE_PROCESSING)
+
+        Post.objects.filter(pk=self.post.pk).update(image_status=Post.IMAGE_READY)
+        self.assertEqual(self.client.get(url).data['image_status'], Post.IMAGE_READY)
+
+    def test_can_edit_depends_on_user(self):
+        url = reverse('post-detail', args=[self.post.id])
+        self.client.force_authenticate(user=self.user)
+        self.assertTrue(self.client.get(url).data['can_edit'])
+
+        self.client.force_authenticate(user=self.other_user)
+        self.assertFalse(self.client.get(url).data['can_edit'])
+
+        self.client.force_authenticate(user=None)
+        self.assertFalse(self.client.get(url).data['can_edit'])
+
+    def test_matches_uncached_response(self):
+        self.post.image_variants = [
+            {'name': 'posts/ab/derivatives/ab/320.webp', 'width': 320, 'format': 'webp'},
+            {'name': 'posts/ab/derivatives/ab/640.webp', 'width': 640, 'format': 'webp'},
+        ]
+        self.post.image = 'posts/ab/ab.jpg'
+        self.post.save()
+        self.client.force_authenticate(user=self.user)
+        url = reverse('post-detail', args=[self.post.id])
+
+        with self.settings(POSTS_CACHE_ENABLED=False):
+            expected = self.client.get(url).data
+        self.client.get(url)
+        self.assertEqual(self.client.get(url).data, expected)
+
+    def test_create_invalidates_feed(self):
+        self.client.get(reverse('post-list'))
+        self.client.force_authenticate(user=self.user)
+
+        with tempfile.TemporaryDirectory() as tmp, self.settings(MEDIA_ROOT=tmp):
+            with create_test_image() as image:
+                response = self.client.post(
+                    reverse('post-list'), {'title': 'New Post', 'image': image},
+                    format='multipart'
+                )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        titles = [post['title'] for post in self.client.get(reverse('post-list')).data['results']]
+        self.assertEqual(titles, ['New Post', 'Cached Post'])
+
+    def test_update_and_delete_invalidate_post(self):
+        url = reverse('post-detail', args=[self.post.id])
+        self.client.get(url)
+        self.client.force_authenticate(user=self.user)
+
+        self.client.patch(url, {'title': 'Updated'}, format='multipart')
+        self.assertEqual(self.client.get(url).data['title'], 'Updated')
+
+        self.client.delete(url)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('post-list')).data['results'], [])
+
+    def test_pages_beyond_cached_feed_use_database(self):
+        for i in range(9):
+            Post.objects.create(title=f'Post {i}', author=self.user)
+
+        with self.settings(POSTS_CACHE_FEED_SIZE=5):
+            ids = []
+            url = reverse('post-list') + '?page_size=3'
+            while url:
+                data = self.client.get(url).data
+                ids.extend(post['id'] for post in data['results'])
+                url = data['next']
+
+        expected = list(
+            Post.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_hit_ratio(self):
+        reset_stats()
+        url = reverse('post-detail', args=[self.post.id])
+        self.client.get(url)
+        self.client.get(url)
+
+        stats = get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_parse_cache_url(self):
+        config = parse_cache_url('file:///app/data/cache', base_dir='/app/kittygram')
+        self.assertEqual(config['BACKEND'], 'django.core.cache.backends.filebased.FileBasedCache')
+        self.assertEqual(config['LOCATION'], '/app/data/cache')
+
+        config = parse_cache_url('redis://redis:6379/1', base_dir='/app/kittygram')
+        self.assertEqual(config['LOCATION'], 'redis://redis:6379/1')
+
+        with self.assertRaises(ValueError):
+            parse_cache_url('memcached://localhost', base_dir='/app')
+
+@override_settings(POSTS_CACHE_ENABLED=True, SHARED_CACHE=True)
+class ConditionalRequestTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            password='otherpass123'
+        )
+        self.post = Post.objects.create(title='Test Post', author=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def assertNotModified(self, url, **headers):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], **headers)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified.content, b'')
+        return response
+
+    def test_list_not_modified(self):
+        response = self.assertNotModified(reverse('post-list'))
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_detail_not_modified(self):
+        response = self.assertNotModified(reverse('post-detail', args=[self.post.id]))
+        self.assertIn('Last-Modified', response)
+
+        not_modified = self.client.get(
+            reverse('post-detail', args=[self.post.id]),
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_current_user_not_modified(self):
+        self.assertNotModified(reverse('current-user'))
+
+    def test_etag_changes_after_update(self):
+        url = reverse('post-detail', args=[self.post.id])
+        list_etag = self.client.get(reverse('post-list'))['ETag']
+        detail_etag = self.client.get(url)['ETag']
+
+        self.client.patch(url, {'title': 'Updated'}, format='multipart')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], 'Updated')
+        response = self.client.get(reverse('post-list'), HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_etag_changes_after_delete(self):
+        Post.objects.create(title='Other Post', author=self.user)
+        etag = self.client.get(reverse('post-list'))['ETag']
+
+        self.post.delete()
+        response = self.client.get(reverse('post-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_etag_depends_on_user(self):
+        url = reverse('post-detail', args=[self.post.id])
+        etag = self.client.get(url)['ETag']
+
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['can_edit'])
+
+    def test_etag_changes_after_author_rename(self):
+        url = reverse('post-detail', args=[self.post.id])
+        list_etag = self.client.get(reverse('post-list'))['ETag']
+        detail_etag = self.client.get(url)['ETag']
+
+        self.user.username = 'renamed'
+        self.user.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['author']['username'], 'renamed')
+        response = self.client.get(reverse('post-list'), HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['author']['username'], 'renamed')
+
+    def test_unchanged_author_keeps_posts_cached(self):
+        self.user.set_password('newpass123')
+        # Только UPDATE auth_user, посты автора не выбираются
+        with self.assertNumQueries(1):
+            self.user.save()
+
+        self.user.email = 'testuser@example.com'
+        with self.assertNumQueries(2):
+            self.user.save()
+
+    @override_settings(POSTS_CACHE_ENABLED=False)
+    def test_list_version_without_database(self):
+        url = reverse('post-list')
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Post.objects.create(title='Other Post', author=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(POSTS_CACHE_ENABLED=False, SHARED_CACHE=False)
+    def test_list_version_follows_other_processes(self):
+        url = reverse('post-list')
+        etag = self.client.get(url)['ETag']
+
+        # Запись другого процесса (run_worker) не меняет счётчик в памяти этого
+        Post.objects.filter(pk=self.post.pk).update(
+            image_status=Post.IMAGE_READY, updated_at=timezone.now()
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(POSTS_CACHE_ENABLED=False)
+    def test_not_modified_without_cache(self):
+        url = reverse('post-detail', args=[self.post.id])
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+# Как с общим кэшем (file:// или redis://) в docker-compose
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    AUTHENTICATION_BACKENDS=[
+        'api.backends.CachedModelBackend',
+        'django.contrib.auth.backends.ModelBackend',
+    ],
+)
+class SessionCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+
+    def test_session_and_user_served_from_cache(self):
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('current-user')
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data['username'], 'testuser')
+
+    def test_user_cache_invalidated_on_save(self):
+        backend = CachedModelBackend()
+        self.assertEqual(backend.get_user(self.user.pk).username, 'testuser')
+
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(backend.get_user(self.user.pk).username, 'renamed')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(backend.get_user(self.user.pk))
+
+    def test_cached_user_without_password_hash(self):
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        self.assertNotIn(self.user.password, str(cache.get(f'users:user:{self.user.pk}')))
+
+        user = backend.get_user(self.user.pk)
+        self.assertEqual(user.get_session_auth_hash(), self.user.get_session_auth_hash())
+        user.first_name = 'Барсик'
+        user.save()
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('testpass123'))
+
+    def test_sessions_of_model_backend_stay_valid(self):
+        with self.settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend']):
+            self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('current-user'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_password_change_ends_cached_session(self):
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('current-user')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        self.user.set_password('newpass456789')
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_purge_sessions(self):
+        for expired in (True, True, True, False):
+            session = SessionStore()
+            session.create()
+            if expired:
+                Session.objects.filter(session_key=session.session_key).update(
+                    expire_date=timezone.now() - timedelta(days=1)
+                )
+
+        call_command('purge_sessions', batch_size=2, sleep=0, stdout=StringIO())
+        self.assertEqual(Session.objects.count(), 1)
+
+class TokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        # Как настоящий API-клиент: без сессии, но с проверкой CSRF
+        self.client = APIClient(enforce_csrf_checks=True)
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def obtain_tokens(self):
+        response = self.client.post(
+            reverse('token'), {'username': 'testuser', 'password': 'testpass123'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'api.backends.CachedModelBackend',
+        'django.contrib.auth.backends.ModelBackend',
+    ])
+    def test_access_token_user_from_cache(self):
+        tokens = self.obtain_tokens()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.client.get(reverse('current-user'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('current-user'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['email'], 'test@example.com')
+        self.assertNotIn('sessionid', self.client.cookies)
+
+    def test_access_token_of_deactivated_user(self):
+        tokens = self.obtain_tokens()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(reverse('current-user'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_write_without_csrf(self):
+        tokens = self.obtain_tokens()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        post = Post.objects.create(title='Test Post', author=self.user)
+
+        response = self.client.patch(
+            reverse('post-detail', args=[post.id]), {'title': 'Updated'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['can_edit'])
+
+    def test_invalid_credentials(self):
+        response = self.client.post(
+            reverse('token'), {'username': 'testuser', 'password': 'wrong'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_access_token(self):
+        tokens = self.obtain_tokens()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+        with self.settings(API_ACCESS_TOKEN_LIFETIME=timedelta(seconds=-1)):
+            response = self.client.get(reverse('current-user'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(str(response.data['detail']), 'Срок действия токена истёк')
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+
+    def test_refresh(self):
+        tokens = self.obtain_tokens()
+        response = self.client.post(
+            reverse('token-refresh'), {'refresh': tokens['refresh']}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get(reverse('current-user')).status_code, status.HTTP_200_OK)
+
+    def test_tokens_are_not_interchangeable(self):
+        tokens = self.obtain_tokens()
+        response = self.client.post(
+            reverse('token-refresh'), {'refresh': tokens['access']}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['refresh']}")
+        self.assertEqual(
+            self.client.get(reverse('current-user')).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_password_change_revokes_refresh_token(self):
+        tokens = self.obtain_tokens()
+        self.user.set_password('newpass456789')
+        self.user.save()
+
+        response = self.client.post(
+            reverse('token-refresh'), {'refresh': tokens['refresh']}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+@override_settings(ROOT_URLCONF='kittygram.asgi_urls')
+class AsyncReadViewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            password='otherpass123'
+        )
+        for i in range(3):
+            self.post = Post.objects.create(title=f'Post {i}', author=self.user)
+
+    def test_views_are_async(self):
+        for view in (async_views.post_list, async_views.post_detail, async_views.current_user):
+            self.assertTrue(asyncio.iscoroutinefunction(view))
+
+    def assertSameAsSync(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.settings(ROOT_URLCONF='kittygram.urls'):
+            expected = self.client.get(url)
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response['ETag'], expected['ETag'])
+        return response.json()
+
+    def test_feed_matches_sync_view(self):
+        self.client.login(username='testuser', password='testpass123')
+        data = self.assertSameAsSync(reverse('post-list') + '?page_size=2')
+        self.assertTrue(data['results'][0]['can_edit'])
+        self.assertSameAsSync(data['next'])
+
+    def test_detail_matches_sync_view(self):
+        # force_authenticate действует только на DRF view, входим через сессию
+        self.client.login(username='otheruser', password='otherpass123')
+        data = self.assertSameAsSync(reverse('post-detail', args=[self.post.id]))
+        self.assertFalse(data['can_edit'])
+
+    def test_current_user_with_token(self):
+        tokens = self.client.post(
+            reverse('token'), {'username': 'testuser', 'password': 'testpass123'}, format='json'
+        ).data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.assertSameAsSync(reverse('current-user'))['username'], 'testuser')
+
+    def test_errors(self):
+        response = self.client.get(reverse('current-user'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+        self.assertEqual(
+            self.client.get(reverse('post-detail', args=[999])).status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+        self.assertEqual(
+            self.client.get(reverse('post-list') + '?cursor=garbage').status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+
+    def test_not_modified(self):
+        url = reverse('post-list')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_writes_use_drf_views(self):
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('post-detail', args=[self.post.id])
+
+        response = self.client.patch(url, {'title': 'Updated'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url).json()['title'], 'Updated')
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+class PasswordHashingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def login(self, username, password):
+        return self.client.post(
+            reverse('login'), {'username': username, 'password': password}, format='json'
+        )
+
+    def test_new_passwords_use_scrypt(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.assertTrue(user.password.startswith('scrypt$16384$'))
+
+    def test_rehash_on_login(self):
+        user = User.objects.create_user(username='testuser')
+        user.password = make_password('testpass123', hasher='pbkdf2_sha256')
+        user.save()
+
+        self.assertEqual(self.login('testuser', 'testpass123').status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('scrypt$'))
+
+    def test_registration_hashes_password_once(self):
+        with mock.patch('api.views.authenticate') as authenticate, \
+                mock.patch.object(User, 'check_password') as check_password:
+            response = self.client.post(reverse('register'), {
+                'username': 'testuser',
+                'email': 'test@example.com',
+                'password': 'testpass123',
+                'password_confirm': 'testpass123'
+            }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        authenticate.assert_not_called()
+        check_password.assert_not_called()
+        self.assertEqual(self.client.get(reverse('current-user')).data['username'], 'testuser')
+
+@override_settings(LOGIN_ATTEMPT_LIMITS={'ip': (4, 300), 'username': (2, 300)})
+class LoginAttemptTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        User.objects.create_user(username='testuser', password='testpass123')
+
+    def login(self, username, password, url='login', **extra):
+        return self.client.post(
+            reverse(url), {'username': username, 'password': password}, format='json', **extra
+        )
+
+    def test_username_locked_after_failures(self):
+        for _ in range(2):
+            self.assertEqual(self.login('testuser', 'wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with mock.patch('api.views.authenticate') as authenticate:
+            response = self.login('testuser', 'testpass123')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+        authenticate.assert_not_called()
+
+        # Тот же лимит действует и для выдачи токенов
+        response = self.login('TestUser', 'testpass123', url='token')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_ip_locked_after_failures(self):
+        for i in range(4):
+            self.login(f'unknown_{i}', 'wrong')
+        self.assertEqual(
+            self.login('testuser', 'testpass123').status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        # Другой клиент за тем же прокси
+        response = self.login('testuser', 'testpass123', HTTP_X_FORWARDED_FOR='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_window_expires(self):
+        for _ in range(2):
+            self.login('testuser', 'wrong')
+        with mock.patch('api.login_attempts.time.time', return_value=time.time() + 301):
+            response = self.login('testuser', 'testpass123')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_parallel_attempts_reserved_before_password_check(self):
+        results = []
+        barrier = threading.Barrier(4)
+
+        def attempt():
+            attempts = LoginAttempts(RequestFactory().post('/'), 'testuser')
+            barrier.wait()
+            results.append(attempts.reserve())
+
+        threads = [threading.Thread(target=attempt) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Лимит имени - 2 попытки, пароль ещё не проверен ни в одной
+        self.assertEqual(sorted(result == 0 for result in results), [False, False, True, True])
+
+    def test_success_resets_username_failures(self):
+        self.login('testuser', 'wrong')
+        self.assertEqual(self.login('testuser', 'testpass123').status_code, status.HTTP_200_OK)
+        self.client.logout()
+        self.assertEqual(self.login('testuser', 'wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login('testuser', 'testpass123').status_code, status.HTTP_200_OK)
+
+def throttle_rates(**rates):
+    return {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}
+
+class ThrottlingTests(TempMediaMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        # Счётчики лимитов живут в кэше, а не в транзакции теста:
+        # не оставляем их остальным тестам
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(anon_read='2/min'))
+    def test_anonymous_reads_limited(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/posts/').status_code, status.HTTP_200_OK)
+        response = self.client.get('/api/posts/')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        # Авторизованные пользователи считаются отдельно
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/api/posts/').status_code, status.HTTP_200_OK)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(user_read='2/min'))
+    def test_user_reads_limited_per_user(self):
+        other = User.objects.create_user(username='otheruser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        for _ in range(2):
+            self.client.get('/api/posts/')
+        self.assertEqual(
+            self.client.get('/api/posts/').status_code, status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get('/api/posts/').status_code, status.HTTP_200_OK)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(anon_read='2/min'))
+    def test_sliding_window(self):
+        start = 60 * 1000000
+        timer = 'api.throttling.SlidingWindowRateThrottle.timer'
+        with mock.patch(timer, return_value=start + 10):
+            for _ in range(2):
+                self.client.get('/api/posts/')
+
+        # Следующее окно: от предыдущего осталось 2 * 50/60, место есть на один запрос
+        with mock.patch(timer, return_value=start + 70):
+            self.assertEqual(self.client.get('/api/posts/').status_code, status.HTTP_200_OK)
+            response = self.client.get('/api/posts/')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # 2 * (1 - t/60) + 1 < 2 при t > 30, то есть через 20 секунд
+        self.assertEqual(response['Retry-After'], '20')
+
+        with mock.patch(timer, return_value=start + 130):
+            self.assertEqual(self.client.get('/api/posts/').status_code, status.HTTP_200_OK)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(uploads='1/min'))
+    def test_uploads_limited(self):
+        self.client.force_authenticate(user=self.user)
+        data = {'title': 'Кот', 'description': 'Первая загрузка'}
+        with create_test_image() as image:
+            response = self.client.post('/api/posts/', {**data, 'image': image}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        post_id = response.data['id']
+
+        with create_test_image() as image:
+            response = self.client.post('/api/posts/', {**data, 'image': image}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        # Правка без файла под ограничение загрузок не попадает
+        response = self.client.patch(
+            f'/api/posts/{post_id}/', {'title': 'Новое название'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(auth='2/min'))
+    def test_auth_endpoints_limited(self):
+        credentials = {'username': 'testuser', 'password': 'testpass123'}
+        self.assertEqual(
+            self.client.post(reverse('token'), credentials, format='json').status_code,
+            status.HTTP_200_OK
+        )
+        self.client.post(reverse('login'), credentials, format='json')
+        self.client.logout()
+        with mock.patch('api.views.authenticate') as authenticate:
+            response = self.client.post(reverse('login'), credentials, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        authenticate.assert_not_called()
+
+    @override_settings(
+        ROOT_URLCONF='kittygram.asgi_urls', REST_FRAMEWORK=throttle_rates(anon_read='2/min')
+    )
+    def test_async_views_limited(self):
+        for _ in range(2):
+            self.client.get('/api/posts/')
+        response = self.client.get('/api/posts/1/')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    @override_settings(MAX_CONCURRENT_UPLOADS=1)
+    def test_concurrent_uploads_limited(self):
+        factory = RequestFactory()
+        nested = []
+
+        def get_response(request):
+            # Пока первая загрузка обрабатывается, приходят ещё два запроса
+            if not nested:
+                nested.append(middleware(factory.post('/api/posts/', {'title': 'Кот'})))
+                nested.append(middleware(factory.get('/api/posts/')))
+            return HttpResponse()
+
+        middleware = UploadConcurrencyMiddleware(get_response)
+        self.assertEqual(middleware(factory.post('/api/posts/', {'title': 'Кот'})).status_code, 200)
+        upload, read = nested
+        self.assertEqual(upload.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(upload['Retry-After'], str(settings.UPLOAD_RETRY_AFTER))
+        self.assertEqual(read.status_code, 200)
+
+        # Место освобождается после ответа
+        self.assertEqual(middleware(factory.post('/api/posts/', {'title': 'Кот'})).status_code, 200)
+
+class BatchOperationTests(TempMediaMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.other_user = User.objects.create_user(username='otheruser', password='otherpass123')
+        self.client.force_authenticate(user=self.user)
+
+        with create_test_image() as image:
+            response = self.client.post(
+                reverse('post-list'), {'title': 'Cat', 'image': image}, format='multipart'
+            )
+        run_pending_jobs()
+        self.post = Post.objects.get(pk=response.data['id'])
+        self.other_post = Post.objects.create(
+            title='Other', image=self.post.image.name, author=self.other_user
+        )
+        self.url = reverse('post-batch')
+
+    def test_fetch_by_ids(self):
+        for enabled in (True, False):
+            with self.settings(POSTS_CACHE_ENABLED=enabled):
+                response = self.client.get(
+                    self.url, {'ids': f'{self.other_post.pk},{self.post.pk},999'}
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                [post['id'] for post in response.data['results']],
+                [self.other_post.pk, self.post.pk]
+            )
+            self.assertEqual(
+                [post['can_edit'] for post in response.data['results']], [False, True]
+            )
+            self.assertEqual(response.data['not_found'], [999])
+
+    def test_bad_ids(self):
+        self.assertEqual(self.client.get(self.url, {'ids': 'a,b'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        with self.settings(POSTS_BATCH_MAX_SIZE=2):
+            self.assertEqual(self.client.get(self.url, {'ids': '1,2,3'}).status_code, 400)
+
+    def test_create(self):
+        self.client.get(reverse('post-list'))
+        image_url = self.client.get(reverse('post-detail', args=[self.post.pk])).data['image']
+        items = [
+            {'title': f'Cat {i}', 'description': 'Из пакета', 'image': image_url}
+            for i in range(20)
+        ]
+        items.append({'description': 'Без названия', 'image': image_url})
+        items.append({'title': 'Чужая фотография', 'image': 'posts/aa/missing.jpg'})
+
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['created'] * 20 + ['invalid'] * 2)
+        self.assertIn('title', results[20]['errors'])
+        self.assertIn('image', results[21]['errors'])
+
+        created = Post.objects.get(pk=results[0]['id'])
+        self.assertEqual(created.author, self.user)
+        self.assertEqual(created.image.name, self.post.image.name)
+        self.assertEqual(created.image_variants, self.post.image_variants)
+        self.assertEqual(results[0]['post']['title'], 'Cat 0')
+
+        # Кэш ленты сброшен
+        response = self.client.get(reverse('post-list'), {'page_size': 50})
+        self.assertEqual(len(response.data['results']), 22)
+
+    def test_update(self):
+        self.client.get(reverse('post-detail', args=[self.post.pk]))
+        items = [
+            {'id': self.post.pk, 'title': 'Новое название'},
+            {'id': self.other_post.pk, 'title': 'Чужой'},
+            {'id': 999, 'description': 'Нет такого'},
+            {'title': 'Без id'},
+        ]
+        response = self.client.patch(self.url, items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['status'] for r in response.data['results']],
+            ['updated', 'forbidden', 'not_found', 'invalid']
+        )
+        self.assertEqual(response.data['results'][0]['post']['title'], 'Новое название')
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.title, 'Новое название')
+        self.assertEqual(Post.objects.get(pk=self.other_post.pk).title, 'Other')
+        # Кэш поста сброшен, ETag изменился вместе с updated_at
+        response = self.client.get(reverse('post-detail', args=[self.post.pk]))
+        self.assertEqual(response.data['title'], 'Новое название')
+
+    def test_update_queries_do_not_grow(self):
+        posts = Post.objects.bulk_create(
+            Post(title=f'Cat {i}', image=self.post.image.name, author=self.user)
+            for i in range(50)
+        )
+        items = [{'id': post.pk, 'description': 'Синхронизировано'} for post in posts]
+        with self.assertNumQueries(4):
+            response = self.client.patch(self.url, items, format='json')
+        self.assertEqual(
+            {r['status'] for r in response.data['results']}, {'updated'}
+        )
+        self.assertEqual(
+            Post.objects.filter(description='Синхронизировано').count(), 50
+        )
+
+    def test_delete(self):
+        image_name = self.post.image.name
+        response = self.client.delete(
+            f'{self.url}?ids={self.post.pk},{self.other_post.pk},999'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['status'] for r in response.data['results']],
+            ['deleted', 'forbidden', 'not_found']
+        )
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
+        self.assertTrue(Post.objects.filter(pk=self.other_post.pk).exists())
+        # Чужой пост ссылается на ту же фотографию, файл остаётся
+        self.assertTrue(default_storage.exists(image_name))
+
+        self.client.force_authenticate(user=self.other_user)
+        self.client.delete(f'{self.url}?ids={self.other_post.pk}')
+        self.assertFalse(default_storage.exists(image_name))
+
+    def test_anonymous_cannot_write(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.delete(f'{self.url}?ids={self.post.pk}')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertTrue(Post.objects.filter(pk=self.post.pk).exists())
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser', email='test@example.com', password='testpass123'
+        )
+        self.post = Post.objects.create(
+            title='First Post', description='Очень длинное описание' * 100, author=self.user
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_fields_limit_list_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('post-list'), {'fields': 'id,title,image'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'image'})
+
+        post_query = queries.captured_queries[-1]['sql']
+        self.assertIn('"api_post"."title"', post_query)
+        self.assertNotIn('"api_post"."description"', post_query)
+        self.assertNotIn('auth_user', post_query)
+
+    def test_author_collapsed_until_expanded(self):
+        url = reverse('post-list')
+        item = self.client.get(url, {'fields': 'id,author,can_edit'}).data['results'][0]
+        self.assertEqual(item, {'id': self.post.id, 'author': self.user.id, 'can_edit': True})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,author', 'expand': 'author'})
+        self.assertEqual(
+            response.data['results'][0]['author'],
+            {'id': self.user.id, 'username': 'testuser', 'email': 'test@example.com'}
+        )
+        self.assertIn('auth_user', queries.captured_queries[-1]['sql'])
+        self.assertNotIn('"api_post"."description"', queries.captured_queries[-1]['sql'])
+
+    def test_expand_without_fields_keeps_all_fields(self):
+        response = self.client.get(reverse('post-list'), {'expand': 'author'})
+        full = self.client.get(reverse('post-list'))
+        self.assertEqual(response.data['results'], full.data['results'])
+
+    def test_unknown_fields_rejected(self):
+        response = self.client.get(reverse('post-list'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('post-list'), {'expand': 'comments'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_and_my_posts(self):
+        # Подробный пост уже в кэше в полном виде
+        self.client.get(reverse('post-detail', args=[self.post.id]))
+        response = self.client.get(
+            reverse('post-detail', args=[self.post.id]), {'fields': 'id,title'}
+        )
+        self.assertEqual(response.data, {'id': self.post.id, 'title': 'First Post'})
+
+        response = self.client.get(reverse('post-my-posts'), {'fields': 'title'})
+        self.assertEqual(response.data['results'], [{'title': 'First Post'}])
+        # Курсор строится по created_at и id, даже если их нет в ответе
+        self.assertIn('next', response.data)
+
+    def test_different_fields_different_etags(self):
+        url = reverse('post-detail', args=[self.post.id])
+        etag = self.client.get(url, {'fields': 'id'})['ETag']
+        response = self.client.get(url, {'fields': 'title'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(ROOT_URLCONF='kittygram.asgi_urls')
+    def test_async_detail(self):
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(f'/api/posts/{self.post.id}/', {'fields': 'id,title'})
+        self.assertEqual(response.json(), {'id': self.post.id, 'title': 'First Post'})
+
+    def test_writes_return_full_representation(self):
+        response = self.client.patch(
+            f"{reverse('post-detail', args=[self.post.id])}?fields=id",
+            {'title': 'Новое название'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('description', response.data)
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.in_title = Post.objects.create(
+            title='Рыжий кот', description='Спит на диване', author=self.user
+        )
+        self.in_description = Post.objects.create(
+            title='Утро', description='Рыжий котёнок, клубок ниток', author=self.user
+        )
+        self.other = Post.objects.create(
+            title='Серая кошка', description='Смотрит в окно', author=self.user
+        )
+
+    def search(self, text, **params):
+        response = self.client.get(reverse('post-list'), {'search': text, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def ids(self, response):
+        return [post['id'] for post in response.data['results']]
+
+    def test_ranked_by_relevance(self):
+        # Совпадение в названии важнее, хотя пост в описании новее
+        self.assertEqual(self.ids(self.search('рыжий')), [self.in_title.id, self.in_description.id])
+        self.assertEqual(self.ids(self.search('кот')), [self.in_title.id, self.in_description.id])
+        self.assertEqual(self.ids(self.search('рыжий клубок')), [self.in_description.id])
+        self.assertEqual(self.ids(self.search('собака')), [])
+
+    def test_index_follows_changes(self):
+        self.in_title.title = 'Чёрный кот'
+        self.in_title.save()
+        self.assertEqual(self.ids(self.search('рыжий')), [self.in_description.id])
+        self.assertEqual(self.ids(self.search('чёрный')), [self.in_title.id])
+
+        self.in_description.delete()
+        self.assertEqual(self.ids(self.search('клубок')), [])
+
+        # bulk_create и update() сигналов не отправляют, индекс обновляет БД
+        Post.objects.bulk_create([Post(title='Сфинкс', author=self.user)])
+        Post.objects.filter(pk=self.other.pk).update(description='Сфинкс на подоконнике')
+        self.assertEqual(len(self.ids(self.search('сфинкс'))), 2)
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.ids(self.search('сфинкс'))), 2)
+
+    @skipUnless(connection.vendor == 'sqlite', 'Только для SQLite')
+    def test_triggers_restored_after_migrate(self):
+        # Так триггеры теряет миграция, пересоздающая api_post
+        search.execute(connection, search.SQLITE_DROP[:-1])
+        Post.objects.filter(pk=self.other.pk).update(title='Сфинкс')
+
+        emit_post_migrate_signal(0, False, 'default')
+        self.assertEqual(self.ids(self.search('сфинкс')), [self.other.id])
+        Post.objects.filter(pk=self.other.pk).update(title='Серая кошка')
+        self.assertEqual(self.ids(self.search('сфинкс')), [])
+
+    def test_pagination_by_offset(self):
+        response = self.search('кот', page_size=1)
+        self.assertEqual(self.ids(response), [self.in_title.id])
+        self.assertIsNone(response.data['previous'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self.ids(response), [self.in_description.id])
+        self.assertIsNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+
+    def test_query_syntax_is_not_interpreted(self):
+        for text in ['"рыжий', 'кот AND OR (', 'NEAR(кот', '*', 'title:кот']:
+            self.search(text)
+        self.assertEqual(self.ids(self.search('!!!')), [])
+
+    def test_empty_search_is_feed(self):
+        response = self.search('  ')
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_search_with_fields(self):
+        response = self.search('кошка', fields='id,title')
+        self.assertEqual(response.data['results'], [{'id': self.other.id, 'title': 'Серая кошка'}])
+
+    def test_admin_search(self):
+        admin = User.objects.create_superuser(username='admin', password='adminpass123')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/api/post/', {'q': 'клубок'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.context['cl'].result_list), [self.in_description])
+
+@override_settings(METRICS_TOKEN='metrics-secret')
+class MetricsTests(TempMediaMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        registry.reset()
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        Post.objects.create(title='Post', author=self.user)
+
+    def get_metrics(self):
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer metrics-secret'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return {
+            line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in response.content.decode().splitlines()
+            if not line.startswith('#')
+        }
+
+    def test_records_latency_queries_and_sizes_per_route(self):
+        response = self.client.get(reverse('post-list'))
+        metrics = self.get_metrics()
+
+        labels = '{route="post-list",method="GET",status="200"}'
+        self.assertEqual(metrics[f'kittygram_http_request_duration_seconds_count{labels}'], 1)
+        self.assertEqual(
+            metrics['kittygram_http_request_duration_seconds_bucket'
+                    '{route="post-list",method="GET",status="200",le="+Inf"}'], 1
+        )
+        self.assertGreater(metrics[f'kittygram_db_queries_total{labels}'], 0)
+        self.assertEqual(
+            metrics[f'kittygram_http_response_bytes_total{labels}'], len(response.content)
+        )
+        self.assertIn('kittygram_posts_cache_misses_total', metrics)
+
+    def test_records_request_body_bytes(self):
+        self.client.force_authenticate(self.user)
+        with create_test_image() as image:
+            response = self.client.post(
+                reverse('post-list'), {'title': 'Новый пост', 'image': image}, format='multipart'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        metrics = self.get_metrics()
+
+        labels = '{route="post-list",method="POST",status="201"}'
+        self.assertGreater(metrics[f'kittygram_http_request_bytes_total{labels}'], 0)
+
+    def test_unknown_methods_share_one_series(self):
+        for method in ('FOO', 'BAR'):
+            self.client.generic(method, '/no-such-page/')
+        metrics = self.get_metrics()
+
+        labels = '{route="unmatched",method="other",status="404"}'
+        self.assertEqual(metrics[f'kittygram_http_request_duration_seconds_count{labels}'], 2)
+        self.assertFalse(any('FOO' in name for name in metrics))
+
+    @override_settings(ROOT_URLCONF='kittygram.asgi_urls')
+    def test_counts_queries_of_async_views(self):
+        self.client.login(username='testuser', password='testpass123')
+        self.client.get(reverse('current-user'))
+        metrics = self.get_metrics()
+
+        labels = '{route="current-user",method="GET",status="200"}'
+        self.assertGreater(metrics[f'kittygram_db_queries_total{labels}'], 0)
+
+    def test_requires_token_or_staff(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_sums_counters_of_all_workers(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            self.client.get(reverse('post-list'))
+            # Счётчики другого воркера gunicorn
+            registry.flush()
+            other = os.path.join(directory, f'{os.getpid()}.json')
+            os.rename(other, os.path.join(directory, '1.json'))
+            registry.reset()
+            self.client.get(reverse('post-list'))
+
+            metrics = self.get_metrics()
+
+        labels = '{route="post-list",method="GET",status="200"}'
+        self.assertEqual(metrics[f'kittygram_http_request_duration_seconds_count{labels}'], 2)
+
+
+class ProfilingTests(TempMediaMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+        self.client = APIClient()
+        self.admin = User.objects.create_user(
+            username='admin', password='adminpass123', is_staff=True, is_superuser=True
+        )
+        Post.objects.create(title='Post', author=self.admin)
+
+    def test_signed_header_profiles_request(self):
+        response = self.client.get(
+            reverse('post-list'), HTTP_X_PROFILE_TOKEN=issue_token(self.admin)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.trigger, RequestProfile.TRIGGER_HEADER)
+        self.assertEqual(profile.username, 'admin')
+        self.assertEqual((profile.route, profile.status_code), ('post-list', 200))
+        self.assertGreater(profile.query_count, 0)
+        self.assertEqual(len(profile.sql), profile.query_count)
+        self.assertTrue(any('api_post' in sql for sql, _ in profile.sql))
+        self.assertTrue(profile.stacks.name.startswith('.profiles/'))
+
+    def test_invalid_token_is_ignored(self):
+        response = self.client.get(reverse('post-list'), HTTP_X_PROFILE_TOKEN='forged')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_token_revoked_with_staff_status(self):
+        token = issue_token(self.admin)
+        self.admin.is_staff = False
+        self.admin.save()
+
+        self.client.get(reverse('post-list'), HTTP_X_PROFILE_TOKEN=token)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILE_MAX_COUNT=2, PROFILE_MAX_AGE=timedelta(days=1))
+    def test_old_profiles_pruned(self):
+        token = issue_token(self.admin)
+        for _ in range(4):
+            self.client.get(reverse('post-list'), HTTP_X_PROFILE_TOKEN=token)
+        profiles = list(RequestProfile.objects.order_by('id'))
+        RequestProfile.objects.filter(pk=profiles[-1].pk).update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+
+        enqueue('prune_request_profiles')
+        run_pending_jobs()
+        self.assertEqual(list(RequestProfile.objects.order_by('id')), profiles[1:3])
+        self.assertFalse(os.path.exists(profiles[0].stacks.path))
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0)
+    def test_sampled_requests_are_profiled(self):
+        self.client.get(reverse('post-list'))
+        self.assertEqual(RequestProfile.objects.get().trigger, RequestProfile.TRIGGER_SAMPLE)
+
+    def test_sampler_writes_folded_stacks(self):
+        def busy_loop():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        sampler = Sampler({threading.get_ident()}, interval=0.001)
+        sampler.start()
+        busy_loop()
+        sampler.stop()
+
+        lines = sampler.folded().splitlines()
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertGreater(int(count), 0)
+        self.assertIn('api.tests:ProfilingTests.test_sampler_writes_folded_stacks', stack)
+        self.assertTrue(stack.endswith('busy_loop'))
+
+    def test_admin_lists_profiles_and_serves_stacks(self):
+        self.client.login(username='admin', password='adminpass123')
+        token = self.client.get(reverse('admin:api_requestprofile_token')).content.decode()
+        self.assertTrue(token.startswith('X-Profile-Token: '))
+
+        self.client.get(reverse('post-list'), HTTP_X_PROFILE_TOKEN=token.split(': ')[1].strip())
+        profile = RequestProfile.objects.get()
+
+        response = self.client.get(reverse('admin:api_requestprofile_changelist'))
+        self.assertContains(response, reverse('admin:api_requestprofile_stacks', args=[profile.pk]))
+        response = self.client.get(reverse('admin:api_requestprofile_change', args=[profile.pk]))
+        self.assertContains(response, 'api_post')
+
+        response = self.client.get(reverse('admin:api_requestprofile_stacks', args=[profile.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), profile.stacks.read())
+
+        path = profile.stacks.path
+        profile.delete()
+        self.assertFalse(os.path.exists(path))
+
+
+@override_settings(REST_FRAMEWORK=throttle_rates(
+    anon_read='100000/s', user_read='100000/s', uploads='100000/s', auth='100000/s'
+))
+class LoadTestCommandTests(TempMediaMixin, LiveServerTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def loadtest(self, **options):
+        # Один клиент: тестовый сервер делит с тестом одно соединение с SQLite в памяти
+        call_command(
+            'loadtest', url=self.live_server_url, duration=1, concurrency=1, seed_posts=5,
+            output=os.path.join(self.media_root, 'results.json'), stdout=StringIO(), **options
+        )
+        with open(os.path.join(self.media_root, 'results.json')) as file:
+            return json.load(file)
+
+    def test_reports_every_endpoint_and_cleans_up(self):
+        results = self.loadtest(mix='feed=1,detail=1,me=1,login=1,upload=1,patch=1,delete=1')
+
+        self.assertGreater(results['total']['requests'], 0)
+        self.assertEqual(results['total']['errors'], 0, results['endpoints'])
+        for name in ('feed', 'detail', 'me', 'upload'):
+            row = results['endpoints'][name]
+            self.assertGreater(row['requests'], 0)
+            self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+            self.assertLessEqual(row['p95_ms'], row['p99_ms'])
+        self.assertFalse(User.objects.filter(username__startswith='loadtest_user_').exists())
+        self.assertFalse(Post.objects.exists())
+
+    def test_compares_with_baseline(self):
+        baseline = os.path.join(self.media_root, 'baseline.json')
+        results = self.loadtest(mix='feed=1,me=1', baseline=baseline)
+        with open(baseline) as file:
+            self.assertEqual(json.load(file)['total'], results['total'])
+
+        results['total']['rps'] *= 1000
+        with open(baseline, 'w') as file:
+            json.dump(results, file)
+        with self.assertRaisesMessage(CommandError, 'RPS'):
+            self.loadtest(mix='feed=1,me=1', baseline=baseline)
+
+        results['concurrency'] = 5
+        with open(baseline, 'w') as file:
+            json.dump(results, file)
+        with self.assertRaisesMessage(CommandError, 'concurrency: 5 -> 1'):
+            self.loadtest(mix='feed=1,me=1', baseline=baseline)
+
+    def test_error_rate_regression(self):
+        def results(errors):
+            row = {'requests': 100, 'errors': errors, 'rps': 50.0, 'p95_ms': 10.0}
+            return {'total': row, 'endpoints': {'feed': row}}
+
+        command = LoadTestCommand(stdout=StringIO())
+        self.assertEqual(command.compare(results(5), results(0), tolerance=10), [])
+        # Быстрые 5xx вместо ответов: RPS и p95 не хуже, но ошибок больше
+        self.assertEqual(
+            command.compare(results(50), results(0), tolerance=10), ['ошибки', 'feed ошибки']
+        )
+
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        static_settings = self.settings(STATIC_ROOT=static_root.name)
+        static_settings.enable()
+        self.addCleanup(static_settings.disable)
+        self.root = static_root.name
+
+    def collectstatic(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def read(self, name):
+        with open(os.path.join(self.root, name), 'rb') as file:
+            return file.read()
+
+    def test_pages_reference_hashed_assets(self):
+        self.collectstatic()
+
+        page = self.read('login.html').decode()
+        style = re.search(r'href="(css/style\.[0-9a-f]{12}\.css)"', page)[1]
+        script = re.search(r'src="(js/auth\.[0-9a-f]{12}\.js)"', page)[1]
+        self.assertNotIn('href="css/style.css"', page)
+        self.assertEqual(self.read(style), self.read('css/style.css'))
+        self.assertEqual(self.read(script), self.read('js/auth.js'))
+
+    def test_writes_gzip_siblings(self):
+        self.collectstatic()
+
+        for name in ('index.html', 'js/posts.js', 'admin/css/base.css'):
+            self.assertEqual(gzip.decompress(self.read(f'{name}.gz')), self.read(name))
+
+    def test_hash_changes_with_content(self):
+        self.collectstatic()
+        first = os.listdir(os.path.join(self.root, 'css'))
+
+        with tempfile.TemporaryDirectory() as frontend:
+            os.makedirs(os.path.join(frontend, 'css'))
+            source = os.path.join(frontend, 'css', 'style.css')
+            with open(source, 'w') as file:
+                file.write('body { color: red; }')
+            # collectstatic сравнивает время изменения с точностью до секунды
+            os.utime(source, (time.time() + 10, time.time() + 10))
+            with self.settings(STATICFILES_DIRS=[frontend]):
+                self.collectstatic()
+
+        second = set(os.listdir(os.path.join(self.root, 'css'))) - set(first)
+        self.assertEqual(len(second), 1)
+        self.assertRegex(second.pop(), r'^style\.[0-9a-f]{12}\.css$')
+
+
+class DatabaseUrlTests(TestCase):
+    def test_sqlite_relative_path(self):
+        config = parse_database_url('sqlite:///db.sqlite3', base_dir='/app/kittygram')
+        self.assertEqual(config['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(config['NAME'], '/app/kittygram/db.sqlite3')
+
+    def test_postgres_url(self):
+        config = parse_database_url(
+            'postgres://kitty:p%40ss@db:5432/kittygram?sslmode=require',
+            base_dir='/app/kittygram',
+            conn_max_age=60,
+            conn_health_checks=True,
+        )
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(config['NAME'], 'kittygram')
+        self.assertEqual(config['PASSWORD'], 'p@ss')
+        self.assertEqual(config['PORT'], '5432')
+        self.assertEqual(config['OPTIONS'], {'sslmode': 'require'})
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+
+    def test_unknown_scheme(self):
+        with self.assertRaises(ValueError):
+            parse_database_url('mysql://localhost/kittygram', base_dir='/app')
+
+@skipUnless(connection.vendor == 'sqlite', 'Только для SQLite')
+class SqlitePragmaTests(TestCase):
+    def get_pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        connection.ensure_connection()
+        self.assertEqual(self.get_pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.get_pragma('busy_timeout'), 5000)
+
+    def test_settings_override(self):
+        with self.settings(SQLITE_PRAGMAS={'busy_timeout': 1234, 'cache_size': None}):
+            pragmas = get_sqlite_pragmas()
+        self.assertEqual(pragmas['busy_timeout'], 1234)
+        self.assertNotIn('cache_size', pragmas)
+        self.assertEqual(pragmas['journal_mode'], 'WAL')
+
 class PermissionTests(APITestCase):
     def setUp(self):
         self.client = APIClient()
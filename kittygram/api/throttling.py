@@ -0,0 +1,114 @@
+"""
+Ограничение частоты запросов (DEFAULT_THROTTLE_RATES в settings.REST_FRAMEWORK).
+
+Области:
+    anon_read  - чтение анонимными клиентами, по IP-адресу;
+    user_read  - чтение авторизованными пользователями, по id;
+    uploads    - загрузка фотографий (multipart POST/PUT/PATCH);
+    auth       - регистрация, вход и выдача токенов, по IP-адресу.
+
+Вместо списка времени всех запросов, как в SimpleRateThrottle, в кэше лежат
+два счётчика: текущего и предыдущего окна. Число запросов за последние
+duration секунд оценивается как текущий счётчик плюс доля предыдущего,
+пропорциональная тому, сколько окна ещё не прошло. На запрос - одно чтение
+двух ключей и один incr, независимо от лимита.
+"""
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+UPLOAD_METHODS = ('POST', 'PUT', 'PATCH')
+
+
+def is_upload(request):
+    # Тело ещё не прочитано: смотрим только на метод и Content-Type
+    return (
+        request.method in UPLOAD_METHODS
+        and request.META.get('CONTENT_TYPE', '').startswith('multipart/form-data')
+    )
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    def get_rate(self):
+        # Читаем настройки при создании, а не при импорте (override_settings в тестах)
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        window = int(now // self.duration)
+        current_key = f'{self.key}:{window}'
+        previous_key = f'{self.key}:{window - 1}'
+        counts = self.cache.get_many([current_key, previous_key])
+        self.current = counts.get(current_key, 0)
+        self.previous = counts.get(previous_key, 0)
+        self.elapsed = now - window * self.duration
+
+        weight = 1 - self.elapsed / self.duration
+        if self.previous * weight + self.current >= self.num_requests:
+            return self.throttle_failure()
+
+        try:
+            self.cache.incr(current_key)
+        except ValueError:
+            # Счётчик нужен и следующему окну как «предыдущий»
+            if not self.cache.add(current_key, 1, self.duration * 2):
+                self.cache.incr(current_key)
+        return self.throttle_success()
+
+    def throttle_success(self):
+        return True
+
+    def wait(self):
+        if self.previous and self.current < self.num_requests:
+            # Доля предыдущего окна убывает, пока оценка не опустится ниже лимита
+            free = (self.num_requests - self.current) / self.previous
+            wait = self.duration * (1 - free) - self.elapsed
+        else:
+            wait = self.duration - self.elapsed
+        return max(wait, 1)
+
+
+class AnonReadThrottle(SlidingWindowRateThrottle):
+    scope = 'anon_read'
+
+    def get_cache_key(self, request, view):
+        if request.method not in SAFE_METHODS or request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class UserReadThrottle(SlidingWindowRateThrottle):
+    scope = 'user_read'
+
+    def get_cache_key(self, request, view):
+        if request.method not in SAFE_METHODS or not request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': request.user.pk}
+
+
+class UploadThrottle(SlidingWindowRateThrottle):
+    scope = 'uploads'
+
+    def get_cache_key(self, request, view):
+        if not is_upload(request):
+            return None
+        if request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class AuthThrottle(SlidingWindowRateThrottle):
+    scope = 'auth'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
@@ -0,0 +1,62 @@
+"""
+Подписанные токены для API-клиентов (мобильное приложение, скрипты).
+
+Access-токен живёт несколько минут, проверяется подписью SECRET_KEY,
+а пользователь по id из токена берётся первым бэкендом
+AUTHENTICATION_BACKENDS - из кэша, если он общий для воркеров (api/backends.py).
+Refresh-токен живёт дольше, при обмене пользователь читается из БД:
+отключённый аккаунт или сменённый пароль делают все выданные
+refresh-токены недействительными.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_backends
+from django.contrib.auth.models import User
+from django.core import signing
+from django.utils.crypto import constant_time_compare
+
+ACCESS_SALT = 'api.tokens.access'
+REFRESH_SALT = 'api.tokens.refresh'
+
+
+class TokenError(Exception):
+    pass
+
+
+def issue_tokens(user):
+    access = signing.dumps({'u': user.pk}, salt=ACCESS_SALT)
+    refresh = signing.dumps(
+        {'u': user.pk, 'h': user.get_session_auth_hash()}, salt=REFRESH_SALT
+    )
+    return {
+        'access': access,
+        'refresh': refresh,
+        'access_expires_in': int(settings.API_ACCESS_TOKEN_LIFETIME.total_seconds()),
+    }
+
+
+def load_token(token, salt, max_age):
+    try:
+        return signing.loads(token, salt=salt, max_age=max_age)
+    except signing.SignatureExpired:
+        raise TokenError('Срок действия токена истёк')
+    except signing.BadSignature:
+        raise TokenError('Неверный токен')
+
+
+def user_from_access_token(token):
+    payload = load_token(token, ACCESS_SALT, settings.API_ACCESS_TOKEN_LIFETIME)
+    user = get_backends()[0].get_user(payload['u'])
+    if user is None:
+        # Пользователь удалён или отключён
+        raise TokenError('Неверный токен')
+    return user
+
+
+def refresh_tokens(token):
+    payload = load_token(token, REFRESH_SALT, settings.API_REFRESH_TOKEN_LIFETIME)
+
+    user = User.objects.filter(pk=payload['u'], is_active=True).first()
+    if user is None or not constant_time_compare(payload['h'], user.get_session_auth_hash()):
+        raise TokenError('Неверный токен')
+    return user, issue_tokens(user)
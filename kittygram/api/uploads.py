@@ -0,0 +1,87 @@
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from PIL import Image, UnidentifiedImageError
+
+ALLOWED_IMAGE_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+# Сколько байт начала файла накапливаем для разбора заголовка
+# (в JPEG перед размерами может идти EXIF до 64 КБ)
+HEADER_LIMIT = 256 * 1024
+
+
+class StreamingImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет загружаемый файл кусками во временный файл рядом с MEDIA_ROOT
+    и проверяет заголовок изображения по мере поступления данных.
+
+    Pillow открывает картинку лениво: Image.open читает только заголовок,
+    поэтому файл не того формата или со слишком большим разрешением
+    отклоняется после первых килобайт, не дожидаясь всего тела запроса.
+    Отказ сохраняется в request.rejected_uploads и превращается
+    в ошибку валидации в PostSerializer.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # Временные файлы на том же разделе, что и медиа: сохранение - это rename
+        if settings.FILE_UPLOAD_TEMP_DIR:
+            os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+        super().new_file(*args, **kwargs)
+        self.header = bytearray()
+        self.header_checked = False
+        self.received = 0
+        # SHA-256 считаем на лету для ContentAddressedStorage
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            max_size_mb = settings.POST_IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)
+            self.reject(f'Размер файла не должен превышать {max_size_mb} МБ')
+
+        if not self.header_checked:
+            self.header += raw_data
+            self.check_header(complete=len(self.header) >= HEADER_LIMIT)
+
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if not self.header_checked:
+            self.check_header(complete=True)
+
+        uploaded = super().file_complete(file_size)
+        uploaded.content_hash = self.sha256.hexdigest()
+        return uploaded
+
+    def check_header(self, complete):
+        try:
+            with Image.open(BytesIO(self.header)) as image:
+                image_format = image.format
+                width, height = image.size
+        except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+            # Заголовок мог ещё не прийти целиком - ждём следующий кусок
+            if complete:
+                self.reject('Загрузите корректное изображение')
+            return
+        except Image.DecompressionBombError:
+            self.reject('Слишком большое разрешение изображения')
+
+        if image_format not in ALLOWED_IMAGE_FORMATS:
+            self.reject('Разрешены только файлы JPEG, PNG, GIF и WebP')
+        if Image.MAX_IMAGE_PIXELS and width * height > Image.MAX_IMAGE_PIXELS:
+            self.reject('Слишком большое разрешение изображения')
+
+        self.header_checked = True
+        self.header = bytearray()
+
+    def reject(self, message):
+        rejected = getattr(self.request, 'rejected_uploads', {})
+        rejected[self.field_name] = [message]
+        self.request.rejected_uploads = rejected
+
+        # Прекращаем разбор: остаток тела запроса не читается и не сохраняется
+        raise StopUpload(connection_reset=True)
@@ -1,29 +1,250 @@
+import hashlib
+import hmac
+
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.exceptions import PermissionDenied, AuthenticationFailed
+from rest_framework.exceptions import PermissionDenied, AuthenticationFailed, ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import login, authenticate, logout
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
 from django.utils.decorators import method_decorator
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.http import http_date, quote_etag
+from .cache import (
+    cache_enabled, get_feed, get_feed_version, get_posts, get_stats, invalidate_posts, render_post
+)
+from .images import release_image, restore_image
+from .jobs import enqueue
+from .login_attempts import LoginAttempts
+from .metrics import registry, render
 from .models import Post
-from .serializers import PostSerializer, UserRegistrationSerializer, UserSerializer
+from .pagination import PostCursorPagination, PostSearchPagination
+from .search import search_posts
+from .serializers import (
+    PostBatchCreateSerializer, PostBatchUpdateSerializer, PostCompactSerializer, PostSerializer,
+    UserRegistrationSerializer, UserSerializer
+)
+from .throttling import AuthThrottle
+from .tokens import TokenError, issue_tokens, refresh_tokens
+
+# Поля автора, которые реально отдаёт UserSerializer
+AUTHOR_FIELDS = ('author__id', 'author__username', 'author__email')
+
+# Столбцы, которые читает каждое поле PostSerializer (для ?fields=)
+FIELD_COLUMNS = {
+    'id': ('id',),
+    'title': ('title',),
+    'description': ('description',),
+    'image': ('image',),
+    'image_srcset': ('image_variants',),
+    'image_status': ('image_status',),
+    'author': ('author',),
+    'created_at': ('created_at',),
+    'updated_at': ('updated_at',),
+    'can_edit': ('author',),
+}
+# Нужны всегда: курсор пагинации и ETag поста
+REQUIRED_COLUMNS = ('id', 'created_at', 'updated_at')
+EXPANDABLE_FIELDS = {'author'}
+
+
+def split_param(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def conditional_response(request, etag, last_modified, build_response):
+    """
+    Условный GET: если валидаторы клиента (If-None-Match, If-Modified-Since)
+    совпадают, отвечает 304 без вызова build_response, то есть без выборки
+    постов и сериализации. Иначе добавляет ETag и Last-Modified к ответу.
+    """
+    etag, timestamp = make_validators(etag, last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build_response()
+    return add_validators(response, etag, timestamp)
+
+
+def post_etag(pk, updated_at, user_id, author=None):
+    # Встроенные имя и email автора меняются без изменения самого поста
+    etag = f'{pk}:{updated_at.isoformat()}:{user_id}'
+    if author is not None:
+        etag = f"{etag}:{author['username']}:{author['email']}"
+    return etag
+
+
+def make_validators(etag, last_modified):
+    etag = quote_etag(hashlib.md5(etag.encode()).hexdigest())
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return etag, timestamp
+
+
+def add_validators(response, etag, timestamp):
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    # Ответ зависит от пользователя; браузер хранит его, но всегда перепроверяет
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
 
 class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all()
+    # Автор подтягивается JOIN-ом одним запросом, без N+1 к auth_user
+    queryset = Post.objects.select_related('author').only(
+        'id', 'title', 'description', 'image', 'image_variants', 'image_status',
+        'created_at', 'updated_at', 'author',
+        *AUTHOR_FIELDS
+    )
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = PostCursorPagination
+    # Параметры, при которых список можно отдать из кэша ленты
+    cached_list_params = {'cursor', 'page_size'}
+
+    @cached_property
+    def sparse_fieldset(self):
+        """
+        (fields, expand) из ?fields=title,image и ?expand=author для чтения
+        или None, если нужно полное представление.
+        """
+        params = self.request.query_params
+        if self.request.method not in permissions.SAFE_METHODS or not (
+            'fields' in params or 'expand' in params
+        ):
+            return None
+
+        fields = split_param(params.get('fields')) or list(FIELD_COLUMNS)
+        expand = split_param(params.get('expand'))
+        unknown = set(fields) - set(FIELD_COLUMNS)
+        if unknown:
+            raise ValidationError({'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}'})
+        unknown = set(expand) - EXPANDABLE_FIELDS
+        if unknown:
+            raise ValidationError({'expand': f'Нельзя раскрыть: {", ".join(sorted(unknown))}'})
+        return fields, expand
+
+    def get_queryset(self):
+        if self.sparse_fieldset is None:
+            return super().get_queryset()
+
+        # Читаем из БД только столбцы выбранных полей: без description
+        # и JOIN-а к auth_user, если они не запрошены
+        fields, expand = self.sparse_fieldset
+        columns = set(REQUIRED_COLUMNS)
+        for field in fields:
+            columns.update(FIELD_COLUMNS[field])
+        queryset = Post.objects.all()
+        if 'author' in expand and 'author' in fields:
+            queryset = queryset.select_related('author')
+            columns.update(AUTHOR_FIELDS)
+        return queryset.only(*columns)
+
+    @cached_property
+    def search_query(self):
+        # ?search= в ленте: полнотекстовый поиск по названию и описанию
+        if self.action != 'list':
+            return None
+        return self.request.query_params.get('search', '').strip() or None
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.search_query is not None:
+            queryset = search_posts(queryset, self.search_query)
+        return queryset
+
+    @property
+    def paginator(self):
+        # Результаты поиска упорядочены по релевантности, курсор по времени к ним не подходит
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.pagination_class
+            if self.search_query is not None:
+                pagination_class = PostSearchPagination
+            self._paginator = pagination_class()
+        return self._paginator
+
+    def get_serializer(self, *args, **kwargs):
+        if self.sparse_fieldset is None:
+            return super().get_serializer(*args, **kwargs)
+        fields, expand = self.sparse_fieldset
+        kwargs.setdefault('context', self.get_serializer_context())
+        return PostCompactSerializer(*args, fields=fields, expand=expand, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        # Версия ленты + пользователь (can_edit) + курсор и размер страницы
+        etag = f'{get_feed_version()}:{request.user.id}:{request.get_full_path()}'
+        return conditional_response(
+            request, etag, None, lambda: self.feed_response(request, *args, **kwargs)
+        )
+
+    def feed_response(self, request, *args, **kwargs):
+        if not cache_enabled() or set(request.query_params) - self.cached_list_params:
+            return super().list(request, *args, **kwargs)
+
+        rows, complete = get_feed()
+        ids = self.paginator.paginate_rows(rows, complete, request)
+        if ids is None:
+            # Страница глубже закэшированного начала ленты
+            return super().list(request, *args, **kwargs)
+
+        posts = get_posts(ids, self.get_queryset())
+        return self.paginator.get_paginated_response(
+            [render_post(post, request) for post in posts]
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if cache_enabled() and self.sparse_fieldset is None:
+            try:
+                pk = int(kwargs[self.lookup_field])
+            except ValueError:
+                raise Http404
+            posts = get_posts([pk], self.get_queryset())
+            if not posts:
+                raise Http404
+            post = posts[0]
+            updated_at, author = parse_datetime(post['updated_at']), post['author']
+            build_response = lambda: Response(render_post(post, request))
+        else:
+            instance = self.get_object()
+            pk, updated_at, author = instance.pk, instance.updated_at, None
+            if Post.author.is_cached(instance):
+                # Автор выбран JOIN-ом и встроен в ответ
+                author = {'username': instance.author.username, 'email': instance.author.email}
+            build_response = lambda: Response(self.get_serializer(instance).data)
+
+        etag = post_etag(pk, updated_at, request.user.id, author)
+        if self.sparse_fieldset is not None:
+            etag = f'{etag}:{request.get_full_path()}'
+        return conditional_response(request, etag, updated_at, build_response)
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        # Тяжёлая обработка фотографии уходит в фоновый воркер (run_worker)
+        post = serializer.save(author=self.request.user, image_status=Post.IMAGE_PROCESSING)
+        self.restore_uploaded_image(serializer, post)
+        enqueue('process_post_image', post_id=post.pk)
+
+    def restore_uploaded_image(self, serializer, post):
+        # Загруженная фотография могла совпасть с файлом, который удаляется
+        # параллельно (api/images.py, release_image)
+        content = serializer.validated_data.get('image')
+        if content is not None:
+            name = post.image.name
+            transaction.on_commit(lambda: restore_image(name, content))
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
         
         # Проверяем права на редактирование
-        if instance.author != request.user:
+        if instance.author_id != request.user.id:
             raise PermissionDenied("Вы можете редактировать только свои посты")
         
         # Для PATCH запроса используем частичное обновление
@@ -35,21 +256,209 @@ def update(self, request, *args, **kwargs):
         return Response(serializer.data)
 
     def perform_update(self, serializer):
-        serializer.save()
+        if 'image' in serializer.validated_data:
+            previous_image = serializer.instance.image.name
+            post = serializer.save(image_status=Post.IMAGE_PROCESSING)
+            self.restore_uploaded_image(serializer, post)
+            enqueue('process_post_image', post_id=post.pk)
+            if post.image.name != previous_image:
+                release_image(previous_image)
+        else:
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        image_name = instance.image.name
+        instance.delete()
+        release_image(image_name)
 
     def destroy(self, request, *args, **kwargs):
-        if self.get_object().author != request.user:
+        instance = self.get_object()
+        if instance.author_id != request.user.id:
             raise PermissionDenied("Вы можете удалять только свои посты")
-        return super().destroy(request, *args, **kwargs)
+        self.perform_destroy(instance)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    # Пакетные операции для клиентов, синхронизирующих много постов:
+    #   GET    /api/posts/batch/?ids=1,2,3                   - посты по списку id
+    #   POST   /api/posts/batch/ [{title, description, image}] - создание
+    #   PATCH  /api/posts/batch/ [{id, title, description}]    - изменение своих постов
+    #   DELETE /api/posts/batch/?ids=1,2,3                   - удаление своих постов
+    # Для записи в ответе результат по каждому элементу в порядке запроса.
+
+    def batch_ids(self, request):
+        try:
+            ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk]
+        except ValueError:
+            raise ValidationError({'error': 'Параметр ids - список id через запятую'})
+        self.check_batch_size(ids)
+        return list(dict.fromkeys(ids))
+
+    def batch_items(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError({'error': 'Ожидается список объектов'})
+        self.check_batch_size(request.data)
+        return request.data
+
+    def check_batch_size(self, items):
+        if not items:
+            raise ValidationError({'error': 'Пустой список'})
+        if len(items) > settings.POSTS_BATCH_MAX_SIZE:
+            raise ValidationError(
+                {'error': f'Не больше {settings.POSTS_BATCH_MAX_SIZE} элементов за запрос'}
+            )
+
+    def batch_results(self, results, posts):
+        # Сериализуем все посты разом и подставляем в результаты по id
+        serialized = {data['id']: data for data in self.get_serializer(posts, many=True).data}
+        for result in results:
+            if result['status'] in ('created', 'updated'):
+                result['post'] = serialized[result['id']]
+        return Response({'results': results})
 
     @action(detail=False, methods=['get'])
+    def batch(self, request):
+        ids = self.batch_ids(request)
+        if cache_enabled() and self.sparse_fieldset is None:
+            posts = [render_post(post, request) for post in get_posts(ids, self.get_queryset())]
+        else:
+            found = {post.pk: post for post in self.get_queryset().filter(pk__in=ids).order_by()}
+            posts = self.get_serializer([found[pk] for pk in ids if pk in found], many=True).data
+
+        found_ids = {post['id'] for post in posts}
+        return Response({
+            'results': posts,
+            'not_found': [pk for pk in ids if pk not in found_ids],
+        })
+
+    @batch.mapping.post
+    def batch_create(self, request):
+        items = [PostBatchCreateSerializer(data=item) for item in self.batch_items(request)]
+        names = {item.validated_data['image'] for item in items if item.is_valid()}
+        # Варианты фотографии берём у поста, который уже на неё ссылается
+        images = {
+            row['image']: row['image_variants']
+            for row in Post.objects.filter(image__in=names, image_status=Post.IMAGE_READY)
+                                   .values('image', 'image_variants')
+        }
+
+        results, posts = [], []
+        for index, item in enumerate(items):
+            if not item.is_valid():
+                results.append({'index': index, 'status': 'invalid', 'errors': item.errors})
+                continue
+            if item.validated_data['image'] not in images:
+                results.append({
+                    'index': index,
+                    'status': 'invalid',
+                    'errors': {'image': ['Фотография не найдена или ещё обрабатывается']},
+                })
+                continue
+            post = Post(
+                author=request.user,
+                image_variants=images[item.validated_data['image']],
+                **item.validated_data
+            )
+            posts.append(post)
+            results.append({'index': index, 'status': 'created', 'post': post})
+
+        with transaction.atomic():
+            Post.objects.bulk_create(posts)
+        # bulk_create не отправляет post_save
+        invalidate_posts([post.pk for post in posts])
+
+        for result in results:
+            if 'post' in result:
+                result['id'] = result['post'].pk
+        return self.batch_results(results, posts)
+
+    @batch.mapping.patch
+    def batch_update(self, request):
+        items = [PostBatchUpdateSerializer(data=item) for item in self.batch_items(request)]
+        ids = [item.validated_data['id'] for item in items if item.is_valid()]
+        found = {post.pk: post for post in self.get_queryset().filter(pk__in=ids).order_by()}
+
+        now = timezone.now()
+        results, posts = [], {}
+        for index, item in enumerate(items):
+            if not item.is_valid():
+                results.append({'index': index, 'status': 'invalid', 'errors': item.errors})
+                continue
+            data = dict(item.validated_data)
+            pk = data.pop('id')
+            post = found.get(pk)
+            if post is None:
+                results.append({'id': pk, 'status': 'not_found'})
+                continue
+            if post.author_id != request.user.id:
+                results.append({
+                    'id': pk,
+                    'status': 'forbidden',
+                    'error': 'Вы можете редактировать только свои посты',
+                })
+                continue
+            for field, value in data.items():
+                setattr(post, field, value)
+            # bulk_update не обновляет auto_now
+            post.updated_at = now
+            posts[pk] = post
+            results.append({'id': pk, 'status': 'updated'})
+
+        with transaction.atomic():
+            Post.objects.bulk_update(posts.values(), ['title', 'description', 'updated_at'])
+        invalidate_posts(posts)
+        return self.batch_results(results, list(posts.values()))
+
+    @batch.mapping.delete
+    def batch_delete(self, request):
+        ids = self.batch_ids(request)
+        rows = {
+            pk: (author_id, image)
+            for pk, author_id, image in Post.objects.filter(pk__in=ids)
+                                                    .values_list('id', 'author_id', 'image')
+        }
+        own = [pk for pk in ids if pk in rows and rows[pk][0] == request.user.id]
+
+        # Удаляются только посты автора, даже если они сменили владельца после выборки
+        with transaction.atomic():
+            Post.objects.filter(pk__in=own, author_id=request.user.id).delete()
+        for image_name in {rows[pk][1] for pk in own}:
+            release_image(image_name)
+
+        results = []
+        for pk in ids:
+            if pk not in rows:
+                results.append({'id': pk, 'status': 'not_found'})
+            elif pk in own:
+                results.append({'id': pk, 'status': 'deleted'})
+            else:
+                results.append({
+                    'id': pk,
+                    'status': 'forbidden',
+                    'error': 'Вы можете удалять только свои посты',
+                })
+        return Response({'results': results})
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_posts(self, request):
-        posts = Post.objects.filter(author=request.user)
-        serializer = self.get_serializer(posts, many=True)
-        return Response(serializer.data)
+        etag = f'{get_feed_version()}:{request.user.id}:{request.get_full_path()}'
+        return conditional_response(request, etag, None, lambda: self.my_posts_response(request))
+
+    def my_posts_response(self, request):
+        posts = self.get_queryset().filter(author_id=request.user.id)
+        page = self.paginate_queryset(posts)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+def too_many_attempts(retry_after):
+    return Response(
+        {'error': 'Слишком много неудачных попыток входа, повторите позже'},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={'Retry-After': str(retry_after)}
+    )
 
 class UserRegistrationView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [AuthThrottle]
     
     def post(self, request):
         if request.user.is_authenticated:
@@ -65,30 +474,20 @@ def post(self, request):
         if serializer.is_valid():
             user = serializer.save()
 
-            # Аутентифицируем и логиним пользователя
-            user = authenticate(
-                username=serializer.validated_data['username'],
-                password=serializer.validated_data['password']
-            )
-
-            if user:
-                login(request, user)
-                return Response(
-                    {
-                        'user': {
-                            'id': user.id,
-                            'username': user.username,
-                            'email': user.email
-                        },
-                        'message': 'Пользователь успешно зарегистрирован и авторизован'
+            # Пароль только что захэширован в create_user, повторная проверка
+            # через authenticate() стоила бы ещё одного хэширования
+            login(request, user)
+            return Response(
+                {
+                    'user': {
+                        'id': user.id,
+                        'username': user.username,
+                        'email': user.email
                     },
-                    status=status.HTTP_201_CREATED
-                )
-            else:
-                return Response(
-                    {'error': 'Ошибка аутентификации после регистрации'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+                    'message': 'Пользователь успешно зарегистрирован и авторизован'
+                },
+                status=status.HTTP_201_CREATED
+            )
 
         return Response(
             serializer.errors,
@@ -97,6 +496,7 @@ def post(self, request):
 
 class UserLoginView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [AuthThrottle]
     
     def post(self, request):
         username = request.data.get('username')
@@ -108,9 +508,15 @@ def post(self, request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        user = authenticate(username=username, password=password)
+        attempts = LoginAttempts(request, username)
+        retry_after = attempts.reserve()
+        if retry_after:
+            return too_many_attempts(retry_after)
+
+        user = authenticate(request, username=username, password=password)
         
         if user is not None:
+            attempts.succeeded()
             if user.is_active:
                 login(request, user)
                 return Response(
@@ -135,6 +541,57 @@ def post(self, request):
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
+class TokenObtainView(APIView):
+    # Вход для API-клиентов: вместо сессии выдаются access- и refresh-токены
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = [AuthThrottle]
+
+    def post(self, request):
+        username = request.data.get('username')
+        password = request.data.get('password')
+
+        if not username or not password:
+            return Response(
+                {'error': 'Необходимо указать имя пользователя и пароль'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        attempts = LoginAttempts(request, username)
+        retry_after = attempts.reserve()
+        if retry_after:
+            return too_many_attempts(retry_after)
+
+        user = authenticate(request, username=username, password=password)
+        if user is None:
+            return Response(
+                {'error': 'Неверное имя пользователя или пароль'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        attempts.succeeded()
+        return Response(issue_tokens(user), status=status.HTTP_200_OK)
+
+class TokenRefreshView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = [AuthThrottle]
+
+    def post(self, request):
+        token = request.data.get('refresh')
+        if not token:
+            return Response(
+                {'error': 'Необходимо указать refresh-токен'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            user, tokens = refresh_tokens(token)
+        except TokenError as error:
+            return Response({'error': str(error)}, status=status.HTTP_401_UNAUTHORIZED)
+
+        return Response(tokens, status=status.HTTP_200_OK)
+
 class UserLogoutView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -149,4 +606,29 @@ class CurrentUserView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        return Response(UserSerializer(request.user).data)
\ No newline at end of file
+        user = request.user
+        etag = f'{user.id}:{user.username}:{user.email}'
+        return conditional_response(
+            request, etag, None, lambda: Response(UserSerializer(user).data)
+        )
+
+
+@require_safe
+def metrics(request):
+    """
+    Метрики запросов в формате Prometheus (api/metrics.py). Доступ - по
+    токену METRICS_TOKEN или персоналу через сессию. Обычная view, а не DRF:
+    аутентификация по токенам и ограничения частоты здесь не нужны.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    allowed = request.user.is_staff or (
+        token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        render(registry.collect(), get_stats()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -187,7 +187,8 @@ document.addEventListener('DOMContentLoaded', async () => {
         try {
             const response = await fetch(`${API_BASE}/auth/me/`, {
                 method: 'GET',
-                credentials: 'include'
+                credentials: 'include',
+                cache: 'no-cache'
             });
             
             console.log('Auth check response status:', response.status);
@@ -1,6 +1,10 @@
 const API_BASE = '/api';
 let currentUser = null;
-let postsCache = []; // Кэш постов для быстрого доступа
+const POSTS_PAGE_SIZE = 20;
+let loadedPosts = new Map(); // Посты уже загруженных страниц (по id)
+let nextPageUrl = null; // Курсор следующей страницы ленты
+let isLoadingPage = false;
+let pageObserver = null;
 
 // Проверка аутентификации и загрузка данных
 document.addEventListener('DOMContentLoaded', async () => {
@@ -16,7 +20,8 @@ async function checkAuth() {
         await ensureCSRFToken();
         
         const response = await fetch(`${API_BASE}/auth/me/`, {
-            credentials: 'include'
+            credentials: 'include',
+            cache: 'no-cache'
         });
         
         if (response.ok) {
@@ -64,49 +69,142 @@ function showAuthMessage() {
     authElements.forEach(el => el.style.display = 'none');
 }
 
-// Загрузка постов
+// Загрузка первой страницы постов
 async function loadPosts() {
     // Если пользователь не авторизован, не загружаем посты
     if (!currentUser) {
         return;
     }
     
+    loadedPosts = new Map();
+    nextPageUrl = null;
+    
+    const container = document.getElementById('postsContainer');
+    if (container) {
+        container.innerHTML = '';
+    }
+    
+    await loadPostsPage(`${API_BASE}/posts/?page_size=${POSTS_PAGE_SIZE}`);
+}
+
+// Подгрузка следующей страницы постов
+async function loadMorePosts() {
+    if (!nextPageUrl || isLoadingPage) {
+        return;
+    }
+    await loadPostsPage(nextPageUrl);
+}
+
+// Загрузка одной страницы ленты по курсору
+async function loadPostsPage(url) {
+    isLoadingPage = true;
+    
     try {
-        const response = await fetch(`${API_BASE}/posts/`, {
-            credentials: 'include'
+        // no-cache: браузер перепроверяет ответ через If-None-Match
+        // и при 304 Not Modified берёт тело из своего кэша
+        const response = await fetch(url, {
+            credentials: 'include',
+            cache: 'no-cache'
         });
         
         if (response.ok) {
-            const posts = await response.json();
-            postsCache = posts; // Сохраняем в кэш
-            displayPosts(posts);
+            const page = await response.json();
+            nextPageUrl = page.next;
+            displayPosts(page.results);
         } else if (response.status === 401) {
             console.log('Сессия истекла, требуется повторная авторизация');
             showAuthMessage();
         }
     } catch (error) {
         console.error('Ошибка при загрузке постов:', error);
+    } finally {
+        isLoadingPage = false;
+        updateLoadMore();
     }
 }
 
-// Отображение постов
+// Отображение постов (добавляются в конец ленты)
 function displayPosts(posts) {
     const container = document.getElementById('postsContainer');
     if (!container) return;
     
-    container.innerHTML = '';
-    
-    if (posts.length === 0) {
+    if (posts.length === 0 && loadedPosts.size === 0) {
         container.innerHTML = '<p class="no-posts">Пока нет постов. Будьте первым!</p>';
         return;
     }
     
     posts.forEach(post => {
+        loadedPosts.set(post.id, post);
         const postElement = createPostElement(post);
         container.appendChild(postElement);
+        
+        if (post.image_status === 'processing') {
+            pollPostImage(post.id);
+        }
     });
 }
 
+// Ожидание фоновой обработки фотографии: опрашиваем пост, пока не станет готов
+function pollPostImage(postId, attempt = 0) {
+    const delay = Math.min(1000 * 2 ** attempt, 10000);
+    
+    setTimeout(async () => {
+        try {
+            const response = await fetch(`${API_BASE}/posts/${postId}/`, {
+                credentials: 'include',
+                cache: 'no-cache'
+            });
+            if (!response.ok) return;
+            
+            const post = await response.json();
+            if (post.image_status === 'processing') {
+                pollPostImage(postId, attempt + 1);
+                return;
+            }
+            
+            loadedPosts.set(post.id, post);
+            const oldElement = document.getElementById(`post-${post.id}`);
+            if (oldElement) {
+                oldElement.replaceWith(createPostElement(post));
+            }
+        } catch (error) {
+            console.error('Ошибка при проверке обработки фото:', error);
+        }
+    }, delay);
+}
+
+// Кнопка «Показать ещё» и автоподгрузка при прокрутке
+function updateLoadMore() {
+    const container = document.getElementById('postsContainer');
+    if (!container) return;
+    
+    let loadMore = document.getElementById('loadMorePosts');
+    if (!nextPageUrl) {
+        if (loadMore) loadMore.remove();
+        return;
+    }
+    
+    if (!loadMore) {
+        loadMore = document.createElement('div');
+        loadMore.id = 'loadMorePosts';
+        loadMore.className = 'load-more';
+        loadMore.innerHTML = '<button class="btn secondary">Показать ещё</button>';
+        loadMore.querySelector('button').addEventListener('click', loadMorePosts);
+        
+        if ('IntersectionObserver' in window) {
+            pageObserver = pageObserver || new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) {
+                    loadMorePosts();
+                }
+            }, { rootMargin: '400px' });
+            pageObserver.observe(loadMore);
+        }
+    }
+    
+    // Держим блок подгрузки после последнего поста
+    container.parentNode.insertBefore(loadMore, container.nextSibling);
+}
+
 // Создание элемента поста
 function createPostElement(post) {
     const postDiv = document.createElement('div');
@@ -116,7 +214,8 @@ function createPostElement(post) {
     const canEdit = post.can_edit && currentUser && post.author.id === currentUser.id;
     
     postDiv.innerHTML = `
-        ${post.image ? `<img src="${post.image}" alt="${post.title}" class="post-image">` : ''}
+        ${post.image_status === 'processing' ? '<div class="post-image post-image-processing">Фото обрабатывается...</div>' : ''}
+        ${post.image && post.image_status !== 'processing' ? createPostImage(post) : ''}
         <div class="post-content">
             <h3 class="post-title">${post.title}</h3>
             <p class="post-description">${post.description || ''}</p>
@@ -136,6 +235,24 @@ function createPostElement(post) {
     return postDiv;
 }
 
+// Картинка поста: браузер сам выбирает уменьшенную копию под ширину карточки
+function createPostImage(post) {
+    const srcset = post.image_srcset || {};
+    const sizes = '(max-width: 700px) 100vw, 400px';
+    
+    if (!srcset.webp && !srcset.jpeg) {
+        return `<img src="${post.image}" alt="${post.title}" class="post-image" loading="lazy">`;
+    }
+    
+    return `
+        <picture>
+            ${srcset.webp ? `<source type="image/webp" srcset="${srcset.webp}" sizes="${sizes}">` : ''}
+            <img src="${post.image}" ${srcset.jpeg ? `srcset="${srcset.jpeg}" sizes="${sizes}"` : ''}
+                 alt="${post.title}" class="post-image" loading="lazy" decoding="async">
+        </picture>
+    `;
+}
+
 // Настройка обработчиков событий
 function setupEventListeners() {
     // Кнопка профиля
@@ -322,8 +439,8 @@ async function editPost(postId) {
     
     console.log('Редактирование поста:', postId);
     
-    // Находим пост в кэше
-    const post = postsCache.find(p => p.id === postId);
+    // Находим пост среди загруженных страниц
+    const post = loadedPosts.get(postId);
     if (!post) {
         showNotification('Пост не найден', 'error');
         return;
@@ -473,7 +590,7 @@ async function deletePost(postId) {
 async function ensureCSRFToken() {
     if (!getCSRFToken()) {
         // Делаем GET запрос чтобы получить CSRF cookie
-        await fetch(`${API_BASE}/posts/`, {
+        await fetch(`${API_BASE}/posts/?page_size=1`, {
             credentials: 'include'
         });
     }
@@ -545,6 +662,19 @@ if (!document.querySelector('#notification-styles')) {
             margin-top: 15px;
         }
         
+        .post-image-processing {
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            background: #f1f3f5;
+            color: #6c757d;
+        }
+        
+        .load-more {
+            text-align: center;
+            margin: 20px 0;
+        }
+        
         .no-posts {
             text-align: center;
             padding: 40px 20px;
@@ -11,7 +11,8 @@ async function loadProfile() {
     try {
         console.log('Loading profile...');
         const response = await fetch(`${API_BASE}/auth/me/`, {
-            credentials: 'include'
+            credentials: 'include',
+            cache: 'no-cache'
         });
         
         console.log('Profile response status:', response.status);
@@ -0,0 +1,32 @@
+"""
+Настройки gunicorn: gunicorn -c gunicorn.conf.py
+
+GUNICORN_PROFILE=wsgi (по умолчанию) - синхронные воркеры, kittygram.wsgi;
+GUNICORN_PROFILE=asgi - воркеры uvicorn, kittygram.asgi: медленные клиенты
+не занимают воркер целиком, чтение ленты обслуживают async view.
+"""
+
+import os
+import shutil
+
+profile = os.getenv('GUNICORN_PROFILE', 'wsgi')
+if profile not in ('wsgi', 'asgi'):
+    raise ValueError(f'Неизвестный GUNICORN_PROFILE: {profile!r}')
+
+if profile == 'asgi':
+    wsgi_app = 'kittygram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'kittygram.wsgi:application'
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '3'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+limit_request_line = 8190
+
+
+def on_starting(server):
+    # Счётчики воркеров прошлого запуска (api/metrics.py) не суммируем с новыми
+    metrics_dir = os.getenv('METRICS_DIR')
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -12,5 +12,7 @@
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kittygram.settings')
+# Асинхронные версии чтения ленты, поста и текущего пользователя
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'kittygram.asgi_urls')
 
 application = get_asgi_application()
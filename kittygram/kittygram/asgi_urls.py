@@ -0,0 +1,18 @@
+"""
+URL-схема для ASGI-развёртывания (kittygram/asgi.py).
+
+Чтение ленты, поста и текущего пользователя обслуживают async view
+из api/async_views.py, всё остальное совпадает с kittygram/urls.py.
+"""
+
+from django.urls import path
+from api import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    # Имена те же, что у синхронных маршрутов: по ним считаются метрики
+    path('api/posts/', async_views.post_list, name='post-list'),
+    path('api/posts/<int:pk>/', async_views.post_detail, name='post-detail'),
+    path('api/auth/me/', async_views.current_user, name='current-user'),
+    *sync_urlpatterns,
+]
@@ -0,0 +1,43 @@
+"""
+Разбор CACHE_URL в словарь настроек Django CACHES.
+
+Поддерживаются схемы:
+    locmem://                         (память процесса, для разработки и тестов)
+    file:///abs/path/cache            (каталог на диске, общий для воркеров узла)
+    file://cache                      (путь относительно BASE_DIR)
+    redis://host:6379/0               (Redis или совместимый сервер, нужен пакет redis)
+"""
+
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+}
+
+
+def parse_cache_url(url, base_dir, timeout=300, key_prefix='kittygram'):
+    parts = urlsplit(url)
+
+    if parts.scheme not in BACKENDS:
+        raise ValueError(f'Неподдерживаемая схема CACHE_URL: {parts.scheme!r}')
+
+    config = {
+        'BACKEND': BACKENDS[parts.scheme],
+        'TIMEOUT': timeout,
+        'KEY_PREFIX': key_prefix,
+    }
+
+    if parts.scheme == 'locmem':
+        config['LOCATION'] = parts.netloc or 'kittygram'
+    elif parts.scheme == 'file':
+        # file:///abs -> абсолютный путь, file://name -> относительно BASE_DIR
+        path = unquote(parts.netloc + parts.path)
+        config['LOCATION'] = str(Path(base_dir) / path)
+    else:
+        config['LOCATION'] = url
+
+    return config
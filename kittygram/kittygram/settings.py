@@ -10,10 +10,15 @@
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
+import importlib.util
 import os
 
+from .caches import parse_cache_url
+from .database import parse_database_url
+
 # Загрузка переменных окружения
 load_dotenv()
 
@@ -47,7 +52,13 @@
 ]
 
 MIDDLEWARE = [
+    # Время ответа и SQL-запросы по маршрутам для /api/metrics/
+    'api.middleware.MetricsMiddleware',
+    # Профилирование запроса по X-Profile-Token или выборке (api/profiling.py)
+    'api.middleware.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # Отклоняет лишние одновременные загрузки до чтения тела запроса
+    'api.middleware.UploadConcurrencyMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,7 +68,8 @@
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'kittygram.urls'
+# Под ASGI (kittygram/asgi.py) чтение ленты обслуживают async view из kittygram/asgi_urls.py
+ROOT_URLCONF = os.getenv('DJANGO_ROOT_URLCONF', 'kittygram.urls')
 
 TEMPLATES = [
     {
@@ -81,11 +93,83 @@
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# База задаётся через DATABASE_URL (sqlite:///db.sqlite3 или postgres://...).
+# CONN_MAX_AGE держит соединение открытым между запросами воркера,
+# CONN_HEALTH_CHECKS проверяет его перед повторным использованием.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': str(BASE_DIR / 'db.sqlite3'),  # Исправлено: преобразование в строку
-    }
+    'default': parse_database_url(
+        os.getenv('DATABASE_URL', 'sqlite:///db.sqlite3'),
+        base_dir=BASE_DIR,
+        conn_max_age=int(os.getenv('CONN_MAX_AGE', '60')),
+        conn_health_checks=os.getenv('CONN_HEALTH_CHECKS', 'True').lower() == 'true',
+    )
+}
+
+# Переопределение прагм SQLite (см. api/signals.py), например
+# {'synchronous': 'FULL'} или {'journal_mode': None} чтобы не менять режим журнала
+SQLITE_PRAGMAS = {}
+if os.getenv('SQLITE_BUSY_TIMEOUT'):
+    SQLITE_PRAGMAS['busy_timeout'] = int(os.getenv('SQLITE_BUSY_TIMEOUT'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/ref/settings/#caches
+
+# Кэш задаётся через CACHE_URL (locmem://, file:///path или redis://host:6379/0).
+# Кэш в памяти процесса не видит сброса из других воркеров gunicorn,
+# поэтому в docker-compose используется общий файловый кэш или Redis.
+CACHES = {
+    'default': parse_cache_url(
+        os.getenv('CACHE_URL', 'locmem://'),
+        base_dir=BASE_DIR,
+        timeout=int(os.getenv('CACHE_TIMEOUT', '300')),
+    )
+}
+# Кэш в памяти процесса не годится для сессий и пользователя сессии:
+# выход, смена пароля или блокировка не дойдут до других воркеров
+SHARED_CACHE = CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+
+# Кэширование ленты и постов (api/cache.py). По умолчанию только с общим
+# кэшем: сброс из run_worker или другого воркера не дойдёт до кэша в памяти процесса
+POSTS_CACHE_ENABLED = os.getenv('POSTS_CACHE_ENABLED', str(SHARED_CACHE)).lower() == 'true'
+POSTS_CACHE_TIMEOUT = int(os.getenv('POSTS_CACHE_TIMEOUT', '300'))
+# Сколько первых постов ленты хранится в кэше списком id
+POSTS_CACHE_FEED_SIZE = 1000
+# Сколько постов можно передать в один запрос /api/posts/batch/
+POSTS_BATCH_MAX_SIZE = int(os.getenv('POSTS_BATCH_MAX_SIZE', '500'))
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/4.2/topics/auth/passwords/
+
+# Новые пароли хэшируются первым хэшером списка, остальные нужны для проверки
+# старых хэшей, которые при успешном входе пересчитываются (api/hashers.py).
+# scrypt - по умолчанию и без зависимостей, argon2 - нужен пакет argon2-cffi
+# (есть в requirements.txt): без него упал бы первый вход или регистрация.
+PASSWORD_HASHER_CLASSES = {
+    'scrypt': 'api.hashers.TunedScryptPasswordHasher',
+    'argon2': 'api.hashers.TunedArgon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'scrypt')
+if PASSWORD_HASHER not in PASSWORD_HASHER_CLASSES:
+    raise ValueError(f'Неподдерживаемый PASSWORD_HASHER: {PASSWORD_HASHER!r}')
+if PASSWORD_HASHER == 'argon2' and importlib.util.find_spec('argon2') is None:
+    raise ValueError('PASSWORD_HASHER=argon2: не установлен пакет argon2-cffi (pip install -r requirements.txt)')
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    hasher for name, hasher in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.getenv('PASSWORD_SCRYPT_WORK_FACTOR', str(2 ** 14)))
+PASSWORD_ARGON2_TIME_COST = int(os.getenv('PASSWORD_ARGON2_TIME_COST', '2'))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv('PASSWORD_ARGON2_MEMORY_COST', '19456'))  # КиБ
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv('PASSWORD_ARGON2_PARALLELISM', '1'))
+
+# Неудачные попытки входа (api/login_attempts.py): не больше N за окно в секундах,
+# отдельно для IP-адреса и для имени пользователя; дальше 429 без проверки пароля
+LOGIN_ATTEMPT_LIMITS = {
+    'ip': (int(os.getenv('LOGIN_ATTEMPTS_PER_IP', '20')), 300),
+    'username': (int(os.getenv('LOGIN_ATTEMPTS_PER_USERNAME', '5')), 300),
 }
 
 
@@ -130,6 +214,17 @@
     BASE_DIR / 'frontend',
 ]
 
+# collectstatic добавляет хэш к именам css/js фронтенда, кладёт страницы
+# в корень STATIC_ROOT и пишет сжатые копии .gz/.br (api/staticfiles.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'api.staticfiles.FrontendStaticFilesStorage',
+    },
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR.parent / 'media'
 
@@ -137,13 +232,29 @@
 LOGOUT_REDIRECT_URL = '/api/auth/login/'
 
 
+# Пользователь сессии берётся из общего кэша, а не из auth_user на каждый
+# запрос. ModelBackend остаётся в списке: его путь записан в сессиях,
+# созданных до подключения кэша
+AUTHENTICATION_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
+if SHARED_CACHE:
+    AUTHENTICATION_BACKENDS.insert(0, 'api.backends.CachedModelBackend')
+USER_CACHE_TIMEOUT = int(os.getenv('USER_CACHE_TIMEOUT', '300'))
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Сессионные настройки
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# cached_db читает сессию из кэша (CACHE_URL), а пишет и в кэш, и в БД:
+# при промахе или перезапуске Redis сессия не теряется. С кэшем в памяти
+# процесса (locmem://) сессии хранятся только в БД.
+SESSION_ENGINE = os.getenv(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db' if SHARED_CACHE
+    else 'django.contrib.sessions.backends.db',
+)
 SESSION_COOKIE_NAME = 'sessionid'
 SESSION_COOKIE_AGE = 1209600  # 2 недели в секундах
 SESSION_COOKIE_SECURE = False  # True для HTTPS
@@ -200,11 +311,68 @@
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        # API-клиенты: Authorization: Bearer <access-токен> (api/tokens.py).
+        # Первая схема задаёт WWW-Authenticate: без учётных данных или
+        # с истёкшим токеном ответ 401, а не 403
+        'api.authentication.AccessTokenAuthentication',
+        # Браузер (фронтенд) работает через сессию и CSRF
         'rest_framework.authentication.SessionAuthentication',
     ],
+    # Адрес клиента для ограничений по IP берётся из X-Forwarded-For,
+    # который дописывает nginx (один прокси перед gunicorn)
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '1')),
+    # Счётчики в кэше (CACHE_URL), скользящее окно - api/throttling.py
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.AnonReadThrottle',
+        'api.throttling.UserReadThrottle',
+        'api.throttling.UploadThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon_read': os.getenv('THROTTLE_ANON_READ', '120/min'),
+        'user_read': os.getenv('THROTTLE_USER_READ', '600/min'),
+        'uploads': os.getenv('THROTTLE_UPLOADS', '30/hour'),
+        'auth': os.getenv('THROTTLE_AUTH', '20/min'),
+    },
 }
 
+# Сколько загрузок фотографий один воркер обрабатывает одновременно
+# (api/middleware.py); остальные сразу получают 429
+MAX_CONCURRENT_UPLOADS = int(os.getenv('MAX_CONCURRENT_UPLOADS', '4'))
+UPLOAD_RETRY_AFTER = 5
+
+# Метрики запросов (api/metrics.py, /api/metrics/). Каждый воркер раз
+# в METRICS_FLUSH_INTERVAL секунд пишет счётчики в METRICS_DIR, эндпоинт
+# их суммирует; без METRICS_DIR видны счётчики только одного процесса.
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+# Токен Prometheus (Authorization: Bearer <METRICS_TOKEN>); без него - только персонал
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Профилирование запросов (api/profiling.py): доля случайно профилируемых
+# запросов (0 - только по заголовку X-Profile-Token), период снятия стеков
+# в секундах и срок действия токена из админки в секундах
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.005'))
+PROFILE_TOKEN_MAX_AGE = int(os.getenv('PROFILE_TOKEN_MAX_AGE', '3600'))
+# Сколько хранить профили: старше PROFILE_MAX_AGE и сверх PROFILE_MAX_COUNT
+# самых новых удаляет фоновый воркер (задача prune_request_profiles)
+PROFILE_MAX_AGE = timedelta(days=int(os.getenv('PROFILE_MAX_AGE_DAYS', '7')))
+PROFILE_MAX_COUNT = int(os.getenv('PROFILE_MAX_COUNT', '1000'))
+
+# Время жизни токенов для API-клиентов (/api/auth/token/)
+API_ACCESS_TOKEN_LIFETIME = timedelta(minutes=int(os.getenv('API_ACCESS_TOKEN_MINUTES', '5')))
+API_REFRESH_TOKEN_LIFETIME = timedelta(days=int(os.getenv('API_REFRESH_TOKEN_DAYS', '7')))
+
 # Настройки для загрузки файлов
-DATA_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024  # 20MB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024  # 20MB
+# Файлы не держатся в памяти воркера: они пишутся кусками во временный файл,
+# а заголовок изображения проверяется до окончания загрузки.
+FILE_UPLOAD_HANDLERS = [
+    'api.uploads.StreamingImageUploadHandler',
+]
+# Каталог временных файлов стоит держать на том же разделе, что и MEDIA_ROOT:
+# тогда сохранение загруженного файла - это rename, а не копирование
+FILE_UPLOAD_TEMP_DIR = os.getenv('FILE_UPLOAD_TEMP_DIR') or None
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024  # 20MB
+# Лимит на остальные (не файловые) поля формы и JSON-тело
+DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 1000
\ No newline at end of file
@@ -3,7 +3,10 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework import routers
-from api.views import PostViewSet, UserRegistrationView, CurrentUserView, UserLoginView, UserLogoutView
+from api.views import (
+    PostViewSet, UserRegistrationView, CurrentUserView, UserLoginView, UserLogoutView,
+    TokenObtainView, TokenRefreshView, metrics
+)
 
 router = routers.DefaultRouter()
 router.register(r'posts', PostViewSet)
@@ -15,6 +18,9 @@
     path('api/auth/login/', UserLoginView.as_view(), name='login'),
     path('api/auth/logout/', UserLogoutView.as_view(), name='logout'),
     path('api/auth/me/', CurrentUserView.as_view(), name='current-user'),
+    path('api/auth/token/', TokenObtainView.as_view(), name='token'),
+    path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('api/metrics/', metrics, name='metrics'),
 ]
 
 if settings.DEBUG: